@@ -0,0 +1,71 @@
+"""测量批量调整吞吐量随进程数的扩展情况
+
+用法: python benchmarks/bench_batch_scaling.py [--count 48] [--workers 1,2,4,8] [--mode filesize]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import build_photo_corpus  # noqa: E402
+import resize_batch  # noqa: E402
+
+
+def build_jobs(paths, mode, output_dir):
+    """为语料生成任务：尺寸模式缩到一半，文件大小模式压到原大小的 20%"""
+    jobs = []
+    for path in paths:
+        output_path = os.path.join(output_dir, os.path.basename(path))
+        if mode == "dimension":
+            target = (800, 600)
+            jobs.append(resize_batch.ResizeJob(path, mode, target, output_path=output_path))
+        else:
+            target = int(os.path.getsize(path) * 0.2)
+            jobs.append(resize_batch.ResizeJob(path, mode, target, 0.1, output_path))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=48, help="语料图像数量")
+    parser.add_argument("--mode", choices=("dimension", "filesize"), default="filesize")
+    parser.add_argument("--workers", default=None, help="逗号分隔的进程数列表，默认 1,2,4... 直到 CPU 核数")
+    args = parser.parse_args()
+
+    cpus = resize_batch.default_workers()
+    if args.workers:
+        worker_counts = [int(v) for v in args.workers.split(",")]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= cpus:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != cpus:
+            worker_counts.append(cpus)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = build_photo_corpus(work_dir, args.count)
+        output_dir = os.path.join(work_dir, "out")
+        os.makedirs(output_dir)
+        jobs = build_jobs(paths, args.mode, output_dir)
+
+        print(f"语料 {args.count} 张, 模式 {args.mode}, CPU {cpus} 核")
+        baseline = None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            outcomes = list(resize_batch.run_batch(jobs, workers))
+            elapsed = time.perf_counter() - start
+            failures = sum(1 for outcome in outcomes if not outcome.ok)
+
+            throughput = len(jobs) / elapsed
+            baseline = baseline or throughput
+            speedup = throughput / baseline
+            print(f"进程 {workers:>3}: {throughput:7.2f} 张/秒 | 加速比 {speedup:5.2f} "
+                  f"| 效率 {speedup / workers:5.0%} | 失败 {failures}")
+
+
+if __name__ == "__main__":
+    main()
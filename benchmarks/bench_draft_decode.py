@@ -0,0 +1,96 @@
+"""测量降采样解码（JPEG draft + reduce）对按尺寸缩小的耗时、峰值内存和画质的影响
+
+用法: python benchmarks/bench_draft_decode.py [--size 6000x4000] [--gaps 0,2,3,4] [--divisors 2,4,8]
+画质以相对全分辨率解码结果的 PSNR 表示；每种配置在独立子进程中运行以测量峰值 RSS。
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_photo  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def psnr(path_a: str, path_b: str) -> float:
+    """两张同尺寸图像之间的 PSNR（dB）"""
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mse = sum(ImageStat.Stat(diff).sum2) / (diff.width * diff.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def read_peak_rss_kb() -> int:
+    """当前进程的峰值 RSS（VmHWM，exec 后重新计数，不继承父进程）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run_one(input_path: str, output_path: str, target_size, reducing_gap) -> None:
+    """子进程入口：执行一次缩放并输出耗时和峰值 RSS"""
+    start = time.perf_counter()
+    resize_engine.resize_by_dimension(input_path, target_size, output_path, reducing_gap=reducing_gap)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "peak_rss_kb": read_peak_rss_kb()}))
+
+
+def spawn(input_path: str, output_path: str, target_size, reducing_gap) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--run", input_path, output_path,
+               f"{target_size[0]}x{target_size[1]}", str(reducing_gap or 0)]
+    return json.loads(subprocess.check_output(command))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="6000x4000", help="合成 JPEG 尺寸")
+    parser.add_argument("--gaps", default="0,2,3,4", help="逗号分隔的 reducing_gap 列表，0 表示全分辨率解码")
+    parser.add_argument("--divisors", default="2,4,8", help="逗号分隔的缩小倍数")
+    parser.add_argument("--run", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        input_path, output_path, size_text, gap_text = args.run
+        target_size = tuple(int(v) for v in size_text.split("x"))
+        run_one(input_path, output_path, target_size, float(gap_text) or None)
+        return
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    gaps = [float(v) for v in args.gaps.split(",")]
+    divisors = [int(v) for v in args.divisors.split(",")]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "source.jpg")
+        make_photo(size, seed=1).save(input_path, quality=92)
+        print(f"源图像 {size[0]}x{size[1]} JPEG")
+
+        for divisor in divisors:
+            target_size = (size[0] // divisor, size[1] // divisor)
+            reference = os.path.join(work_dir, f"ref_{divisor}.png")
+            base = spawn(input_path, reference, target_size, None)
+            print(f"缩小 1/{divisor} -> {target_size[0]}x{target_size[1]}")
+            for gap in gaps:
+                if gap:
+                    output_path = os.path.join(work_dir, f"out_{divisor}_{gap}.png")
+                    stats = spawn(input_path, output_path, target_size, gap)
+                    quality = f"{psnr(reference, output_path):6.2f} dB"
+                else:
+                    stats, quality = base, "  基准"
+                print(f"  gap {gap or '关闭':>4}: {stats['seconds']:6.3f} s "
+                      f"({base['seconds'] / stats['seconds']:4.1f}x) | "
+                      f"峰值 RSS {stats['peak_rss_kb'] / 1024:7.1f} MB | PSNR {quality}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""对比 PNG/GIF/BMP 输入按文件大小调整时的无损/调色板路径与强制转换 JPEG 的大小、耗时和画质
+
+用法: python benchmarks/bench_lossless.py [--ratios 0.8,0.4,0.15,0.03] [--tolerance 0.2] [--runs 3]
+画质以合成白色背景后相对同尺寸缩放原图的 PSNR 表示；"透明"列表示输出是否保留了源图像的透明通道。
+语料包含不透明的照片 PNG/BMP：JPEG 能达到目标时默认路径应改为输出 JPEG，耗时和尺寸与强制 JPEG 相近；
+无损 PNG 不超出目标而 JPEG 最高质量也达不到目标时保留无损 PNG。搜索不放大图像，目标大于原尺寸可达到的大小时
+结果低于容差下限（两种路径都如此）。
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import CorpusItem, build_corpus  # noqa: E402
+import resize_engine  # noqa: E402
+
+ITEMS = [
+    CorpusItem("graphic_png", "graphic", (1280, 720), ".png"),
+    CorpusItem("graphic_gif", "graphic", (800, 600), ".gif"),
+    CorpusItem("graphic_bmp", "graphic", (1024, 768), ".bmp"),
+    CorpusItem("alpha_png", "alpha", (1200, 900), ".png"),
+    CorpusItem("alpha_small_png", "alpha", (400, 400), ".png"),
+    CorpusItem("photo_png", "photo", (1200, 900), ".png"),
+    CorpusItem("photo_bmp", "photo", (1200, 900), ".bmp"),
+]
+
+# 路径名 -> resize_by_filesize 的 formats 参数
+PATHS = {"默认": None, "JPEG": ("JPEG",)}
+
+
+def on_white(img: Image.Image) -> Image.Image:
+    return resize_engine.flatten_alpha(img.convert("RGBA"))
+
+
+def psnr(source_path: str, output_path: str) -> float:
+    """输出相对按输出尺寸缩放的源图像的 PSNR（dB）"""
+    with Image.open(source_path) as source, Image.open(output_path) as output:
+        reference = on_white(source.convert("RGBA").resize(output.size, Image.Resampling.LANCZOS))
+        diff = ImageChops.difference(reference, on_white(output))
+    mse = sum(ImageStat.Stat(diff).sum2) / (diff.width * diff.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def keeps_alpha(source_path: str, output_path: str) -> bool:
+    with Image.open(source_path) as source, Image.open(output_path) as output:
+        return resize_engine.has_alpha(source) and resize_engine.has_alpha(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ratios", default="0.8,0.4,0.15,0.03", help="逗号分隔的目标大小比例")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="文件大小容差比例")
+    parser.add_argument("--runs", type=int, default=3, help="每种配置运行次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    args = parser.parse_args()
+    ratios = [float(v) for v in args.ratios.split(",")]
+
+    totals = {name: {"seconds": 0.0, "bytes": 0, "hits": 0, "jobs": 0} for name in PATHS}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for path in build_corpus(work_dir, ITEMS, args.seed):
+            print(f"{os.path.basename(path)} ({resize_engine.format_size(os.path.getsize(path))})")
+            for ratio in ratios:
+                target = int(os.path.getsize(path) * ratio)
+                for name, formats in PATHS.items():
+                    output_path = os.path.join(work_dir, "out", name, os.path.basename(path))
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    timings = []
+                    for _ in range(args.runs):
+                        resize_engine.metadata_cache.clear()
+                        start = time.perf_counter()
+                        result = resize_engine.resize_by_filesize(path, target, args.tolerance, output_path,
+                                                                  formats=formats)
+                        timings.append(time.perf_counter() - start)
+                    seconds = statistics.median(timings)
+                    hit = target * (1 - args.tolerance) <= result.size <= target * (1 + args.tolerance)
+                    total = totals[name]
+                    total["seconds"] += seconds
+                    total["bytes"] += result.size
+                    total["hits"] += hit
+                    total["jobs"] += 1
+                    print(f"  {ratio:5.0%} {name:>4}: {result.format or '-':>4} {result.dimensions[0]:>5}x"
+                          f"{result.dimensions[1]:<5} {result.size / target:6.1%}{'' if hit else ' 超出容差'} | "
+                          f"{seconds * 1000:7.1f} ms | PSNR {psnr(path, result.output_path):6.2f} dB | "
+                          f"透明 {'是' if keeps_alpha(path, result.output_path) else '否'}")
+
+    print("合计")
+    for name, total in totals.items():
+        print(f"  {name:>4}: 容差内 {total['hits']}/{total['jobs']} | 耗时 {total['seconds']:6.2f} s | "
+              f"输出 {resize_engine.format_size(total['bytes'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""在大小混合的语料上比较有无 --memory-limit 时批量处理的峰值 RSS 和耗时，超出上限时以状态码 1 退出
+
+用法: python benchmarks/bench_memory_admission.py [--workers 4] [--memory-limit 400MB] [--large 4] [--small 24]
+峰值 RSS 为主进程和全部工作进程 VmRSS 之和（定时采样）；先用极小的任务运行一次批量，
+测得空闲工作进程的 RSS 作为基线，"任务内存" = 峰值 RSS - 基线，设置上限时应不超过上限。
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_graphic, make_photo  # noqa: E402
+import resize_batch  # noqa: E402
+import resize_cli  # noqa: E402
+import resize_engine  # noqa: E402
+
+SAMPLE_INTERVAL = 0.02
+
+
+def tree_rss_kb(pid: int) -> int:
+    """进程及其直接子进程的 VmRSS 之和（kB）"""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        pass
+    for process in pids:
+        try:
+            with open(f"/proc/{process}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (FileNotFoundError, StopIteration):
+            continue
+    return total
+
+
+def run_sampled(jobs, workers: int, memory_limit):
+    """运行批量并返回 (峰值 RSS kB, 耗时秒, 失败数)"""
+    peak = [0]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            peak[0] = max(peak[0], tree_rss_kb(os.getpid()))
+            time.sleep(SAMPLE_INTERVAL)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        outcomes = resize_batch.run_batch(jobs, workers, memory_limit=memory_limit)
+        failures = sum(not outcome.ok for outcome in outcomes)
+    finally:
+        stop.set()
+        sampler.join()
+    return peak[0], time.perf_counter() - start, failures
+
+
+def build_corpus(directory: str, large: int, small: int):
+    """large 张 6000x4000 大图（照片 JPEG 和图形 PNG 交替）在前，small 张 1200x900 照片在后
+
+    不限制时大图会同时处理，最容易出现内存峰值
+    """
+    big_jpeg = os.path.join(directory, "big.jpg")
+    big_png = os.path.join(directory, "big.png")
+    make_photo((6000, 4000), seed=1).save(big_jpeg, quality=90)
+    make_graphic((6000, 4000), seed=2).save(big_png)
+    paths = []
+    for index in range(large):
+        source = (big_jpeg, big_png)[index % 2]
+        paths.append(os.path.join(directory, f"large_{index:03d}{os.path.splitext(source)[1]}"))
+        shutil.copyfile(source, paths[-1])
+    for index in range(small):
+        paths.append(os.path.join(directory, f"small_{index:03d}.jpg"))
+        make_photo((1200, 900), seed=10 + index).save(paths[-1], quality=90)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="进程数")
+    parser.add_argument("--memory-limit", type=resize_cli.parse_filesize, default=400 * 1024 * 1024,
+                        help="所有任务合计的内存上限")
+    parser.add_argument("--large", type=int, default=4, help="大图数量")
+    parser.add_argument("--small", type=int, default=24, help="小图数量")
+    parser.add_argument("--target", type=resize_cli.parse_filesize, default=300 * 1024, help="按文件大小调整的目标")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 在子进程中生成语料：主进程生成大图后保留的堆内存会被 fork 出的工作进程重复计入 RSS
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            paths = executor.submit(build_corpus, work_dir, args.large, args.small).result()
+        output_dir = os.path.join(work_dir, "out")
+        os.makedirs(output_dir)
+        jobs = [resize_batch.ResizeJob(path, "filesize", args.target, 0.2,
+                                       resize_engine.get_output_path(path, output_dir)) for path in paths]
+        estimates = [resize_batch.job_memory(job) for job in jobs]
+        print(f"{len(jobs)} 个任务，{args.workers} 个进程，估算峰值内存 "
+              f"{resize_engine.format_size(min(estimates))} ~ {resize_engine.format_size(max(estimates))}")
+
+        tiny = [resize_batch.ResizeJob(paths[-1], "dimension", (8, 8),
+                                       output_path=os.path.join(output_dir, f"tiny_{i}.jpg"))
+                for i in range(args.workers * 2)]
+        baseline = run_sampled(tiny, args.workers, None)[0]
+        print(f"  空闲基线: RSS {baseline / 1024:7.1f} MB")
+
+        failures = 0
+        for name, limit in (("不限制", None), (f"上限 {resize_engine.format_size(args.memory_limit)}",
+                                                args.memory_limit)):
+            peak, elapsed, failed = run_sampled(jobs, args.workers, limit)
+            used = (peak - baseline) * 1024
+            over = limit is not None and used > limit
+            failures += failed + over
+            print(f"  {name}: 峰值 RSS {peak / 1024:7.1f} MB | 任务内存 {resize_engine.format_size(max(0, used))}"
+                  f" | 耗时 {elapsed:6.2f} s | 失败 {failed}{' <-- 超出上限' if over else ''}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
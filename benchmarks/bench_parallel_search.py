@@ -0,0 +1,56 @@
+"""测量单个按文件大小调整任务在并发候选编码下的延迟
+
+用法: python benchmarks/bench_parallel_search.py [--size 6000x4000] [--parallel 1,2,4,8] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_photo  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="6000x4000", help="合成 JPEG 尺寸")
+    parser.add_argument("--parallel", default="1,2,4,8", help="逗号分隔的并发候选数")
+    parser.add_argument("--ratios", default="0.2,0.05", help="逗号分隔的目标大小比例")
+    parser.add_argument("--runs", type=int, default=3, help="每种配置运行次数（取中位数）")
+    parser.add_argument("--no-predict", action="store_true", help="关闭代理预测")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    parallels = [int(v) for v in args.parallel.split(",")]
+    ratios = [float(v) for v in args.ratios.split(",")]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "source.jpg")
+        output_path = os.path.join(work_dir, "out.jpg")
+        make_photo(size, seed=2).save(input_path, quality=92)
+        print(f"源图像 {size[0]}x{size[1]}, CPU {os.cpu_count()} 核, 预测 {'关' if args.no_predict else '开'}")
+
+        for ratio in ratios:
+            target = int(os.path.getsize(input_path) * ratio)
+            print(f"目标 {ratio:.0%} ({resize_engine.format_size(target)})")
+            baseline = None
+            for parallel in parallels:
+                timings = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    result = resize_engine.resize_by_filesize(input_path, target, 0.1, output_path,
+                                                              predict=not args.no_predict, parallel=parallel)
+                    timings.append(time.perf_counter() - start)
+                median = statistics.median(timings)
+                baseline = baseline or median
+                print(f"  并发 {parallel:>2}: {median:6.3f} s ({baseline / median:4.2f}x) | "
+                      f"编码 {result.encodes} 次 | 大小 {result.size / target:5.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""在照片语料上比较默认搜索与感知画质模式（--perceptual）的输出尺寸、亮度 SSIM 和耗时
+
+用法: python benchmarks/bench_perceptual.py [--count 6] [--ratios 0.3,0.1,0.05] [--formats jpeg,webp]
+目标大小以源文件大小的比例给出；SSIM 由 SimilarityScorer 相对解码后的源图像计算（与搜索内部使用的评分相同）。
+感知画质模式的候选包含默认搜索的结果，只搜索一种格式时任一文件的 SSIM 低于默认搜索即以状态码 1 退出。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import build_photo_corpus  # noqa: E402
+import resize_cli  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=6, help="照片数量")
+    parser.add_argument("--ratios", default="0.3,0.1,0.05", help="逗号分隔的目标大小（相对源文件大小的比例）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="文件大小容差比例")
+    parser.add_argument("--formats", type=resize_cli.parse_formats, help="候选输出格式（默认按扩展名）")
+    args = parser.parse_args()
+
+    ratios = [float(v) for v in args.ratios.split(",")]
+    regressions = 0
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = build_photo_corpus(work_dir, args.count)
+        output_path = os.path.join(work_dir, "out.jpg")
+        for ratio in ratios:
+            # 方式 → [(耗时, SSIM, 像素数比例)]
+            rows = {False: [], True: []}
+            for path in paths:
+                reference = resize_engine.SimilarityScorer(resize_engine.load_working_image(path, flatten=False))
+                source_size = os.path.getsize(path)
+                similarities = {}
+                for perceptual in (False, True):
+                    start = time.perf_counter()
+                    result = resize_engine.resize_by_filesize(path, int(source_size * ratio), args.tolerance,
+                                                              output_path, formats=args.formats,
+                                                              perceptual=perceptual)
+                    elapsed = time.perf_counter() - start
+                    with resize_engine.open_image(result.output_path) as img:
+                        similarities[perceptual] = reference.similarity(img)
+                    width, height = resize_engine.read_image_info(path).dimensions
+                    pixels = result.dimensions[0] * result.dimensions[1] / (width * height)
+                    rows[perceptual].append((elapsed, similarities[perceptual], pixels))
+                if not args.formats or len(args.formats) == 1:
+                    regressions += similarities[True] < similarities[False] - 1e-6
+
+            print(f"目标 {ratio:.0%}:")
+            for perceptual, name in ((False, "默认"), (True, "感知画质")):
+                elapsed, similarity, pixels = (statistics.mean(column) for column in zip(*rows[perceptual]))
+                print(f"  {name:>4}: 平均 SSIM {similarity:.4f} | 平均像素 {pixels:6.1%} | 平均耗时 {elapsed:6.2f} s")
+
+    if regressions:
+        print(f"{regressions} 个文件的感知画质模式 SSIM 低于默认搜索")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""对比开启/关闭代理预测时按文件大小调整的全尺寸编码次数、命中率和耗时
+
+用法: python benchmarks/bench_predictor.py [--count 8] [--tolerance 0.1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import build_photo_corpus  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=8, help="语料图像数量")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="容差比例")
+    args = parser.parse_args()
+
+    ratios = (0.5, 0.25, 0.1, 0.03, 0.01)
+    totals = {False: [0, 0, 0.0], True: [0, 0, 0.0]}  # [编码次数, 容差内次数, 耗时]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        output_path = os.path.join(work_dir, "out.jpg")
+        for path in build_photo_corpus(work_dir, args.count):
+            for ratio in ratios:
+                target = int(os.path.getsize(path) * ratio)
+                low, high = target * (1 - args.tolerance), target * (1 + args.tolerance)
+                for predict in (False, True):
+                    start = time.perf_counter()
+                    result = resize_engine.resize_by_filesize(path, target, args.tolerance, output_path,
+                                                              predict=predict)
+                    totals[predict][0] += result.encodes
+                    totals[predict][1] += low <= result.size <= high
+                    totals[predict][2] += time.perf_counter() - start
+
+    jobs = args.count * len(ratios)
+    print(f"语料 {args.count} 张 × 目标比例 {ratios}, 容差 {args.tolerance:.0%}")
+    for predict, (encodes, hits, seconds) in totals.items():
+        name = "预测" if predict else "无预测"
+        print(f"{name:>4}: 平均全尺寸编码 {encodes / jobs:5.2f} 次/任务 | 容差内 {hits}/{jobs} "
+              f"| 平均耗时 {seconds / jobs * 1000:7.1f} ms")
+    print(f"（预测额外使用 {len(resize_engine.PREDICT_QUALITIES) + 2} 次小图编码）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""在 40 MP 照片上测量预览金字塔的构建耗时、每次预览刷新（预测 + 渲染）的耗时和预测大小的误差
+
+用法: python benchmarks/bench_preview.py [--size 7744x5184] [--updates 40] [--max-ms 50] [--verify 4]
+模拟用户连续修改参数：按像素尺寸和按文件大小的目标交替变化，每次刷新的耗时不含 Tk 显示；
+刷新耗时最大值超过 --max-ms 时以状态码 1 退出。--verify 个参数点会实际全分辨率处理一次，对比预测与实际大小。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_photo  # noqa: E402
+import resize_engine  # noqa: E402
+
+PREVIEW_BOX = (480, 240)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="7744x5184", help="合成源图像尺寸（默认约 40 MP）")
+    parser.add_argument("--updates", type=int, default=40, help="模拟的参数修改次数")
+    parser.add_argument("--max-ms", type=float, default=50, help="单次刷新耗时上限（毫秒）")
+    parser.add_argument("--verify", type=int, default=4, help="实际处理以对比大小的参数点数")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "photo.jpg")
+        make_photo((width, height), seed=3).save(input_path, quality=90)
+        source_size = os.path.getsize(input_path)
+        output_format = resize_engine.output_format_for(input_path)
+        print(f"{width}x{height} ({width * height / 1e6:.1f} MP, {resize_engine.format_size(source_size)})")
+
+        start = time.perf_counter()
+        pyramid = resize_engine.build_preview(input_path)
+        print(f"  构建金字塔: {(time.perf_counter() - start) * 1000:7.1f} ms | 显示级 "
+              + ", ".join(f"{img.width}x{img.height}" for img in pyramid.levels))
+
+        # (方式, 参数, 预测结果)
+        updates = []
+        timings = []
+        for index in range(args.updates):
+            start = time.perf_counter()
+            if index % 2 == 0:
+                target_width = rng.randrange(200, width + 1)
+                params = (target_width, max(1, round(target_width * height / width)))
+                plan = pyramid.plan_dimension(params)
+            else:
+                params = int(source_size * rng.uniform(0.005, 0.8))
+                plan = pyramid.plan_filesize(output_format, params, 0.2)
+            pyramid.render(plan, PREVIEW_BOX)
+            timings.append((time.perf_counter() - start) * 1000)
+            updates.append(("dimension" if index % 2 == 0 else "filesize", params, plan))
+
+        print(f"  刷新 {len(timings)} 次: p50 {statistics.median(timings):6.1f} ms | 最大 {max(timings):6.1f} ms | "
+              f"采样编码 {pyramid.encodes} 次")
+
+        output_path = os.path.join(work_dir, "out.jpg")
+        for mode, params, plan in updates[:args.verify]:
+            if mode == "dimension":
+                actual = resize_engine.resize_by_dimension(input_path, params, output_path)
+            else:
+                actual = resize_engine.resize_by_filesize(input_path, params, 0.2, output_path)
+            error = plan.predicted_size / actual.size - 1
+            print(f"  {mode:>9} 预计 {resize_engine.format_size(plan.predicted_size):>10} "
+                  f"{plan.dimensions[0]}x{plan.dimensions[1]} | 实际 {resize_engine.format_size(actual.size):>10} "
+                  f"{actual.dimensions[0]}x{actual.dimensions[1]} | 误差 {error:+.0%}")
+
+    return 1 if max(timings) > args.max_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
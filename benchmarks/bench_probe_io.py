@@ -0,0 +1,138 @@
+"""对比临时文件试编码与内存试编码在 resize_by_filesize 中的写入系统调用与写入字节数
+
+用法: python benchmarks/bench_probe_io.py [--size 3000x2000] [--runs 3]
+仅支持 Linux（读取 /proc/self/io）。
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resize_engine  # noqa: E402
+
+
+def read_io_counters() -> dict:
+    """读取当前进程的 I/O 计数（syscw: 写系统调用次数, wchar: 写入字节数）"""
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key.strip()] = int(value)
+    return counters
+
+
+def make_photo(path: str, size) -> None:
+    """生成带噪声和渐变的合成照片"""
+    noise = Image.effect_noise(size, 64).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    Image.blend(noise, gradient, 0.5).save(path, quality=95)
+
+
+def legacy_find_optimal_quality(img, target_size_bytes, tolerance, temp_file):
+    """原有实现：每次试编码写入临时文件再读取大小"""
+    best_quality = 80
+    iterations = 0
+    while iterations < 10:
+        iterations += 1
+        img.save(temp_file, quality=best_quality)
+        size_ratio = os.path.getsize(temp_file) / target_size_bytes
+        if (1 - tolerance) <= size_ratio <= (1 + tolerance):
+            return best_quality
+        if size_ratio > 1:
+            new_quality = best_quality - (int(10 * math.log(size_ratio, 2)) + 1)
+        else:
+            new_quality = best_quality + (int(5 * math.log(1 / size_ratio, 2)) + 1)
+        new_quality = max(1, min(new_quality, 95))
+        if new_quality == best_quality:
+            break
+        best_quality = new_quality
+    return best_quality
+
+
+def legacy_resize_by_filesize(input_path, output_path, target_size_bytes, tolerance):
+    """原有实现的文件大小调整流程（仅保留 JPEG 输入分支）"""
+    min_acceptable = int(target_size_bytes * (1 - tolerance))
+    max_acceptable = int(target_size_bytes * (1 + tolerance))
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_file:
+        temp_filename = temp_file.name
+    try:
+        with Image.open(input_path) as img:
+            quality = legacy_find_optimal_quality(img, target_size_bytes, tolerance, temp_filename)
+            img.save(temp_filename, quality=quality)
+            current_size = os.path.getsize(temp_filename)
+            if min_acceptable <= current_size <= max_acceptable:
+                img.save(output_path, quality=quality)
+                return output_path
+            if current_size > max_acceptable:
+                scale_factor = math.sqrt(max_acceptable / current_size) * 0.95
+            else:
+                scale_factor = math.sqrt(min_acceptable / current_size) * 1.05
+            new_size = (max(100, int(img.width * scale_factor)), max(100, int(img.height * scale_factor)))
+            resized_img = img.resize(new_size, resample=Image.Resampling.LANCZOS)
+            quality = legacy_find_optimal_quality(resized_img, target_size_bytes, tolerance, temp_filename)
+            resized_img.save(output_path, quality=quality)
+            final_size = os.path.getsize(output_path)
+            if final_size > max_acceptable or final_size < min_acceptable:
+                if final_size > target_size_bytes:
+                    quality = max(1, quality - 5)
+                else:
+                    quality = min(95, quality + 5)
+                resized_img.save(output_path, quality=quality)
+        return output_path
+    finally:
+        os.unlink(temp_filename)
+
+
+def measure(func) -> dict:
+    """执行一次调用并返回写系统调用次数、写入字节数和耗时"""
+    before = read_io_counters()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    after = read_io_counters()
+    return {
+        "syscw": after["syscw"] - before["syscw"],
+        "wchar": after["wchar"] - before["wchar"],
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="3000x2000", help="合成图像尺寸，如 3000x2000")
+    parser.add_argument("--runs", type=int, default=3, help="每种实现运行次数")
+    parser.add_argument("--ratio", type=float, default=0.3, help="目标大小占原始大小的比例")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "photo.jpg")
+        make_photo(input_path, size)
+        target = int(os.path.getsize(input_path) * args.ratio)
+        tolerance = 0.1
+
+        legacy_output = os.path.join(work_dir, "legacy.jpg")
+        results = {"legacy": [], "probe": []}
+        for _ in range(args.runs):
+            results["legacy"].append(measure(
+                lambda: legacy_resize_by_filesize(input_path, legacy_output, target, tolerance)))
+            results["probe"].append(measure(
+                lambda: resize_engine.resize_by_filesize(input_path, target, tolerance)))
+
+    print(f"图像 {size[0]}x{size[1]}, 目标 {target} B, 运行 {args.runs} 次")
+    for name, runs in results.items():
+        syscw = sum(r["syscw"] for r in runs) / len(runs)
+        wchar = sum(r["wchar"] for r in runs) / len(runs)
+        seconds = sum(r["seconds"] for r in runs) / len(runs)
+        print(f"{name:>7}: 写调用 {syscw:8.0f} 次 | 写入 {wchar / 1024:10.1f} KB | 耗时 {seconds:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""对比原有对数步长启发式与区间割线搜索在固定语料上的编码次数和命中率
+
+用法: python benchmarks/bench_quality_solver.py [--count 8] [--tolerance 0.1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from unittest import mock
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_probe_io import legacy_resize_by_filesize  # noqa: E402
+from corpus import build_photo_corpus  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def count_legacy_encodes(input_path, output_path, target, tolerance) -> int:
+    """统计原有实现调用 Image.save 的次数"""
+    original_save = Image.Image.save
+    calls = []
+
+    def counting_save(img, *args, **kwargs):
+        calls.append(1)
+        return original_save(img, *args, **kwargs)
+
+    with mock.patch.object(Image.Image, "save", counting_save):
+        legacy_resize_by_filesize(input_path, output_path, target, tolerance)
+    return len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=8, help="语料图像数量")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="容差比例")
+    args = parser.parse_args()
+
+    ratios = (0.5, 0.25, 0.1, 0.03)
+    totals = {"legacy": [0, 0], "solver": [0, 0]}  # [编码次数, 容差内次数]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for path in build_photo_corpus(work_dir, args.count):
+            for ratio in ratios:
+                target = int(os.path.getsize(path) * ratio)
+                low, high = target * (1 - args.tolerance), target * (1 + args.tolerance)
+
+                legacy_output = os.path.join(work_dir, "legacy.jpg")
+                totals["legacy"][0] += count_legacy_encodes(path, legacy_output, target, args.tolerance)
+                totals["legacy"][1] += low <= os.path.getsize(legacy_output) <= high
+
+                result = resize_engine.resize_by_filesize(path, target, args.tolerance, predict=False)
+                totals["solver"][0] += result.encodes
+                totals["solver"][1] += low <= result.size <= high
+
+    jobs = args.count * len(ratios)
+    print(f"语料 {args.count} 张 × 目标比例 {ratios}, 容差 {args.tolerance:.0%}")
+    for name, (encodes, hits) in totals.items():
+        print(f"{name:>7}: 平均编码 {encodes / jobs:5.2f} 次/任务 | 容差内 {hits}/{jobs}")
+
+
+if __name__ == "__main__":
+    main()
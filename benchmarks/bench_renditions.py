@@ -0,0 +1,91 @@
+"""对比一次解码输出多个尺寸与逐个调用 resize_by_dimension 的 CPU 时间和画质
+
+用法: python benchmarks/bench_renditions.py [--size 6000x4000] [--widths 2560,1920,1280,960,640,320] [--runs 3]
+画质以各尺寸相对逐个调用结果的 PSNR 表示。
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_graphic, make_photo  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def psnr(path_a: str, path_b: str) -> float:
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mse = sum(ImageStat.Stat(diff).sum2) / (diff.width * diff.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def timed(func):
+    """返回 (CPU 秒, 墙钟秒, 结果)"""
+    cpu, wall = time.process_time(), time.perf_counter()
+    result = func()
+    return time.process_time() - cpu, time.perf_counter() - wall, result
+
+
+def run_independent(input_path: str, renditions, output_dir: str):
+    source_size = resize_engine.read_image_info(input_path).dimensions
+    results = []
+    for index, rendition in enumerate(renditions):
+        target = rendition.dimensions(source_size)
+        output_path = resize_engine.rendition_path(input_path, target, index, output_dir)
+        results.append(resize_engine.resize_by_dimension(input_path, target, output_path))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="6000x4000", help="合成源图像尺寸")
+    parser.add_argument("--widths", default="2560,1920,1280,960,640,320", help="逗号分隔的输出宽度")
+    parser.add_argument("--runs", type=int, default=3, help="每种方式运行次数（取中位数）")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    renditions = [resize_engine.Rendition(int(w)) for w in args.widths.split(",")]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = [(os.path.join(work_dir, "photo.jpg"), make_photo(size, seed=3), {"quality": 92}),
+                   (os.path.join(work_dir, "graphic.png"), make_graphic(size, seed=4), {})]
+        for input_path, img, options in sources:
+            img.save(input_path, **options)
+            del img
+            print(f"{os.path.basename(input_path)} {size[0]}x{size[1]} -> {len(renditions)} 个尺寸 "
+                  f"({args.widths})")
+
+            measurements = {}
+            for name, func in (
+                ("逐个调用", lambda: run_independent(input_path, renditions, os.path.join(work_dir, "single"))),
+                ("一次解码", lambda: resize_engine.resize_renditions(input_path, renditions,
+                                                                   os.path.join(work_dir, "multi"))),
+            ):
+                os.makedirs(os.path.join(work_dir, "single"), exist_ok=True)
+                os.makedirs(os.path.join(work_dir, "multi"), exist_ok=True)
+                runs = []
+                for _ in range(args.runs):
+                    resize_engine.metadata_cache.clear()
+                    runs.append(timed(func))
+                cpu = statistics.median(run[0] for run in runs)
+                wall = statistics.median(run[1] for run in runs)
+                measurements[name] = (cpu, runs[-1][2])
+                baseline = measurements["逐个调用"][0]
+                print(f"  {name}: CPU {cpu:6.3f} s | 墙钟 {wall:6.3f} s | {baseline / cpu:4.2f}x")
+
+            quality = [psnr(single.output_path, multi.output_path)
+                       for single, multi in zip(measurements["逐个调用"][1], measurements["一次解码"][1])]
+            print("  相对逐个调用的 PSNR: " + ", ".join(
+                f"{r.dimensions[0]}w {q:.1f} dB" for r, q in zip(measurements["一次解码"][1], quality)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""对本地 HTTP 调整服务施加并发负载，报告吞吐量（请求/秒）、延迟分位数和 503 拒绝数
+
+用法:
+    python benchmarks/bench_server.py [--concurrency 8] [--duration 10] [--mode dimension|filesize]
+    python benchmarks/bench_server.py --url http://127.0.0.1:8080 ...
+不指定 --url 时在当前进程内以 --workers / --max-queue 启动服务（端口自动分配）；
+每个客户端线程使用一个长连接循环发送同一张合成照片，收到 503 时按 Retry-After 之前的间隔重新连接后继续。
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_photo  # noqa: E402
+import resize_server  # noqa: E402
+
+# 收到 503 后重试前的等待时间（秒）；远小于 Retry-After，以便测量过载时的拒绝速度
+SHED_BACKOFF = 0.05
+
+
+def client(host: str, port: int, path: str, body: bytes, deadline: float, results: list, lock) -> None:
+    """循环发送请求直到 deadline，结果追加 (状态码, 延迟秒) 到 results"""
+    local = []
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request("POST", path, body, {"Content-Type": "application/octet-stream"})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close:
+                connection.close()
+        except (ConnectionError, http.client.HTTPException, OSError):
+            connection.close()
+            status = 0
+        local.append((status, time.perf_counter() - start))
+        if status in (0, 503):
+            time.sleep(SHED_BACKOFF)
+    connection.close()
+    with lock:
+        results.extend(local)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="已运行的服务地址（默认在进程内启动）")
+    parser.add_argument("--workers", type=int, default=2, help="进程内服务的工作线程数")
+    parser.add_argument("--max-queue", type=int, default=4, help="进程内服务的最大排队数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=10, help="施压时长（秒）")
+    parser.add_argument("--mode", choices=("dimension", "filesize"), default="dimension", help="请求的接口")
+    parser.add_argument("--size", default="2000x1500", help="请求图像的像素尺寸")
+    parser.add_argument("--max-p99", type=float, default=0, help="成功请求 p99 延迟上限（毫秒），超出时以状态码 1 退出")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    buffer = io.BytesIO()
+    make_photo((width, height), seed=5).save(buffer, "JPEG", quality=90)
+    body = buffer.getvalue()
+    path = {"dimension": f"/resize/dimension?size={width // 4}x{height // 4}",
+            "filesize": f"/resize/filesize?target={len(body) // 5}"}[args.mode]
+
+    server = service = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        service = resize_server.ResizeService(args.workers, args.max_queue)
+        server = resize_server.make_server(service, "127.0.0.1", 0, quiet=True)
+        host, port = server.server_address[:2]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{args.mode}: {len(body) // 1024} KB 输入，{args.concurrency} 个客户端，{args.duration:g} s -> "
+          f"http://{host}:{port}{path}")
+    results = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    cpu = time.process_time()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(host, port, path, body, deadline, results, lock))
+               for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    ok = sorted(latency for status, latency in results if status == 200)
+    shed = sum(status == 503 for status, _ in results)
+    errors = len(results) - len(ok) - shed
+    p50 = statistics.median(ok) * 1000 if ok else 0.0
+    p99 = resize_server.percentile(ok, 0.99) * 1000
+    print(f"  成功 {len(ok)} 个（{len(ok) / elapsed:6.1f} 请求/s）| p50 {p50:7.1f} ms | p99 {p99:7.1f} ms")
+    print(f"  503 拒绝 {shed} 个 | 其他错误 {errors} 个"
+          + (f" | 进程 CPU {cpu:.1f} s（{cpu / elapsed:.0%}）" if server else ""))
+
+    if server is not None:
+        metrics = service.metrics()
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+        print("  服务指标: " + json.dumps({k: metrics[k] for k in ("responses", "shed", "latency_ms")},
+                                      ensure_ascii=False))
+
+    failures = errors + (args.max_p99 > 0 and p99 > args.max_p99)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
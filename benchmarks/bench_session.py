@@ -0,0 +1,59 @@
+"""模拟在图形界面中对同一图像反复尝试相近的目标大小，对比使用与不使用会话缓存的耗时
+
+用法: python benchmarks/bench_session.py [--size 4000x3000] [--targets 0.2,0.22,0.18,0.2] [--formats jpeg,webp]
+目标大小以源文件大小的比例给出，依次调整；每一步输出耗时和编码次数。
+会话缓存只减少编码次数，每一步的输出尺寸应与无缓存时相同。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_alpha, make_photo  # noqa: E402
+import resize_cli  # noqa: E402
+import resize_engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="4000x3000", help="合成源图像尺寸")
+    parser.add_argument("--targets", default="0.2,0.22,0.18,0.2,0.08,0.085",
+                        help="逗号分隔的目标大小（相对源文件大小的比例）")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="文件大小容差比例")
+    parser.add_argument("--formats", type=resize_cli.parse_formats, help="候选输出格式（默认按扩展名）")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    ratios = [float(v) for v in args.targets.split(",")]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        sources = [(os.path.join(work_dir, "photo.jpg"), make_photo((width, height), seed=1), {"quality": 92}),
+                   (os.path.join(work_dir, "alpha.png"), make_alpha((width // 2, height // 2), seed=2), {})]
+        for input_path, img, options in sources:
+            img.save(input_path, **options)
+            del img
+            source_size = os.path.getsize(input_path)
+            print(f"{os.path.basename(input_path)} ({resize_engine.format_size(source_size)})")
+            output_path = os.path.join(work_dir, "out" + os.path.splitext(input_path)[1])
+
+            totals = {}
+            for name, session in (("无缓存", None), ("会话缓存", resize_engine.SessionCache())):
+                timings = []
+                for ratio in ratios:
+                    resize_engine.metadata_cache.clear()
+                    start = time.perf_counter()
+                    result = resize_engine.resize_by_filesize(input_path, int(source_size * ratio), args.tolerance,
+                                                              output_path, formats=args.formats, session=session)
+                    timings.append(time.perf_counter() - start)
+                    print(f"  {name:>4} {ratio:5.1%}: {timings[-1] * 1000:8.1f} ms | 编码 {result.encodes:>2} 次 | "
+                          f"{resize_engine.format_size(result.size)} {result.dimensions[0]}x{result.dimensions[1]}")
+                totals[name] = sum(timings[1:])
+            print(f"  首次之后合计: 无缓存 {totals['无缓存']:.2f} s，会话缓存 {totals['会话缓存']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""测量各入口模块的导入时间和图形界面首个窗口的显示时间，超出预算时以状态码 1 退出
+
+用法:
+    python benchmarks/bench_startup.py [--runs 7] [--budget resize_engine=80 --budget first_window=600]
+导入时间取 python -X importtime 报告的模块累计时间（毫秒，多次运行的中位数）；
+同时检查引擎和命令行没有导入 tkinter / tkinterdnd2，且导入时没有加载任何 Pillow 格式插件。
+首个窗口时间从子进程开始导入到主窗口完成首次绘制，没有图形环境（DISPLAY）时跳过。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认预算（毫秒），约为开发机实测值的两倍
+BUDGETS = {
+    "resize_engine": 80,
+    "resize_batch": 90,
+    "resize_cli": 110,
+    "first_window": 600,
+}
+
+# 非图形入口不允许导入的模块前缀
+FORBIDDEN = ("tkinter", "_tkinter", "tkinterdnd2", "multiprocessing")
+
+FIRST_WINDOW_SCRIPT = """
+import time
+start = time.perf_counter()
+import photo_size_tools
+root = photo_size_tools.create_root()
+app = photo_size_tools.ImageResizerApp(root)
+root.update()
+print((time.perf_counter() - start) * 1000)
+root.destroy()
+"""
+
+
+def run_python(args, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module: str) -> float:
+    """python -X importtime 报告的模块累计导入时间（毫秒）"""
+    stderr = run_python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise Exception(f"importtime 输出中没有 {module}")
+
+
+def loaded_modules(module: str) -> list:
+    output = run_python(["-c", f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"]).stdout
+    return json.loads(output)
+
+
+def parse_budget(text: str):
+    name, _, value = text.partition("=")
+    if name not in BUDGETS or not value:
+        raise argparse.ArgumentTypeError(f"无效的预算: {text}（可选: {', '.join(BUDGETS)}）")
+    return name, float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="每项测量次数（取中位数）")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[],
+                        help="覆盖默认预算，如 resize_cli=150")
+    args = parser.parse_args()
+    budgets = dict(BUDGETS, **dict(args.budget))
+
+    # 先编译字节码，避免第一次运行把编译时间计入导入时间
+    run_python(["-m", "compileall", "-q", ROOT])
+
+    failures = 0
+    for module in ("resize_engine", "resize_batch", "resize_cli"):
+        median = statistics.median(import_time_ms(module) for _ in range(args.runs))
+        modules = loaded_modules(module)
+        forbidden = [name for name in modules if name.split(".")[0] in FORBIDDEN]
+        plugins = [name for name in modules if name.startswith("PIL.") and name.endswith("ImagePlugin")]
+        over = median > budgets[module]
+        failures += over + bool(forbidden) + bool(plugins)
+        print(f"{module:>14}: 导入 {median:6.1f} ms（预算 {budgets[module]:.0f}）{' <-- 超出预算' if over else ''}")
+        if forbidden:
+            print(f"{'':>16}不应导入: {', '.join(forbidden)}")
+        if plugins:
+            print(f"{'':>16}导入时加载了格式插件: {', '.join(plugins)}")
+
+    if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        print(f"{'first_window':>14}: 跳过（没有 DISPLAY）")
+    else:
+        timings = [float(run_python(["-c", FIRST_WINDOW_SCRIPT]).stdout) for _ in range(args.runs)]
+        median = statistics.median(timings)
+        over = median > budgets["first_window"]
+        failures += over
+        print(f"{'first_window':>14}: {median:6.1f} ms（预算 {budgets['first_window']:.0f}）"
+              f"{' <-- 超出预算' if over else ''}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
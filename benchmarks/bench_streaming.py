@@ -0,0 +1,111 @@
+"""测量设置内存预算后分条带处理超大图像的峰值内存和画质
+
+用法: python benchmarks/bench_streaming.py [--size 12000x8000] [--budget 64MB] [--target 1600x1067]
+源图像为逐行写出的 PPM（生成过程不在内存中保存整图）；每种配置在独立子进程中运行以测量峰值 RSS，
+画质以相对不设预算时整图缩放结果的 PSNR 表示；分条带处理的峰值 RSS 超出预算时以状态码 1 退出。
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resize_cli  # noqa: E402
+import resize_engine  # noqa: E402
+
+STRIP_ROWS = 256
+
+
+def write_large_ppm(path: str, size) -> None:
+    """逐条带写出带噪声和渐变的合成 PPM，内存中只保留一个条带"""
+    width, height = size
+    with open(path, "wb") as f:
+        f.write(f"P6 {width} {height} 255\n".encode())
+        for top in range(0, height, STRIP_ROWS):
+            rows = min(STRIP_ROWS, height - top)
+            noise = Image.effect_noise((width, rows), 48).convert("RGB")
+            gradient = Image.linear_gradient("L").resize((width, rows)).convert("RGB")
+            f.write(Image.blend(noise, gradient, 0.5).tobytes())
+
+
+def psnr(path_a: str, path_b: str) -> float:
+    """两张同尺寸图像之间的 PSNR（dB）"""
+    with Image.open(path_a) as a, Image.open(path_b) as b:
+        diff = ImageChops.difference(a.convert("RGB"), b.convert("RGB"))
+    mse = sum(ImageStat.Stat(diff).sum2) / (diff.width * diff.height * 3)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def read_peak_rss_kb() -> int:
+    """当前进程的峰值 RSS（VmHWM，exec 后重新计数，不继承父进程）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def run_one(input_path: str, output_path: str, target_size, memory_budget) -> None:
+    """子进程入口：执行一次缩放并输出耗时、峰值 RSS 和解释器基线 RSS"""
+    baseline = read_peak_rss_kb()
+    start = time.perf_counter()
+    resize_engine.resize_by_dimension(input_path, target_size, output_path, memory_budget=memory_budget)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "peak_rss_kb": read_peak_rss_kb(), "baseline_kb": baseline}))
+
+
+def spawn(input_path: str, output_path: str, target_size, memory_budget) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--run", input_path, output_path,
+               f"{target_size[0]}x{target_size[1]}", str(memory_budget or 0)]
+    return json.loads(subprocess.check_output(command))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="12000x8000", help="合成 PPM 尺寸")
+    parser.add_argument("--budget", default="64MB", help="内存预算，如 64MB")
+    parser.add_argument("--target", default="1600x1067", help="缩放目标尺寸")
+    parser.add_argument("--skip-reference", action="store_true", help="不运行整图缩放（源图像过大时）")
+    parser.add_argument("--run", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        input_path, output_path, size_text, budget_text = args.run
+        run_one(input_path, output_path, resize_cli.parse_dimension(size_text), int(budget_text) or None)
+        return 0
+
+    size = resize_cli.parse_dimension(args.size)
+    target_size = resize_cli.parse_dimension(args.target)
+    budget = resize_cli.parse_filesize(args.budget)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_path = os.path.join(work_dir, "source.ppm")
+        write_large_ppm(input_path, size)
+        print(f"源图像 {size[0]}x{size[1]} PPM（解码约 {resize_engine.format_size(size[0] * size[1] * 4)}）"
+              f" -> {target_size[0]}x{target_size[1]}")
+
+        streamed = os.path.join(work_dir, "streamed.png")
+        stats = spawn(input_path, streamed, target_size, budget)
+        over_baseline = (stats["peak_rss_kb"] - stats["baseline_kb"]) * 1024
+        print(f"  预算 {args.budget:>6}: {stats['seconds']:6.2f} s | 峰值 RSS {stats['peak_rss_kb'] / 1024:7.1f} MB "
+              f"（解释器基线之上 {resize_engine.format_size(over_baseline)}）"
+              f"{'' if over_baseline <= budget else ' | 超出预算'}")
+
+        if not args.skip_reference:
+            reference = os.path.join(work_dir, "reference.png")
+            base = spawn(input_path, reference, target_size, None)
+            print(f"  不设预算: {base['seconds']:6.2f} s | 峰值 RSS {base['peak_rss_kb'] / 1024:7.1f} MB | "
+                  f"PSNR {psnr(reference, streamed):6.2f} dB")
+
+    return 0 if over_baseline <= budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""在确定性混合语料上测量两种调整方式的吞吐量、延迟分位数、峰值内存、编码次数和容差命中率
+
+用法:
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --baseline results.json --threshold 10
+
+结果以 JSON 输出，可保存为基线；给定 --baseline 时逐项对比，任一指标劣化超过阈值则以状态码 1 退出。
+每种调整方式在独立子进程中运行；每个任务前重置峰值 RSS（/proc/self/clear_refs），仅支持 Linux。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import PIL
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import build_corpus, corpus_items  # noqa: E402
+import resize_batch  # noqa: E402
+import resize_cli  # noqa: E402
+import resize_engine  # noqa: E402
+
+MODES = ("dimension", "filesize")
+
+# 指标名 -> 是否越大越好
+METRICS = {
+    "throughput_jobs_per_s": True,
+    "throughput_mpix_per_s": True,
+    "latency_p50_ms": False,
+    "latency_p90_ms": False,
+    "latency_p99_ms": False,
+    "peak_rss_mb": False,
+    "encodes_per_job": False,
+    "hit_rate": True,
+}
+
+
+def read_status_kb(field: str) -> int:
+    """读取 /proc/self/status 中的内存字段（kB）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak_rss() -> None:
+    """将峰值 RSS（VmHWM）重置为当前 RSS"""
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def percentile(values, fraction: float) -> float:
+    """最近秩法分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def make_job(path: str, mode: str, output_path: str, args) -> resize_batch.ResizeJob:
+    """按基准参数生成单个任务：尺寸模式按比例缩小各边，文件大小模式以原始大小的比例为目标"""
+    if mode == "dimension":
+        width, height = resize_engine.read_image_info(path).dimensions
+        target = (max(1, round(width * args.scale)), max(1, round(height * args.scale)))
+        return resize_batch.ResizeJob(path, mode, target, output_path=output_path)
+    target = max(1, int(os.path.getsize(path) * args.ratio))
+    return resize_batch.ResizeJob(path, mode, target, args.tolerance, output_path)
+
+
+def run_mode(corpus_dir: str, mode: str, args) -> None:
+    """子进程入口：依次执行语料中的全部任务，每个任务一行 JSON"""
+    output_dir = os.path.join(corpus_dir, "out_" + mode)
+    os.makedirs(output_dir, exist_ok=True)
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if not os.path.isfile(path):
+            continue
+        job = make_job(path, mode, resize_engine.get_output_path(path, output_dir), args)
+        info = resize_engine.read_image_info(path)
+        record = {"file": name, "format": info.format, "input_bytes": info.size,
+                  "pixels": info.dimensions[0] * info.dimensions[1], "target": job.target, "latencies_ms": []}
+
+        for _ in range(args.repeat):
+            # 每次都从冷缓存开始，与单次命令行调用一致
+            resize_engine.metadata_cache.clear()
+            rss_before = read_status_kb("VmRSS")
+            reset_peak_rss()
+            start = time.perf_counter()
+            outcome = resize_batch.run_job(job)
+            record["latencies_ms"].append((time.perf_counter() - start) * 1000)
+            record["peak_rss_kb"] = max(record.get("peak_rss_kb", 0), read_status_kb("VmHWM") - rss_before)
+
+        if outcome.ok:
+            result = outcome.result
+            record.update(output_bytes=result.size, dimensions=result.dimensions, encodes=result.encodes)
+            if mode == "filesize":
+                target = job.target
+                record["in_tolerance"] = target * (1 - args.tolerance) <= result.size <= target * (1 + args.tolerance)
+        else:
+            record["error"] = outcome.error
+        print(json.dumps(record), flush=True)
+
+
+def summarize(records, mode: str) -> dict:
+    """汇总单个调整方式的全部任务"""
+    succeeded = [r for r in records if "error" not in r]
+    latencies = [ms for r in records for ms in r["latencies_ms"]]
+    total_seconds = sum(latencies) / 1000
+    repeat = len(records[0]["latencies_ms"]) if records else 1
+    summary = {
+        "jobs": len(records),
+        "failures": len(records) - len(succeeded),
+        "throughput_jobs_per_s": len(latencies) / total_seconds if total_seconds else 0.0,
+        "throughput_mpix_per_s": sum(r["pixels"] for r in records) * repeat / 1e6 / total_seconds
+        if total_seconds else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.5),
+        "latency_p90_ms": percentile(latencies, 0.9),
+        "latency_p99_ms": percentile(latencies, 0.99),
+        "peak_rss_mb": max(r["peak_rss_kb"] for r in records) / 1024,
+        "encodes_per_job": statistics.mean(r["encodes"] for r in succeeded) if succeeded else 0.0,
+    }
+    if mode == "filesize":
+        summary["hit_rate"] = sum(r.get("in_tolerance", False) for r in records) / len(records)
+    return summary
+
+
+def spawn(corpus_dir: str, mode: str, args) -> list:
+    command = [sys.executable, os.path.abspath(__file__), "--run", corpus_dir, mode,
+               "--repeat", str(args.repeat), "--ratio", str(args.ratio),
+               "--tolerance", str(args.tolerance), "--scale", str(args.scale)]
+    # 固定 mmap 阈值，使大块像素内存释放后立即归还系统，各任务的峰值 RSS 互不干扰
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_="131072", MALLOC_TRIM_THRESHOLD_="131072")
+    output = subprocess.check_output(command, text=True, env=env)
+    return [json.loads(line) for line in output.splitlines() if line.strip()]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """逐项对比基线，打印变化并返回劣化超过阈值的指标数"""
+    regressions = 0
+    print(f"\n与基线对比（阈值 {threshold:.0f}%）")
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in current["summary"] or metric not in previous["summary"]:
+                continue
+            new, old = current["summary"][metric], previous["summary"][metric]
+            change = (new - old) / old * 100 if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                regressions += 1
+                flag = "  <-- 劣化"
+            print(f"  {mode:>9} {metric:<22} {old:10.2f} -> {new:10.2f} ({change:+6.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default=",".join(MODES), help="逗号分隔的调整方式")
+    parser.add_argument("--repeat", type=int, default=3, help="每个任务重复次数")
+    parser.add_argument("--scale", type=float, default=0.5, help="尺寸模式下各边缩放比例")
+    parser.add_argument("--ratio", type=float, default=0.3, help="文件大小模式下目标大小占原始大小的比例")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="文件大小容差比例")
+    parser.add_argument("--huge-size", default="6000x4000", help="超大图像尺寸，0 表示不生成")
+    parser.add_argument("--seed", type=int, default=0, help="语料随机种子")
+    parser.add_argument("--output", help="结果 JSON 保存路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", help="用于对比的基线 JSON")
+    parser.add_argument("--threshold", type=float, default=10, help="判定劣化的变化百分比")
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(args.run[0], args.run[1], args)
+        return 0
+
+    huge_size = None if args.huge_size == "0" else resize_cli.parse_dimension(args.huge_size)
+    items = corpus_items(huge_size)
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "parameters": {key: getattr(args, key) for key in ("repeat", "scale", "ratio", "tolerance", "seed")},
+        "corpus": [{"name": item.name, "kind": item.kind, "size": item.size, "extension": item.extension}
+                   for item in items],
+        "modes": {},
+    }
+    results["parameters"]["huge_size"] = huge_size
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        build_corpus(corpus_dir, items, args.seed)
+        for mode in args.modes.split(","):
+            records = spawn(corpus_dir, mode, args)
+            results["modes"][mode] = {"summary": summarize(records, mode), "jobs": records}
+
+    for mode, data in results["modes"].items():
+        summary = data["summary"]
+        hit = f" | 容差内 {summary['hit_rate']:.0%}" if "hit_rate" in summary else ""
+        print(f"{mode:>9}: {summary['throughput_jobs_per_s']:6.2f} 任务/s | "
+              f"p50 {summary['latency_p50_ms']:7.1f} ms | p99 {summary['latency_p99_ms']:7.1f} ms | "
+              f"峰值 {summary['peak_rss_mb']:6.1f} MB | 编码 {summary['encodes_per_job']:4.2f} 次/任务{hit}"
+              f"{' | 失败 %d' % summary['failures'] if summary['failures'] else ''}", file=sys.stderr)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    elif not args.baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""向监视目录突发写入大量文件，检查处理过程中 CPU 和内存保持平稳，重启后不重复处理
+
+用法: python benchmarks/bench_watch.py [--files 5000] [--workers 1] [--max-rss-growth 32]
+监视器在当前进程内运行（--workers 1 时在线程中处理，CPU 时间和 RSS 包含全部工作）；
+按已处理文件数分为四段，比较各段每个文件的 CPU 时间和段末 RSS，劣化超过阈值时以状态码 1 退出。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resize_batch  # noqa: E402
+import resize_engine  # noqa: E402
+import resize_watch  # noqa: E402
+from PIL import Image  # noqa: E402
+
+SAMPLE_INTERVAL = 0.25
+
+
+def read_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def write_burst(inbox: str, count: int) -> None:
+    """尽快写入 count 个小 JPEG，分散到 10 个子目录"""
+    img = Image.effect_noise((160, 120), 40).convert("RGB")
+    for index in range(count):
+        directory = os.path.join(inbox, f"batch{index % 10}")
+        os.makedirs(directory, exist_ok=True)
+        img.save(os.path.join(directory, f"img{index:05d}.jpg"), quality=85)
+
+
+def make_watcher(inbox: str, output_dir: str, journal: resize_watch.Journal, args) -> resize_watch.Watcher:
+    def make_job(path):
+        return resize_batch.ResizeJob(path, "dimension", (80, 60),
+                                      output_path=resize_engine.get_output_path(path, output_dir))
+
+    return resize_watch.Watcher([inbox], make_job, journal, args.workers, args.max_pending,
+                                args.interval, args.settle, exclude=[output_dir])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000, help="突发写入的文件数")
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数（1 表示在线程中处理）")
+    parser.add_argument("--max-pending", type=int, default=16, help="最多同时提交的任务数")
+    parser.add_argument("--interval", type=float, default=0.2, help="扫描间隔秒数")
+    parser.add_argument("--settle", type=float, default=0.5, help="写入完成判定秒数")
+    parser.add_argument("--max-rss-growth", type=float, default=32, help="第一段末到最后一段末允许的 RSS 增长（MB）")
+    parser.add_argument("--max-cpu-ratio", type=float, default=1.5, help="最后一段与第一段每文件 CPU 时间的最大比值")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        inbox = os.path.join(work_dir, "inbox")
+        output_dir = os.path.join(work_dir, "out")
+        os.makedirs(inbox)
+        os.makedirs(output_dir)
+        journal_path = os.path.join(output_dir, resize_watch.DEFAULT_JOURNAL_NAME)
+
+        journal = resize_watch.Journal(journal_path)
+        watcher = make_watcher(inbox, output_dir, journal, args)
+        runner = threading.Thread(target=watcher.run)
+        writer = threading.Thread(target=write_burst, args=(inbox, args.files))
+        start = time.perf_counter()
+        runner.start()
+        writer.start()
+
+        # (已处理文件数, CPU 秒, RSS kB, 等待中的文件数)
+        samples = []
+        while watcher.succeeded + watcher.failed < args.files and runner.is_alive():
+            time.sleep(SAMPLE_INTERVAL)
+            samples.append((watcher.succeeded + watcher.failed, time.process_time(), read_rss_kb(),
+                            len(watcher.unsettled)))
+        elapsed = time.perf_counter() - start
+        watcher.stop()
+        runner.join()
+        writer.join()
+        journal.close()
+
+        print(f"{args.files} 个文件: {elapsed:6.2f} s（{args.files / elapsed:6.1f} 个/s），"
+              f"成功 {watcher.succeeded}，失败 {watcher.failed}，最多等待写入完成 {max(s[3] for s in samples)} 个")
+        failures = watcher.failed + (watcher.succeeded != args.files)
+
+        quarters = []
+        for quarter in range(1, 5):
+            sample = next(s for s in samples if s[0] >= args.files * quarter / 4)
+            quarters.append(sample)
+        previous = (0, samples[0][1], samples[0][2], 0)
+        cpu_per_file = []
+        for quarter, sample in enumerate(quarters, 1):
+            files = sample[0] - previous[0]
+            cpu_per_file.append((sample[1] - previous[1]) / files * 1000 if files else 0.0)
+            print(f"  第 {quarter} 段: 累计 {sample[0]:>5} 个 | CPU {cpu_per_file[-1]:6.2f} ms/个 | "
+                  f"RSS {sample[2] / 1024:7.1f} MB")
+            previous = sample
+
+        growth = (quarters[-1][2] - quarters[0][2]) / 1024
+        ratio = cpu_per_file[-1] / cpu_per_file[0] if cpu_per_file[0] else 0.0
+        if growth > args.max_rss_growth:
+            failures += 1
+            print(f"  RSS 增长 {growth:.1f} MB，超过 {args.max_rss_growth:.0f} MB")
+        if ratio > args.max_cpu_ratio:
+            failures += 1
+            print(f"  每文件 CPU 时间增长到第一段的 {ratio:.2f} 倍，超过 {args.max_cpu_ratio:.2f}")
+
+        # 重启：日志中的文件都不应再次处理
+        journal = resize_watch.Journal(journal_path)
+        restarted = make_watcher(inbox, output_dir, journal, args)
+        start = time.perf_counter()
+        restarted.run(once=True)
+        journal.close()
+        print(f"重启后处理 {restarted.submitted} 个文件，扫描耗时 {time.perf_counter() - start:.2f} s")
+        failures += restarted.submitted != 0
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
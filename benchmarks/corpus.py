@@ -0,0 +1,112 @@
+"""基准测试使用的确定性合成图像语料"""
+import os
+import random
+from typing import List, NamedTuple, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def make_photo(size: Tuple[int, int], seed: int) -> Image.Image:
+    """生成类照片图像：随机色块经模糊后叠加颗粒噪声"""
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 2 + 1), y0 + rng.randrange(height // 2 + 1)
+        draw.ellipse((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    img = img.filter(ImageFilter.GaussianBlur(radius=max(1, width // 200)))
+
+    grain = Image.frombytes("L", size, rng.randbytes(width * height)).convert("RGB")
+    return Image.blend(img, grain, 0.15)
+
+
+def build_photo_corpus(directory: str, count: int = 8, seed: int = 0) -> List[str]:
+    """在 directory 中生成 count 张不同尺寸的 JPEG 照片，返回文件路径列表"""
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        size = (rng.randrange(800, 2400), rng.randrange(600, 1800))
+        path = os.path.join(directory, f"photo_{index:03d}.jpg")
+        make_photo(size, seed + index).save(path, quality=rng.randrange(85, 96))
+        paths.append(path)
+    return paths
+
+
+def make_graphic(size: Tuple[int, int], seed: int) -> Image.Image:
+    """生成平面图形：少量纯色矩形、线条和文字，无噪声"""
+    rng = random.Random(seed)
+    width, height = size
+    palette = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(6)]
+    img = Image.new("RGB", size, palette[0])
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 3 + 1), y0 + rng.randrange(height // 3 + 1)
+        draw.rectangle((x0, y0, x1, y1), fill=rng.choice(palette[1:]))
+    for _ in range(8):
+        draw.line((rng.randrange(width), rng.randrange(height), rng.randrange(width), rng.randrange(height)),
+                  fill=rng.choice(palette), width=max(1, width // 300))
+    for row in range(0, height, max(12, height // 20)):
+        draw.text((rng.randrange(max(1, width // 4)), row), "imageSizeTool", fill=rng.choice(palette))
+    return img
+
+
+def make_alpha(size: Tuple[int, int], seed: int) -> Image.Image:
+    """生成带透明通道的图像：类照片内容，椭圆区域外透明、边缘渐变"""
+    img = make_photo(size, seed).convert("RGBA")
+    width, height = size
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse((width // 10, height // 10, width * 9 // 10, height * 9 // 10), fill=255)
+    img.putalpha(mask.filter(ImageFilter.GaussianBlur(radius=max(1, width // 50))))
+    return img
+
+
+class CorpusItem(NamedTuple):
+    """语料中的一张图像；kind 为 photo / graphic / alpha，extension 决定保存格式"""
+    name: str
+    kind: str
+    size: Tuple[int, int]
+    extension: str
+
+
+GENERATORS = {"photo": make_photo, "graphic": make_graphic, "alpha": make_alpha}
+
+
+def corpus_items(huge_size: Tuple[int, int] = (6000, 4000)) -> List[CorpusItem]:
+    """混合语料：照片、平面图形、透明 PNG，极小和超大尺寸，覆盖 JPEG/PNG/BMP/GIF/TIFF"""
+    items = [
+        CorpusItem("photo_small", "photo", (640, 480), ".jpg"),
+        CorpusItem("photo_medium", "photo", (1600, 1200), ".jpg"),
+        CorpusItem("photo_large", "photo", (3000, 2000), ".jpg"),
+        CorpusItem("photo_png", "photo", (1200, 900), ".png"),
+        CorpusItem("photo_bmp", "photo", (1200, 900), ".bmp"),
+        CorpusItem("photo_tiff", "photo", (1200, 900), ".tif"),
+        CorpusItem("graphic_png", "graphic", (1280, 720), ".png"),
+        CorpusItem("graphic_gif", "graphic", (800, 600), ".gif"),
+        CorpusItem("graphic_bmp", "graphic", (1024, 768), ".bmp"),
+        CorpusItem("alpha_png", "alpha", (1200, 900), ".png"),
+        CorpusItem("alpha_small_png", "alpha", (400, 400), ".png"),
+        CorpusItem("tiny_jpg", "photo", (48, 32), ".jpg"),
+        CorpusItem("tiny_png", "graphic", (32, 32), ".png"),
+    ]
+    if huge_size:
+        items.append(CorpusItem("photo_huge", "photo", huge_size, ".jpg"))
+    return items
+
+
+def build_corpus(directory: str, items: List[CorpusItem], seed: int = 0) -> List[str]:
+    """在 directory 中生成 items 中的图像，返回与 items 一一对应的文件路径"""
+    paths = []
+    for index, item in enumerate(items):
+        img = GENERATORS[item.kind](item.size, seed + index)
+        path = os.path.join(directory, item.name + item.extension)
+        if item.extension == ".jpg":
+            img.save(path, quality=90)
+        elif item.extension == ".gif":
+            img.convert("P", palette=Image.Palette.ADAPTIVE).save(path)
+        else:
+            img.save(path)
+        paths.append(path)
+    return paths
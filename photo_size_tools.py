@@ -1,18 +1,76 @@
+import importlib.util
 import os
+import queue
+import sys
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image
-from tkinterdnd2 import TkinterDnD, DND_FILES
-import math
-import tempfile
 from typing import Tuple, Optional
 
+
+def lazy_import(name: str):
+    """返回首次访问属性时才执行的模块（importlib.util.LazyLoader）"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# 引擎连同 PIL 在窗口显示后才导入，不占用首个窗口的启动时间
+resize_engine = lazy_import("resize_engine")
+
+# 窗口创建后预先导入引擎的延迟（毫秒），留出首次绘制的时间
+ENGINE_PRELOAD_DELAY_MS = 100
+
+# 后台任务消息的轮询间隔（毫秒）
+POLL_INTERVAL_MS = 50
+
+# 每次轮询最多处理的消息数和插入队列表格的行数，避免大批量时界面卡顿
+MAX_MESSAGES_PER_POLL = 500
+MAX_ROWS_PER_INSERT = 500
+
+# 参数停止变化后刷新预览的延迟（毫秒）
+PREVIEW_DEBOUNCE_MS = 150
+
+# 预览图像的最大显示尺寸（像素）
+PREVIEW_BOX = (480, 240)
+
+# 同时处理的图像数（Pillow 编解码时释放 GIL，线程即可并行）
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# 队列项状态及显示文字
+QUEUE_STATES = {
+    "pending": "等待",
+    "running": "处理中",
+    "done": "完成",
+    "failed": "失败",
+}
+
+
+class QueueItem:
+    """处理队列中的一个文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = "pending"
+        self.output_size = None  # 输出字节数
+        self.elapsed = None  # 耗时（秒）
+        self.error = None
+
+
 # 客户端原始代码
 class ImageResizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("图片大小/尺寸调整工具 - jerryxiao.dev@outlook.com")
-        self.root.geometry("750x600")
+        self.root.geometry("750x1060")
         self.root.configure(bg="#f0f0f0")
 
         # 创建拖放区域
@@ -28,9 +86,12 @@ class ImageResizerApp:
         )
         self.drop_label.pack(expand=True)
 
-        # 注册拖放功能
-        self.drop_frame.drop_target_register(DND_FILES)
-        self.drop_frame.dnd_bind('<<Drop>>', self.on_drop)
+        # 注册拖放功能（tkdnd 不可用时只能点击选择）
+        if getattr(root, "TkdndVersion", None):
+            self.drop_frame.drop_target_register("DND_Files")
+            self.drop_frame.dnd_bind('<<Drop>>', self.on_drop)
+        else:
+            self.drop_label.config(text="点击选择图像（当前环境不支持拖放）")
 
         # 添加选择文件按钮
         self.select_btn = ttk.Button(
@@ -93,11 +154,13 @@ class ImageResizerApp:
         self.dimension_frame = ttk.Frame(self.params_frame)
 
         ttk.Label(self.dimension_frame, text="宽度 (px):").grid(row=0, column=0, padx=10, pady=10, sticky=tk.W)
-        self.width_entry = ttk.Entry(self.dimension_frame, width=10)
+        self.width_var = tk.StringVar()
+        self.width_entry = ttk.Entry(self.dimension_frame, textvariable=self.width_var, width=10)
         self.width_entry.grid(row=0, column=1, padx=5, pady=10)
 
         ttk.Label(self.dimension_frame, text="高度 (px):").grid(row=0, column=2, padx=10, pady=10, sticky=tk.W)
-        self.height_entry = ttk.Entry(self.dimension_frame, width=10)
+        self.height_var = tk.StringVar()
+        self.height_entry = ttk.Entry(self.dimension_frame, textvariable=self.height_var, width=10)
         self.height_entry.grid(row=0, column=3, padx=5, pady=10)
 
         self.preserve_ratio_var = tk.BooleanVar(value=True)
@@ -119,7 +182,8 @@ class ImageResizerApp:
         self.filesize_frame = ttk.Frame(self.params_frame)
 
         ttk.Label(self.filesize_frame, text="目标大小:").grid(row=0, column=0, padx=10, pady=10, sticky=tk.W)
-        self.size_value_entry = ttk.Entry(self.filesize_frame, width=10)
+        self.size_value_var = tk.StringVar()
+        self.size_value_entry = ttk.Entry(self.filesize_frame, textvariable=self.size_value_var, width=10)
         self.size_value_entry.grid(row=0, column=1, padx=5, pady=10)
 
         self.size_unit_var = tk.StringVar(value="KB")
@@ -138,14 +202,80 @@ class ImageResizerApp:
         ttk.Entry(self.filesize_frame, textvariable=self.tolerance_var, width=5).grid(row=0, column=4, padx=5, pady=10)
         ttk.Label(self.filesize_frame, text="%").grid(row=0, column=5, padx=0, pady=10)
 
+        # 预览：按当前参数显示输出效果和预计大小，参数变化停止 PREVIEW_DEBOUNCE_MS 后刷新
+        self.preview_frame = ttk.LabelFrame(root, text="预览")
+        self.preview_frame.pack(padx=20, pady=5, fill=tk.X)
+
+        self.preview_label = tk.Label(
+            self.preview_frame,
+            text="载入图像后显示预览",
+            bg="#f0f0f0",
+            width=PREVIEW_BOX[0],
+            height=PREVIEW_BOX[1]
+        )
+        # 以像素为单位固定预览区域大小（标签显示图像时 width/height 按像素计）
+        self.preview_blank = tk.PhotoImage(width=1, height=1)
+        self.preview_label.config(image=self.preview_blank, compound=tk.CENTER)
+        self.preview_label.pack(pady=5)
+
+        self.preview_info_var = tk.StringVar()
+        tk.Label(
+            self.preview_frame,
+            textvariable=self.preview_info_var,
+            bg="#f0f0f0",
+            justify=tk.LEFT
+        ).pack(pady=(0, 5), padx=10, anchor=tk.W)
+
         # 处理按钮
+        self.action_frame = ttk.Frame(root)
+        self.action_frame.pack(pady=15)
+
         self.process_btn = ttk.Button(
-            root,
+            self.action_frame,
             text="开始调整",
             command=self.process_image,
             state=tk.DISABLED
         )
-        self.process_btn.pack(pady=15)
+        self.process_btn.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_btn = ttk.Button(
+            self.action_frame,
+            text="取消",
+            command=self.cancel_processing,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+
+        self.clear_btn = ttk.Button(
+            self.action_frame,
+            text="清空队列",
+            command=self.clear_queue
+        )
+        self.clear_btn.pack(side=tk.LEFT, padx=5)
+
+        # 处理队列
+        self.queue_frame = ttk.LabelFrame(root, text="处理队列")
+        self.queue_frame.pack(padx=20, pady=5, fill=tk.BOTH, expand=True)
+
+        self.queue_tree = ttk.Treeview(
+            self.queue_frame,
+            columns=("file", "state", "size", "elapsed"),
+            show="headings",
+            height=6
+        )
+        for column, heading, width in (
+            ("file", "文件", 380),
+            ("state", "状态", 80),
+            ("size", "输出大小", 100),
+            ("elapsed", "耗时", 80),
+        ):
+            self.queue_tree.heading(column, text=heading)
+            self.queue_tree.column(column, width=width, anchor=tk.W if column == "file" else tk.CENTER)
+
+        queue_scroll = ttk.Scrollbar(self.queue_frame, orient=tk.VERTICAL, command=self.queue_tree.yview)
+        self.queue_tree.configure(yscrollcommand=queue_scroll.set)
+        queue_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_tree.pack(fill=tk.BOTH, expand=True)
 
         # 状态栏
         self.status_var = tk.StringVar(value="就绪")
@@ -166,10 +296,50 @@ class ImageResizerApp:
         self.original_aspect_ratio = 1.0  # 宽高比
         self.updating_dimensions = False  # 防止递归更新
 
+        # 处理队列：表格行 ID → QueueItem，以及等待插入表格的行
+        self.queue_items = {}
+        self.rows_to_insert = []
+        self.next_item_id = 0
+
+        # 后台处理线程与界面之间的消息队列和取消标志
+        self.worker_queue = None
+        self.cancel_event = None
+        self.executor = None
+        self.remaining_jobs = 0
+        self.failed_items = []  # 本次处理中失败的队列项
+        self.batch_stats = None  # 本次处理中成功任务的统计汇总
+
+        # 当前图像的解码结果和搜索中间结果，反复调整参数时复用（引擎导入后创建）
+        self.session_cache = None
+
+        # 预览：当前图像的缩略图金字塔、正在后台构建的金字塔、待执行的刷新和显示中的图像
+        self.preview_pyramid = None
+        self.preview_future = None
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_after_id = None
+        self.preview_photo = None
+        self.preview_anchor = "width"  # 保持宽高比时预览以最后编辑的一边为准
+
+        for variable in (self.width_var, self.height_var):
+            variable.trace_add("write", self.on_dimension_edit)
+        for variable in (self.size_value_var, self.size_unit_var, self.tolerance_var):
+            variable.trace_add("write", self.schedule_preview)
+
         # 初始显示像素尺寸调整参数
         self.update_input_fields()
         self.update_ratio_lock()
 
+        # 首次绘制后在后台空闲时导入引擎，避免第一次操作时卡顿
+        self.root.after(ENGINE_PRELOAD_DELAY_MS, self.preload_engine)
+
+    def preload_engine(self):
+        resize_engine.REDUCING_GAP  # 访问属性即触发导入
+
+    def get_session_cache(self):
+        if self.session_cache is None:
+            self.session_cache = resize_engine.SessionCache()
+        return self.session_cache
+
     def update_input_fields(self):
         """根据选择的调整方式显示对应的输入字段"""
         # 先隐藏所有参数框架
@@ -181,6 +351,7 @@ class ImageResizerApp:
             self.dimension_frame.pack(fill=tk.X, padx=10, pady=5)
         else:
             self.filesize_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.schedule_preview()
 
     def update_ratio_lock(self):
         """根据保持宽高比选项更新输入框状态"""
@@ -244,19 +415,15 @@ class ImageResizerApp:
             self.updating_dimensions = False
 
     def on_drop(self, event):
-        """处理拖放事件"""
-        # 获取拖放的文件路径
-        file_path = event.data.strip('{}')  # 去除路径前后可能的大括号
-
-        # 检查是否是图像文件
-        if self.is_valid_image(file_path):
-            self.load_image(file_path)
-        else:
+        """处理拖放事件，支持一次拖放多个文件和文件夹"""
+        # 按 Tcl 列表解析，正确处理带空格（被大括号包围）的路径
+        paths = resize_engine.expand_inputs(self.root.tk.splitlist(event.data), wildcards=False)
+        if not self.add_files(paths):
             messagebox.showerror("错误", "请拖放有效的图像文件（支持JPG、PNG、BMP等格式）")
 
     def select_image(self):
-        """通过文件选择对话框选择图像"""
-        file_path = filedialog.askopenfilename(
+        """通过文件选择对话框选择一个或多个图像"""
+        file_paths = filedialog.askopenfilenames(
             title="选择图像文件",
             filetypes=[
                 ("图像文件", "*.jpg *.jpeg *.png *.bmp *.gif *.tiff"),
@@ -264,22 +431,74 @@ class ImageResizerApp:
             ]
         )
 
-        if file_path and self.is_valid_image(file_path):
-            self.load_image(file_path)
+        if file_paths:
+            self.add_files(resize_engine.expand_inputs(file_paths, wildcards=False))
+
+    def add_files(self, paths) -> bool:
+        """将文件加入处理队列，并载入第一个有效图像作为当前图像；没有有效图像时返回 False"""
+        first_valid = next((path for path in paths if self.is_valid_image(path)), None)
+        if first_valid is None:
+            return False
+
+        self.load_image(first_valid)
+        self.enqueue(paths)
+        return True
+
+    def enqueue(self, paths):
+        """添加队列项，表格行分批插入以保持界面响应"""
+        item_ids = []
+        for path in paths:
+            item_id = str(self.next_item_id)
+            self.next_item_id += 1
+            self.queue_items[item_id] = QueueItem(path)
+            item_ids.append(item_id)
+
+        if not self.rows_to_insert:
+            self.root.after_idle(self.insert_rows)
+        self.rows_to_insert.extend(item_ids)
+        return item_ids
+
+    def insert_rows(self):
+        """每次最多插入 MAX_ROWS_PER_INSERT 行，剩余的在下一轮空闲时插入"""
+        batch = self.rows_to_insert[:MAX_ROWS_PER_INSERT]
+        del self.rows_to_insert[:MAX_ROWS_PER_INSERT]
+        for item_id in batch:
+            if item_id in self.queue_items:
+                self.queue_tree.insert("", tk.END, iid=item_id, values=self.queue_row(item_id))
+
+        if self.rows_to_insert:
+            self.root.after(1, self.insert_rows)
+
+    def queue_row(self, item_id):
+        """队列项在表格中显示的内容"""
+        item = self.queue_items[item_id]
+        size = self.format_size(item.output_size) if item.output_size is not None else ""
+        elapsed = f"{item.elapsed:.2f} s" if item.elapsed is not None else ""
+        return (os.path.basename(item.path), QUEUE_STATES[item.state], size, elapsed)
+
+    def update_row(self, item_id):
+        if self.queue_tree.exists(item_id):
+            self.queue_tree.item(item_id, values=self.queue_row(item_id))
+
+    def clear_queue(self):
+        """清空处理队列（处理过程中不可用）"""
+        if self.worker_queue is not None:
+            return
+        self.queue_tree.delete(*self.queue_tree.get_children())
+        self.queue_items.clear()
+        self.rows_to_insert = []
 
     def load_image(self, file_path):
         """加载图像并更新信息"""
         self.current_image_path = file_path
         self.file_path_var.set(f"文件路径: {file_path}")
 
-        # 获取文件大小
-        self.current_image_size = os.path.getsize(file_path)
+        # 获取文件大小和图像尺寸
+        info = resize_engine.read_image_info(file_path)
+        self.current_image_size = info.size
         size_str = self.format_size(self.current_image_size)
-
-        # 获取图像尺寸
-        with Image.open(file_path) as img:
-            self.current_image_dimensions = img.size  # (宽, 高)
-            self.original_aspect_ratio = img.width / img.height
+        self.current_image_dimensions = info.dimensions  # (宽, 高)
+        self.original_aspect_ratio = info.dimensions[0] / info.dimensions[1]
 
         # 更新统计信息
         self.file_stats_var.set(
@@ -309,26 +528,106 @@ class ImageResizerApp:
 
         self.process_btn.config(state=tk.NORMAL)
         self.status_var.set(f"已加载图像: {os.path.basename(file_path)}")
+        self.start_preview(file_path)
+
+    def start_preview(self, file_path):
+        """在后台解码一次图像并构建预览金字塔，之后参数变化时只在金字塔上渲染和预测"""
+        self.preview_pyramid = None
+        self.preview_anchor = "width"
+        self.preview_info_var.set("正在生成预览...")
+        future = self.preview_executor.submit(resize_engine.build_preview, file_path)
+        self.preview_future = future
+        self.root.after(POLL_INTERVAL_MS, self.poll_preview, future)
+
+    def poll_preview(self, future):
+        if future is not self.preview_future:
+            return  # 已载入其他图像
+        if not future.done():
+            self.root.after(POLL_INTERVAL_MS, self.poll_preview, future)
+            return
+        self.preview_future = None
+        try:
+            self.preview_pyramid = future.result()
+        except Exception as e:
+            self.preview_info_var.set(f"无法生成预览: {str(e)}")
+            return
+        self.update_preview()
+
+    def on_dimension_edit(self, name, *args):
+        """记录用户最后编辑的一边（自动计算另一边时不改变），并安排刷新预览"""
+        if not self.updating_dimensions:
+            self.preview_anchor = "width" if name == str(self.width_var) else "height"
+        self.schedule_preview()
+
+    def schedule_preview(self, *args):
+        """参数停止变化 PREVIEW_DEBOUNCE_MS 后刷新预览，连续输入时只刷新一次"""
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.update_preview)
+
+    def preview_plan(self):
+        """按当前输入预测输出；输入不完整或无效时返回 None，不弹出错误提示"""
+        pyramid = self.preview_pyramid
+        try:
+            if self.resize_option.get() == "dimension":
+                width, height = int(self.width_var.get()), int(self.height_var.get())
+                if self.preserve_ratio_var.get():
+                    # 另一边在失去焦点或回车时才自动计算，预览提前按宽高比计算
+                    if self.preview_anchor == "width":
+                        height = max(1, int(width / self.original_aspect_ratio))
+                    else:
+                        width = max(1, int(height * self.original_aspect_ratio))
+                if width <= 0 or height <= 0:
+                    return None
+                return pyramid.plan_dimension((width, height),
+                                              resize_engine.codec_for_path(self.current_image_path))
+
+            size_value = float(self.size_value_var.get())
+            tolerance = float(self.tolerance_var.get()) / 100
+            units = {"MB": 1024 * 1024, "KB": 1024, "B": 1}
+            target = int(size_value * units[self.size_unit_var.get()])
+            if target <= 0 or not 0 < tolerance <= 0.5:
+                return None
+            output_format = resize_engine.filesize_output_format(
+                pyramid.samples[-1][1], resize_engine.output_format_for(self.current_image_path), target, tolerance,
+                pyramid.size)
+            return pyramid.plan_filesize(output_format, target, tolerance)
+        except ValueError:
+            return None
+
+    def update_preview(self):
+        """在金字塔上渲染当前参数的输出效果并显示预计大小，不做全分辨率编码"""
+        self.preview_after_id = None
+        if self.preview_pyramid is None:
+            return
+        plan = self.preview_plan()
+        if plan is None:
+            self.preview_info_var.set("参数无效，预览未更新")
+            return
+
+        from PIL import ImageTk
+
+        self.preview_photo = ImageTk.PhotoImage(self.preview_pyramid.render(plan, PREVIEW_BOX))
+        self.preview_label.config(image=self.preview_photo, text="")
+        if plan.quality is None:
+            encoding = plan.format
+        elif plan.palette:
+            encoding = f"{plan.format} {plan.quality} 色"
+        else:
+            encoding = f"{plan.format} 质量 {plan.quality}"
+        info = (f"输出: {plan.dimensions[0]}x{plan.dimensions[1]}px, {encoding} | "
+                f"预计大小: 约 {self.format_size(plan.predicted_size)}")
+        if not plan.in_tolerance:
+            info += "（预计无法达到容差范围）"
+        self.preview_info_var.set(info)
 
     def is_valid_image(self, file_path) -> bool:
         """检查文件是否为有效的图像"""
-        if not os.path.isfile(file_path):
-            return False
-
-        try:
-            with Image.open(file_path):
-                return True
-        except Exception:
-            return False
+        return resize_engine.is_valid_image(file_path)
 
     def format_size(self, size_bytes: int) -> str:
         """将字节数转换为易读的格式（B, KB, MB）"""
-        if size_bytes < 1024:
-            return f"{size_bytes} B"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.2f} KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.2f} MB"
+        return resize_engine.format_size(size_bytes)
 
     def validate_dimension_input(self) -> Optional[Tuple[int, int]]:
         """验证像素尺寸输入"""
@@ -381,236 +680,222 @@ class ImageResizerApp:
             messagebox.showerror("错误", "请输入有效的数值")
             return None
 
-    def resize_by_dimension(self, target_size: Tuple[int, int]) -> str:
-        """按像素尺寸调整图像"""
-        width, height = target_size
-
-        try:
-            with Image.open(self.current_image_path) as img:
-                # 调整图像大小
-                resized_img = img.resize(target_size, resample=Image.Resampling.LANCZOS)
-
-                # 生成新文件名
-                output_path = self.get_output_path()
-
-                # 保存调整后的图像
-                if output_path.lower().endswith((".jpg", ".jpeg")):
-                    resized_img.save(output_path, quality=90)
-                else:
-                    resized_img.save(output_path)
-
-                return output_path
-
-        except Exception as e:
-            raise Exception(f"调整尺寸失败: {str(e)}")
-
-    def find_optimal_quality(self, img, target_size_bytes, tolerance, temp_file):
-        """通过迭代找到最佳质量参数，使文件大小在目标范围内"""
-        # 初始质量范围
-        min_quality = 1
-        max_quality = 95
-        best_quality = 80  # 初始猜测
-        best_size = float('inf')
-        iterations = 0
-
-        # 最多尝试10次找到合适的质量
-        while iterations < 10:
-            iterations += 1
-            # 保存临时文件测试大小
-            img.save(temp_file, quality=best_quality)
-            current_size = os.path.getsize(temp_file)
-
-            # 计算当前大小与目标的差距
-            size_ratio = current_size / target_size_bytes
-
-            # 如果在可接受范围内，返回当前质量
-            if (1 - tolerance) <= size_ratio <= (1 + tolerance):
-                return best_quality
-
-            # 调整质量参数（非线性调整，因为质量和文件大小不是线性关系）
-            if size_ratio > 1:  # 当前文件太大，降低质量
-                # 大文件需要更大幅度降低质量
-                adjust = int(10 * math.log(size_ratio, 2)) + 1
-                new_quality = best_quality - adjust
-            else:  # 当前文件太小，提高质量
-                # 小文件只需小幅提高质量
-                adjust = int(5 * math.log(1 / size_ratio, 2)) + 1
-                new_quality = best_quality + adjust
-
-            # 确保质量在有效范围内
-            new_quality = max(min_quality, min(new_quality, max_quality))
-
-            # 如果质量不再变化，说明无法通过质量调整达到目标
-            if new_quality == best_quality:
-                break
-
-            best_quality = new_quality
-            best_size = current_size
-
-        return best_quality
-
-    def resize_by_filesize(self, target_size_bytes: int, tolerance: float) -> str:
-        """按目标文件大小调整图像，确保在容差范围内"""
-        # 计算可接受的大小范围
-        min_acceptable = int(target_size_bytes * (1 - tolerance))
-        max_acceptable = int(target_size_bytes * (1 + tolerance))
-
-        # 如果目标大小大于当前大小，直接复制
-        if target_size_bytes >= self.current_image_size:
-            output_path = self.get_output_path()
-            with Image.open(self.current_image_path) as img:
-                img.save(output_path)
-            return output_path
-
-        # 创建临时文件用于测试
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_filename = temp_file.name
-
-        try:
-            # 对于JPEG格式，尝试通过调整质量来达到目标大小
-            file_ext = os.path.splitext(self.current_image_path)[1].lower()
-            output_path = self.get_output_path()
-
-            # 如果是PNG等无损格式，先尝试转为JPEG
-            if file_ext in (".png", ".bmp", ".gif"):
-                messagebox.showinfo("提示", "无损格式图像将转换为JPEG以减小文件大小")
-                output_path = os.path.splitext(output_path)[0] + ".jpg"
-                file_ext = ".jpg"
-
-            with Image.open(self.current_image_path) as img:
-                # 如果是透明图像，处理透明度
-                if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                    background = Image.new(img.mode[:-1], img.size, (255, 255, 255))
-                    background.paste(img, img.split()[-1])
-                    img = background
-
-                current_width, current_height = img.size
-                current_scale = 1.0
-
-                # 先尝试只调整质量
-                optimal_quality = self.find_optimal_quality(img, target_size_bytes, tolerance, temp_filename)
-                img.save(temp_filename, quality=optimal_quality)
-                current_size = os.path.getsize(temp_filename)
-
-                # 检查是否在可接受范围内
-                if min_acceptable <= current_size <= max_acceptable:
-                    img.save(output_path, quality=optimal_quality)
-                    return output_path
-
-                # 如果仅调整质量不够，开始调整尺寸
-                scale_factor = 1.0
-                # 计算需要缩小的比例
-                if current_size > max_acceptable:
-                    scale_factor = math.sqrt(max_acceptable / current_size) * 0.95
-                else:  # current_size < min_acceptable
-                    scale_factor = math.sqrt(min_acceptable / current_size) * 1.05
-
-                # 应用缩放
-                new_width = int(current_width * scale_factor)
-                new_height = int(current_height * scale_factor)
-
-                # 确保尺寸不会太小
-                min_dimension = 100
-                new_width = max(min_dimension, new_width)
-                new_height = max(min_dimension, new_height)
-
-                # 调整尺寸后再次尝试找到最佳质量
-                resized_img = img.resize((new_width, new_height), resample=Image.Resampling.LANCZOS)
-                optimal_quality = self.find_optimal_quality(resized_img, target_size_bytes, tolerance, temp_filename)
-                resized_img.save(output_path, quality=optimal_quality)
-
-                # 最终检查
-                final_size = os.path.getsize(output_path)
-                if final_size > max_acceptable or final_size < min_acceptable:
-                    # 进行最后一次微调
-                    size_ratio = final_size / target_size_bytes
-                    if size_ratio > 1:
-                        new_quality = max(1, optimal_quality - 5)
-                    else:
-                        new_quality = min(95, optimal_quality + 5)
-                    resized_img.save(output_path, quality=new_quality)
-
-            return output_path
-
-        except Exception as e:
-            raise Exception(f"调整文件大小失败: {str(e)}")
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_filename):
-                try:
-                    os.unlink(temp_filename)
-                except:
-                    pass
-
-    def get_output_path(self) -> str:
-        """生成输出文件路径"""
-        dir_name = os.path.dirname(self.current_image_path)
-        file_name = os.path.basename(self.current_image_path)
-        name_without_ext, ext = os.path.splitext(file_name)
-        output_file_name = f"{name_without_ext}_resized{ext}"
-        return os.path.join(dir_name, output_file_name)
-
     def process_image(self):
-        """处理图像调整流程"""
-        if not self.current_image_path:
+        """校验输入后在后台线程池中处理队列中所有等待的图像，界面保持响应"""
+        if not self.current_image_path or self.worker_queue is not None:
             return
 
-        try:
-            self.status_var.set("正在处理...")
-            self.root.update()  # 更新界面显示
+        item_ids = [item_id for item_id, item in self.queue_items.items() if item.state == "pending"]
+        paths = [self.queue_items[item_id].path for item_id in item_ids] or [self.current_image_path]
 
-            if self.resize_option.get() == "dimension":
-                # 按像素尺寸调整
-                target_dimension = self.validate_dimension_input()
-                if target_dimension is None:  # 输入无效
-                    self.status_var.set("输入无效")
-                    return
-
-                output_path = self.resize_by_dimension(target_dimension)
-                new_size = os.path.getsize(output_path)
-                new_size_str = self.format_size(new_size)
-
-                messagebox.showinfo(
-                    "成功",
+        if self.resize_option.get() == "dimension":
+            # 按像素尺寸调整
+            target_dimension = self.validate_dimension_input()
+            if target_dimension is None:  # 输入无效
+                self.status_var.set("输入无效")
+                return
+            preserve_ratio = self.preserve_ratio_var.get()
+            current_image_path = self.current_image_path
+            session = self.get_session_cache()
+
+            def make_task(input_path):
+                def task(progress, cancel, stats):
+                    size = target_dimension
+                    if preserve_ratio and input_path != current_image_path:
+                        # 其他图像按相同宽度、各自的宽高比计算高度
+                        width, height = resize_engine.read_image_info(input_path).dimensions
+                        size = (target_dimension[0], max(1, round(target_dimension[0] * height / width)))
+                    # 只有当前图像使用会话缓存，批量处理的其他图像不占用缓存
+                    return resize_engine.resize_by_dimension(
+                        input_path, size, cancel=cancel, stats=stats,
+                        session=session if input_path == current_image_path else None)
+                return task
+
+            def report(resized):
+                return (
                     f"图像尺寸调整完成！\n原始尺寸: {self.current_image_dimensions[0]}x{self.current_image_dimensions[1]}px\n"
                     f"目标尺寸: {target_dimension[0]}x{target_dimension[1]}px\n"
-                    f"文件大小: {new_size_str}\n保存路径: {output_path}"
+                    f"文件大小: {self.format_size(resized.size)}\n保存路径: {resized.output_path}"
                 )
 
-            else:
-                # 按文件大小调整
-                result = self.validate_filesize_input()
-                if result is None:  # 输入无效
-                    self.status_var.set("输入无效")
-                    return
-
-                target_filesize, tolerance = result
-                output_path = self.resize_by_filesize(target_filesize, tolerance)
-                new_size = os.path.getsize(output_path)
-                new_size_str = self.format_size(new_size)
+        else:
+            # 按文件大小调整
+            result = self.validate_filesize_input()
+            if result is None:  # 输入无效
+                self.status_var.set("输入无效")
+                return
+
+            target_filesize, tolerance = result
+            if any(resize_engine.converts_to_jpeg(path) for path in paths):
+                messagebox.showinfo("提示", "TIFF 等格式的图像将转换为JPEG以减小文件大小"
+                                          "（PNG、GIF、BMP 保留透明通道，按调色板压缩；不透明的照片转换为JPEG）")
+
+            current_image_path = self.current_image_path
+            session = self.get_session_cache()
+
+            def make_task(input_path):
+                def task(progress, cancel, stats):
+                    return resize_engine.resize_by_filesize(
+                        input_path, target_filesize, tolerance, progress=progress, cancel=cancel, stats=stats,
+                        session=session if input_path == current_image_path else None)
+                return task
+
+            def report(resized):
                 target_size_str = self.format_size(target_filesize)
                 min_acceptable_str = self.format_size(int(target_filesize * (1 - tolerance)))
                 max_acceptable_str = self.format_size(int(target_filesize * (1 + tolerance)))
-
-                with Image.open(output_path) as img:
-                    new_dimensions = img.size
-
-                messagebox.showinfo(
-                    "成功",
+                return (
                     f"图像文件大小调整完成！\n原始大小: {self.format_size(self.current_image_size)}\n"
                     f"目标大小: {target_size_str} (可接受范围: {min_acceptable_str}-{max_acceptable_str})\n"
-                    f"实际大小: {new_size_str}\n"
-                    f"像素尺寸: {new_dimensions[0]}x{new_dimensions[1]}px\n保存路径: {output_path}"
+                    f"实际大小: {self.format_size(resized.size)}\n"
+                    f"像素尺寸: {resized.dimensions[0]}x{resized.dimensions[1]}px\n"
+                    f"编码次数: {resized.encodes}\n保存路径: {resized.output_path}"
                 )
 
-            self.status_var.set(f"已保存到: {output_path}")
+        # 队列中没有等待项时重新处理当前图像；输入有效后才加入队列，输入无效时队列中不会留下无法处理的项
+        if not item_ids:
+            item_ids = self.enqueue([self.current_image_path])
+        mode = self.resize_option.get()
+        jobs = [(item_id, make_task(self.queue_items[item_id].path),
+                 resize_engine.JobStats(self.queue_items[item_id].path, mode)) for item_id in item_ids]
+        # 只处理一个图像时沿用完成对话框，批量处理时在状态栏汇总
+        self.start_worker(jobs, report if len(jobs) == 1 else None)
+
+    def start_worker(self, jobs, report):
+        """在线程池中执行 (队列项 ID, task, 统计) 任务，状态通过队列传回，由 poll_worker 在主线程处理"""
+        self.worker_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.remaining_jobs = len(jobs)
+        self.failed_items = []
+        self.batch_stats = resize_engine.JobStats("", "batch")
+        self.executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        worker_queue = self.worker_queue
+        cancel_event = self.cancel_event
+
+        def run(item_id, task, stats):
+            if cancel_event.is_set():
+                worker_queue.put(("cancelled", item_id, None))
+                return
+            worker_queue.put(("running", item_id, None))
+            start = time.perf_counter()
+            try:
+                resized = task(lambda event: worker_queue.put(("progress", item_id, event)), cancel_event, stats)
+            except resize_engine.ResizeCancelled:
+                worker_queue.put(("cancelled", item_id, None))
+            except Exception as e:
+                worker_queue.put(("failed", item_id, (e, time.perf_counter() - start)))
+            else:
+                worker_queue.put(("done", item_id, (resized, time.perf_counter() - start, stats)))
+
+        for item_id, task, stats in jobs:
+            self.executor.submit(run, item_id, task, stats)
+
+        self.status_var.set(f"正在处理 {len(jobs)} 个图像...")
+        self.process_btn.config(state=tk.DISABLED)
+        self.clear_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.root.after(POLL_INTERVAL_MS, self.poll_worker, report, len(jobs))
+
+    def poll_worker(self, report, total):
+        """在主线程中处理后台线程发来的消息，每轮最多处理 MAX_MESSAGES_PER_POLL 条"""
+        latest_progress = None
+        last_result = last_stats = None
+        for _ in range(MAX_MESSAGES_PER_POLL):
+            try:
+                kind, item_id, payload = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
 
-        except Exception as e:
-            self.status_var.set(f"处理失败: {str(e)}")
-            messagebox.showerror("错误", f"处理失败！\n错误信息: {str(e)}")
+            if kind == "progress":
+                latest_progress = payload
+                continue
+
+            item = self.queue_items.get(item_id)
+            if kind == "running":
+                if item:
+                    item.state = "running"
+                    self.update_row(item_id)
+                continue
+
+            self.remaining_jobs -= 1
+            if item is None:
+                continue
+            if kind == "done":
+                resized, item.elapsed, last_stats = payload
+                item.state = "done"
+                item.output_size = resized.size
+                last_result = resized
+                self.batch_stats.merge(last_stats)
+            elif kind == "failed":
+                item.error, item.elapsed = payload
+                item.state = "failed"
+                self.failed_items.append(item)
+            else:
+                # 取消的任务恢复为等待状态，可再次处理
+                item.state = "pending"
+            self.update_row(item_id)
+
+        if self.remaining_jobs > 0:
+            if latest_progress is not None and not self.cancel_event.is_set():
+                self.status_var.set(
+                    f"正在处理 ({total - self.remaining_jobs}/{total})... 第 {latest_progress.encodes} 次编码: "
+                    f"质量 {latest_progress.quality}, 缩放 {latest_progress.scale:.0%}, "
+                    f"大小 {self.format_size(latest_progress.size)}"
+                )
+            self.root.after(POLL_INTERVAL_MS, self.poll_worker, report, total)
+            return
+
+        cancelled = self.cancel_event.is_set()
+        self.finish_worker()
+        if report is not None and last_result is not None:
+            self.status_var.set(f"已保存到: {last_result.output_path} | {last_stats.describe()}")
+            messagebox.showinfo("成功", report(last_result))
+            return
+
+        failed = self.failed_items
+        if report is not None and failed:
+            error = failed[-1].error
+            self.status_var.set(f"处理失败: {str(error)}")
+            messagebox.showerror("错误", f"处理失败！\n错误信息: {str(error)}")
+        elif cancelled:
+            self.status_var.set("已取消")
+        else:
+            self.status_var.set(f"处理完成: 共 {total} 个，失败 {len(failed)} 个 | 合计 {self.batch_stats.describe()}")
+
+    def finish_worker(self):
+        """后台任务结束后恢复按钮状态"""
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        self.worker_queue = None
+        self.cancel_event = None
+        self.process_btn.config(state=tk.NORMAL)
+        self.clear_btn.config(state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.DISABLED)
+
+    def cancel_processing(self):
+        """请求取消正在进行的后台任务，处理中的图像在下一个检查点停止，等待中的不再开始"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.status_var.set("正在取消...")
+
+
+def create_root() -> tk.Tk:
+    """创建主窗口并加载 tkdnd 扩展（与 TkinterDnD.Tk 相同）；tkinterdnd2 或 tkdnd 不可用时窗口不支持拖放
+
+    TkinterDnD.Tk 加载失败时已创建的解释器无法取回，因此先创建普通窗口再加载扩展；
+    _require 是 tkinterdnd2 的内部函数，版本变化后不存在（AttributeError）时同样不支持拖放
+    """
+    root = tk.Tk()
+    try:
+        from tkinterdnd2 import TkinterDnD
+        root.TkdndVersion = TkinterDnD._require(root)
+    except (ImportError, RuntimeError, AttributeError):
+        pass
+    return root
 
 
 if __name__ == "__main__":
-    root = TkinterDnD.Tk()
+    root = create_root()
     app = ImageResizerApp(root)
     root.mainloop()
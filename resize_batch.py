@@ -0,0 +1,301 @@
+"""多进程批量调整：将 resize_by_dimension / resize_by_filesize 任务分块分发到进程池"""
+import os
+import threading
+from typing import Dict, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+
+import resize_engine
+import result_cache
+
+
+class ResizeJob(NamedTuple):
+    """一个调整任务；mode 为 "dimension" 时 target 为 (宽, 高)，为 "filesize" 时为目标字节数，
+    为 "renditions" 时为 Rendition 元组（输出到 output_path 所在目录，按 name_template 命名）"""
+    input_path: str
+    mode: str
+    target: Union[Tuple[int, int], int, Tuple[resize_engine.Rendition, ...]]
+    tolerance: float = 0.2
+    output_path: Optional[str] = None
+    reducing_gap: Optional[float] = resize_engine.REDUCING_GAP
+    # 单个文件大小任务内并发编码的候选数；实际不超过可用 CPU 核数（search_parallel），
+    # 单核时并发编码只会更慢且编码次数更多，按顺序搜索
+    parallel: int = 1
+    memory_budget: Optional[int] = None  # 单个任务的像素内存上限（字节），None 表示不限制
+    collect_stats: bool = False  # 是否收集分阶段耗时，结果随 JobOutcome.stats 返回
+    cache_dir: Optional[str] = None  # 磁盘结果缓存目录，None 表示不使用缓存
+    cache_max_bytes: int = result_cache.DEFAULT_MAX_BYTES
+    formats: Optional[Tuple[str, ...]] = None  # 文件大小任务的候选输出格式，None 表示按扩展名确定
+    name_template: str = resize_engine.RENDITION_TEMPLATE  # 多尺寸任务的输出文件名模板
+    perceptual: bool = False  # 文件大小任务按亮度 SSIM 在几个尺寸中选择画质最好的尺寸和质量
+
+    @property
+    def search_parallel(self) -> int:
+        """实际使用的并发编码数：parallel 与可用 CPU 核数中的较小者"""
+        return max(1, min(self.parallel, default_workers()))
+
+    def cache_params(self) -> dict:
+        """影响输出内容的参数，作为结果缓存键的一部分"""
+        params = {
+            "mode": self.mode,
+            "target": self.target,
+            "format": os.path.splitext(self.output_path or self.input_path)[1].lower(),
+            "reducing_gap": self.reducing_gap,
+            "memory_budget": self.memory_budget,
+        }
+        if self.mode == "filesize":
+            params.update(tolerance=self.tolerance, parallel=self.search_parallel, formats=self.formats,
+                          perceptual=self.perceptual)
+        return params
+
+
+class JobOutcome(NamedTuple):
+    """任务结果；失败时 result 为 None，error 为错误信息"""
+    job: ResizeJob
+    result: Optional[resize_engine.ResizeResult]
+    error: Optional[str]
+    stats: Optional[resize_engine.JobStats] = None
+    cache_hit: bool = False
+    renditions: Tuple[resize_engine.ResizeResult, ...] = ()  # 多尺寸任务的全部结果，result 为其中第一个
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# 每个进程按 (目录, 容量) 复用缓存对象
+_caches: Dict[Tuple[str, int], result_cache.ResultCache] = {}
+
+
+def get_cache(job: ResizeJob) -> Optional[result_cache.ResultCache]:
+    """任务使用的结果缓存；多尺寸任务有多个输出，不使用缓存"""
+    if not job.cache_dir or job.mode == "renditions":
+        return None
+    key = (job.cache_dir, job.cache_max_bytes)
+    if key not in _caches:
+        _caches[key] = result_cache.ResultCache(job.cache_dir, job.cache_max_bytes)
+    return _caches[key]
+
+
+def run_job(job: ResizeJob) -> JobOutcome:
+    """执行单个任务，异常被捕获为该任务的错误，不影响其他任务；设置了缓存目录时先查询缓存"""
+    stats = resize_engine.JobStats(job.input_path, job.mode) if job.collect_stats else None
+    try:
+        cache = get_cache(job)
+        if cache is not None:
+            with resize_engine.stage(stats, "cache"):
+                cache_key = cache.key(job.input_path, job.cache_params())
+                result = cache.fetch(cache_key, job.output_path or resize_engine.get_output_path(job.input_path))
+            if result is not None:
+                if stats is not None:
+                    stats.bytes_written = result.size
+                resize_engine.finish_stats(stats)
+                return JobOutcome(job, result, None, stats, cache_hit=True)
+
+        if job.mode == "dimension":
+            result = resize_engine.resize_by_dimension(job.input_path, job.target, job.output_path,
+                                                       reducing_gap=job.reducing_gap,
+                                                       memory_budget=job.memory_budget, stats=stats)
+        elif job.mode == "filesize":
+            result = resize_engine.resize_by_filesize(job.input_path, job.target, job.tolerance, job.output_path,
+                                                      reducing_gap=job.reducing_gap, parallel=job.search_parallel,
+                                                      memory_budget=job.memory_budget, stats=stats,
+                                                      formats=job.formats, perceptual=job.perceptual)
+        elif job.mode == "renditions":
+            output_dir = os.path.dirname(job.output_path) if job.output_path else None
+            renditions = resize_engine.resize_renditions(job.input_path, job.target, output_dir, job.name_template,
+                                                         job.tolerance, reducing_gap=job.reducing_gap,
+                                                         memory_budget=job.memory_budget, stats=stats)
+            return JobOutcome(job, renditions[0], None, stats, renditions=tuple(renditions))
+        else:
+            raise ValueError(f"未知的调整方式: {job.mode}")
+
+        if cache is not None:
+            cache.store(cache_key, result)
+    except Exception as e:
+        return JobOutcome(job, None, str(e), stats)
+    return JobOutcome(job, result, None, stats)
+
+
+def job_memory(job: ResizeJob) -> int:
+    """只读取文件头估算任务的峰值内存；无法读取时返回 0（任务执行时会报告错误）"""
+    try:
+        info = resize_engine.read_image_info(job.input_path)
+        return resize_engine.estimate_peak_bytes(info, job.mode, job.target, job.reducing_gap,
+                                                 job.memory_budget, job.formats)
+    except Exception:
+        return 0
+
+
+def fit_job(job: ResizeJob, memory_limit: int) -> Tuple[ResizeJob, int]:
+    """返回 (任务, 占用额度)；估算超出总上限的任务改为在单任务预算内处理，并独占全部额度
+
+    预算取估算（含编码缓冲区和余量）不超出上限的最大值；预算再小也放不下时取等于上限的预算
+    """
+    cost = job_memory(job)
+    if cost <= memory_limit:
+        return job, cost
+    try:
+        info = resize_engine.read_image_info(job.input_path)
+    except Exception:
+        return job, memory_limit
+
+    def fits(budget: int) -> bool:
+        return resize_engine.estimate_peak_bytes(info, job.mode, job.target, job.reducing_gap,
+                                                 budget, job.formats) <= memory_limit
+
+    # 估算随预算单调不减，二分查找放得下的最大预算
+    low, high = 1, min(job.memory_budget or memory_limit, memory_limit)
+    if not fits(low):
+        return job._replace(memory_budget=high), memory_limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return job._replace(memory_budget=low), memory_limit
+
+
+class MemoryGate:
+    """所有并行任务共享的内存额度：任务开始前按估算占用，完成后归还"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self, cost: int) -> bool:
+        with self._condition:
+            if self.used + cost > self.limit:
+                return False
+            self.used += cost
+            return True
+
+    def acquire(self, cost: int, timeout: Optional[float] = None) -> bool:
+        """等待额度足够后占用；超时返回 False"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.used + cost <= self.limit, timeout):
+                return False
+            self.used += cost
+            return True
+
+    def release(self, cost: int) -> None:
+        with self._condition:
+            self.used -= cost
+            self._condition.notify_all()
+
+
+# 按内存上限调度时，在等待中的前多少个任务里寻找放得下的任务
+ADMIT_WINDOW = 64
+
+# 队首任务被后面的小任务越过的最多次数；达到后不再越过，等额度释放到足以运行它为止
+MAX_BYPASS = 8
+
+
+def default_workers() -> int:
+    """默认进程数：可用 CPU 核数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_chunksize(job_count: int, workers: int) -> int:
+    """每个进程约分到 4 块，兼顾调度开销和负载均衡"""
+    return max(1, job_count // (workers * 4))
+
+
+def run_batch(jobs: Sequence[ResizeJob], workers: Optional[int] = None,
+              chunksize: Optional[int] = None, memory_limit: Optional[int] = None) -> Iterator[JobOutcome]:
+    """按输入顺序逐个产出任务结果；workers 为 1 时在当前进程内执行
+
+    设置 memory_limit（字节）时，按文件头估算的峰值内存逐个提交任务，同时运行的任务估算之和不超过上限，
+    此时忽略 chunksize
+    """
+    workers = workers or default_workers()
+    if memory_limit:
+        jobs = [fit_job(job, memory_limit) for job in jobs]
+        if workers == 1 or len(jobs) <= 1:
+            yield from (run_job(job) for job, _ in jobs)
+        else:
+            yield from _run_admitted(jobs, workers, memory_limit)
+        return
+    if workers == 1 or len(jobs) <= 1:
+        yield from map(run_job, jobs)
+        return
+
+    # 进程池连同 multiprocessing 只在多进程时导入，单个文件的命令行调用不承担这部分启动时间
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = chunksize or default_chunksize(len(jobs), workers)
+    completed = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        try:
+            for outcome in executor.map(run_job, jobs, chunksize=chunksize):
+                yield outcome
+                completed += 1
+        except Exception:
+            # BrokenExecutor 或结果无法在进程间传递等，在下面逐个提交时报告为对应文件的错误
+            pass
+    if completed < len(jobs):
+        # 工作进程异常退出（如解码器崩溃）：剩余任务改为逐个提交，找出导致崩溃的文件并报告为该文件的错误；
+        # 占用额度均为 0，不受内存额度限制
+        yield from _run_admitted([(job, 0) for job in jobs[completed:]], workers, 0)
+
+
+def _run_admitted(jobs: Sequence[Tuple[ResizeJob, int]], workers: int, memory_limit: int) -> Iterator[JobOutcome]:
+    """按内存额度调度 (任务, 占用额度)：大任务占满额度时，后面放得下的小任务可以先运行
+
+    工作进程异常退出时重建进程池继续处理：当时只有一个任务在运行则报告为该任务的错误，
+    否则这些任务重新排到队首并逐个单独运行，以确定是哪个文件导致崩溃；
+    其他异常（如结果无法在进程间传递）报告为该任务的错误
+    """
+    from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, ProcessPoolExecutor, wait
+
+    gate = MemoryGate(memory_limit)
+    pending = list(range(len(jobs)))
+    running = {}
+    suspects = set()  # 崩溃时与其他任务同时运行、尚未单独运行过的任务
+    finished: Dict[int, JobOutcome] = {}
+    next_index = bypassed = 0
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    try:
+        while pending or running:
+            while pending and len(running) < (1 if suspects else workers):
+                window = pending[:1] if bypassed >= MAX_BYPASS or suspects else pending[:ADMIT_WINDOW]
+                position = next((i for i, index in enumerate(window) if gate.try_acquire(jobs[index][1])), None)
+                if position is None:
+                    break
+                bypassed = bypassed + 1 if position else 0
+                index = pending.pop(position)
+                running[executor.submit(run_job, jobs[index][0])] = index
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            crashed = []
+            if any(isinstance(future.exception(), BrokenExecutor) for future in done):
+                # 进程池损坏后其余任务也会立即失败，一并收集
+                done, _ = wait(running)
+            for future in done:
+                index = running.pop(future)
+                gate.release(jobs[index][1])
+                try:
+                    finished[index] = future.result()
+                    suspects.discard(index)
+                except BrokenExecutor:
+                    crashed.append(index)
+                except Exception as e:
+                    finished[index] = JobOutcome(jobs[index][0], None, str(e))
+                    suspects.discard(index)
+            if crashed:
+                if len(crashed) == 1:
+                    finished[crashed[0]] = JobOutcome(jobs[crashed[0]][0], None, "工作进程异常退出")
+                    suspects.discard(crashed[0])
+                else:
+                    suspects.update(crashed)
+                    pending[:0] = sorted(crashed)
+                executor.shutdown()
+                executor = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+    finally:
+        executor.shutdown()
@@ -0,0 +1,219 @@
+"""图像尺寸/文件大小调整命令行工具，支持多个路径和通配符批量处理
+
+示例:
+    python resize_cli.py photos/*.jpg --size 1920x1080
+    python resize_cli.py "shots/**/*.png" scans/ --target-size 200KB --tolerance 10
+    python resize_cli.py photos/ --renditions 1920w,1280w,640w@80KB --name-template "{stem}-{width}{ext}"
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional, Tuple
+
+import resize_batch
+import resize_engine
+import result_cache
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 * 1024, "GB": 1024 * 1024 * 1024}
+
+
+def parse_dimension(text: str) -> Tuple[int, int]:
+    """解析 宽x高 形式的像素尺寸"""
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的像素尺寸: {text}（应为 宽x高，如 1920x1080）")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("宽度和高度必须是大于0的整数")
+    return (width, height)
+
+
+def parse_filesize(text: str) -> int:
+    """解析带单位（B/KB/MB/GB，缺省为 B）的文件大小，返回字节数"""
+    value = text.strip().upper()
+    unit = next((u for u in ("GB", "MB", "KB", "B") if value.endswith(u)), "")
+    try:
+        size_bytes = int(float(value[:len(value) - len(unit)]) * SIZE_UNITS.get(unit, 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的文件大小: {text}（如 200KB、1.5MB）")
+    if size_bytes <= 0:
+        raise argparse.ArgumentTypeError("文件大小必须大于0")
+    return size_bytes
+
+
+def parse_formats(text: str) -> Tuple[str, ...]:
+    """解析逗号分隔的输出格式列表"""
+    names = tuple(name.strip().upper() for name in text.split(",") if name.strip())
+    unknown = [name for name in names if name not in resize_engine.OUTPUT_FORMATS]
+    if not names or unknown:
+        raise argparse.ArgumentTypeError(
+            f"无效的输出格式: {text}（可选: {', '.join(resize_engine.OUTPUT_FORMATS).lower()}）")
+    return names
+
+
+def parse_rendition(text: str) -> resize_engine.Rendition:
+    """解析单个输出规格：800w（宽）、600h（高）、800x600，可附加 @文件大小上限；只写 @200KB 表示原图尺寸"""
+    dims, _, max_bytes = text.strip().lower().partition("@")
+    width = height = None
+    try:
+        if dims.endswith("w"):
+            width = int(dims[:-1])
+        elif dims.endswith("h"):
+            height = int(dims[:-1])
+        elif dims:
+            width, height = parse_dimension(dims)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的输出规格: {text}（如 1920w、600h、800x600、640w@80KB）")
+    if (width is not None and width <= 0) or (height is not None and height <= 0):
+        raise argparse.ArgumentTypeError("宽度和高度必须是大于0的整数")
+    return resize_engine.Rendition(width, height, parse_filesize(max_bytes) if max_bytes else None)
+
+
+def parse_renditions(text: str) -> Tuple[resize_engine.Rendition, ...]:
+    """解析逗号分隔的输出规格列表"""
+    renditions = tuple(parse_rendition(item) for item in text.split(",") if item.strip())
+    if not renditions:
+        raise argparse.ArgumentTypeError("至少需要一个输出规格")
+    return renditions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="批量调整图像像素尺寸或文件大小",
+        epilog="输出文件默认与输入同目录，文件名追加 _resized",
+    )
+    parser.add_argument("inputs", nargs="+", help="图像文件、目录或通配符")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--size", type=parse_dimension, help="按像素尺寸调整，如 1920x1080")
+    mode.add_argument("--target-size", type=parse_filesize, help="按文件大小调整，如 200KB、1.5MB")
+    mode.add_argument("--renditions", type=parse_renditions,
+                      help="只解码一次输出多个尺寸，逗号分隔，如 1920w,1280w,800x600,640w@80KB（@ 后为文件大小上限）")
+    parser.add_argument("--tolerance", type=float, default=20, help="文件大小容差百分比（0-50，默认20）")
+    parser.add_argument("--output-dir", help="输出目录（默认与输入文件同目录）")
+    parser.add_argument("--name-template", default=resize_engine.RENDITION_TEMPLATE,
+                        help="多尺寸输出的文件名模板，可用 {stem} {ext} {width} {height} {index}"
+                             f"（默认 {resize_engine.RENDITION_TEMPLATE}）")
+    parser.add_argument("--reducing-gap", type=float, default=resize_engine.REDUCING_GAP,
+                        help="缩小时中间图像相对目标尺寸的最小倍数，越大越接近全分辨率缩放（0 表示禁用降采样解码）")
+    parser.add_argument("--formats", type=parse_formats,
+                        help="按文件大小调整时同时尝试的输出格式，如 jpeg,webp,avif,png,gif；选择达到目标时像素最多、质量最高的格式")
+    parser.add_argument("--perceptual", action="store_true",
+                        help="按文件大小调整时在几个逐级缩小的尺寸中搜索质量，按亮度 SSIM 选择画质最好的组合"
+                             "（而不是第一个达到目标的尺寸），耗时约为默认的 2-3 倍")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="按文件大小调整时每轮并发编码的候选质量数，不超过可用 CPU 核数（适合少量大图，默认1）")
+    parser.add_argument("--memory-budget", type=parse_filesize,
+                        help="单个文件处理时的像素内存上限，如 256MB；超大图像将分条带解码（默认不限制）")
+    parser.add_argument("--memory-limit", type=parse_filesize,
+                        help="所有并行任务合计的内存上限，如 1.5GB；按文件头估算每个任务的峰值内存，"
+                             "额度不足时推迟开始，单个任务超出上限时按上限分条带处理（默认不限制）")
+    parser.add_argument("--cache-dir", help="磁盘结果缓存目录；相同内容和参数的图像直接复用已有输出")
+    parser.add_argument("--cache-size", type=parse_filesize, default=result_cache.DEFAULT_MAX_BYTES,
+                        help="结果缓存容量上限，超出时淘汰最久未使用的条目（默认 512MB）")
+    parser.add_argument("--stats", action="store_true", help="输出每个文件的分阶段耗时和汇总")
+    parser.add_argument("--stats-log", help="将每个文件的统计以 JSON Lines 格式追加写入该文件")
+    parser.add_argument("-j", "--workers", type=int, default=0,
+                        help="并行进程数（默认为 CPU 核数，1 表示单进程）")
+    parser.add_argument("--chunksize", type=int, default=0, help="每次分发给进程的任务数（默认自动）")
+    return parser
+
+
+def build_job(path: str, args) -> resize_batch.ResizeJob:
+    """按命令行参数生成单个文件的任务"""
+    output_path = resize_engine.get_output_path(path, args.output_dir)
+    reducing_gap = args.reducing_gap or None
+    collect_stats = bool(args.stats or args.stats_log)
+    if args.size:
+        return resize_batch.ResizeJob(path, "dimension", args.size, output_path=output_path,
+                                      reducing_gap=reducing_gap, memory_budget=args.memory_budget,
+                                      collect_stats=collect_stats, cache_dir=args.cache_dir,
+                                      cache_max_bytes=args.cache_size)
+    if args.renditions:
+        return resize_batch.ResizeJob(path, "renditions", args.renditions, args.tolerance / 100, output_path,
+                                      reducing_gap, memory_budget=args.memory_budget,
+                                      collect_stats=collect_stats, name_template=args.name_template)
+    return resize_batch.ResizeJob(path, "filesize", args.target_size, args.tolerance / 100, output_path,
+                                  reducing_gap, args.parallel, args.memory_budget, collect_stats,
+                                  args.cache_dir, args.cache_size, args.formats, perceptual=args.perceptual)
+
+
+def check_args(parser: argparse.ArgumentParser, args) -> None:
+    """检查参数取值，无效时通过 parser.error 退出；创建输出目录"""
+    if not 0 < args.tolerance <= 50:
+        parser.error("容差范围必须是0-50之间的数值")
+    if args.reducing_gap < 0 or 0 < args.reducing_gap < 1:
+        parser.error("降采样余量必须为 0 或不小于 1")
+    if args.parallel < 1:
+        parser.error("并发候选数必须不小于 1")
+    if args.workers < 0 or args.chunksize < 0:
+        parser.error("进程数和分块大小不能为负数")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+
+def print_outcome(outcome: resize_batch.JobOutcome, show_stats: bool = False) -> None:
+    """输出单个任务的结果，失败信息输出到标准错误"""
+    path = outcome.job.input_path
+    if not outcome.ok:
+        print(f"失败 {path}: {outcome.error}", file=sys.stderr)
+        return
+    for result in outcome.renditions or (outcome.result,):
+        width, height = result.dimensions
+        print(f"完成 {path} -> {result.output_path} "
+              f"({resize_engine.format_size(result.size)}, {width}x{height}px"
+              f"{'，缓存命中' if outcome.cache_hit else ''})")
+        if result.reason:
+            print(f"    格式选择: {result.reason}")
+    if show_stats:
+        print(f"    {outcome.stats.describe()}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_args(parser, args)
+
+    paths = resize_engine.expand_inputs(args.inputs)
+    if not paths:
+        parser.error("没有找到输入文件")
+
+    jobs = [build_job(path, args) for path in paths]
+    failures = cache_hits = 0
+    budgets = [budget for budget in (args.memory_budget, args.memory_limit) if budget]
+    if budgets:
+        # 提前排除内存上限内无法解码的文件（如压缩的 TIFF），不必等到工作进程中整图解码时才失败
+        runnable = []
+        for job in jobs:
+            error = resize_engine.budget_error(job.input_path, min(budgets))
+            if error:
+                failures += 1
+                print_outcome(resize_batch.JobOutcome(job, None, error))
+            else:
+                runnable.append(job)
+        jobs = runnable
+    stats_log = resize_engine.JsonLinesStatsLog(args.stats_log) if args.stats_log else None
+    totals = resize_engine.JobStats("", "batch")
+    try:
+        for outcome in resize_batch.run_batch(jobs, args.workers or None, args.chunksize or None,
+                                              args.memory_limit):
+            if outcome.stats is not None:
+                totals.merge(outcome.stats)
+                if stats_log is not None:
+                    stats_log.write(outcome.stats)
+            failures += not outcome.ok
+            cache_hits += outcome.cache_hit
+            print_outcome(outcome, args.stats)
+    finally:
+        if stats_log is not None:
+            stats_log.close()
+
+    print(f"共 {len(paths)} 个文件，成功 {len(paths) - failures} 个，失败 {failures} 个")
+    if args.cache_dir:
+        print(f"缓存命中 {cache_hits} 个，未命中 {len(paths) - cache_hits} 个")
+    if args.stats:
+        print(f"合计 {totals.total:.2f} s | {totals.describe()} | 输出 {resize_engine.format_size(totals.bytes_written)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2603 @@
+"""图像尺寸/文件大小调整引擎，不依赖任何 GUI 组件，可供 GUI、命令行和批处理共用"""
+import contextlib
+import glob
+import importlib
+import io
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+# 按文件大小调整时按扩展名保留的输出格式；BMP 输入输出为 PNG，其他格式的输入转换为 JPEG
+OUTPUT_EXTENSIONS = {
+    ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".avif": "AVIF", ".png": "PNG", ".gif": "GIF",
+}
+
+# 按目录展开输入时识别的图像扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif", ".webp")
+
+# 各格式的 Pillow 插件模块；打开或保存前只导入所需的插件。Pillow 按格式名保存（以及旧版本按扩展名打开）
+# 未注册的格式时会一次导入全部约 40 个插件
+CODEC_PLUGINS = {
+    "JPEG": "JpegImagePlugin", "PNG": "PngImagePlugin", "GIF": "GifImagePlugin", "BMP": "BmpImagePlugin",
+    "TIFF": "TiffImagePlugin", "WEBP": "WebPImagePlugin", "AVIF": "AvifImagePlugin", "PPM": "PpmImagePlugin",
+}
+EXTENSION_CODECS = {
+    ".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".gif": "GIF", ".bmp": "BMP", ".tif": "TIFF",
+    ".tiff": "TIFF", ".webp": "WEBP", ".avif": "AVIF", ".ppm": "PPM", ".pgm": "PPM", ".pbm": "PPM",
+}
+
+_loaded_codecs = set()
+
+
+def load_codec(format: Optional[str]) -> None:
+    """导入格式名对应的 Pillow 插件；未知格式或插件不可用时由 Pillow 按需导入全部插件"""
+    if format in _loaded_codecs or format not in CODEC_PLUGINS:
+        return
+    try:
+        importlib.import_module("PIL." + CODEC_PLUGINS[format])
+    except ImportError:
+        pass
+    _loaded_codecs.add(format)
+
+
+def codec_for_path(path: str) -> Optional[str]:
+    """按扩展名推断的格式名"""
+    return EXTENSION_CODECS.get(os.path.splitext(path)[1].lower())
+
+
+# Image.MAX_IMAGE_PIXELS 是模块全局变量：打开图像时持有该锁，临时取消限制时不影响其他线程的检查
+_pixel_limit_lock = threading.Lock()
+
+
+def open_image(path: Union[str, BinaryIO], pixel_limit: bool = True) -> Image.Image:
+    """先导入扩展名对应的插件再打开图像；扩展名与内容不符或 path 为二进制流时 Pillow 按内容选择插件
+
+    pixel_limit 为 False 时不做 Pillow 的解压炸弹检查（Image.MAX_IMAGE_PIXELS），
+    用于只读取文件头或按内存预算分条带解码的超大图像
+    """
+    if isinstance(path, str):
+        load_codec(codec_for_path(path))
+        if pixel_limit:
+            with _pixel_limit_lock:
+                return Image.open(path)
+        with _pixel_limit_lock:
+            limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+            try:
+                return Image.open(path)
+            finally:
+                Image.MAX_IMAGE_PIXELS = limit
+    try:
+        return Image.open(path)
+    except Image.UnidentifiedImageError:
+        # 默认信息中是流对象的 repr，对调用方没有意义
+        raise Exception("无法识别的图像格式")
+
+
+class ImageInfo(NamedTuple):
+    """图像文件的元数据"""
+    path: str
+    size: int  # 文件字节数
+    dimensions: Tuple[int, int]  # 宽, 高
+    format: Optional[str]
+    mode: str
+    has_alpha: bool
+
+
+class ResizeResult(NamedTuple):
+    """一次调整的结果"""
+    output_path: Optional[str]  # 输出到流时为 None
+    size: int  # 输出文件字节数
+    dimensions: Tuple[int, int]  # 输出像素尺寸
+    encodes: int  # 编码次数
+    format: Optional[str] = None  # 按文件大小调整时的输出格式
+    reason: Optional[str] = None  # 在多个候选格式中选择该格式的原因
+
+
+class ProgressEvent(NamedTuple):
+    """按文件大小调整过程中每次试编码后发出的进度事件"""
+    encodes: int  # 累计编码次数
+    quality: int
+    scale: float
+    size: int  # 本次编码字节数
+
+
+class ResizeCancelled(Exception):
+    """调整任务被取消"""
+
+
+# 分阶段计时使用的阶段名及显示名称
+STAGE_NAMES = {
+    "cache": "查询缓存",
+    "decode": "解码",
+    "flatten": "合成背景",
+    "predict": "预测",
+    "resize": "缩放",
+    "encode": "编码",
+    "score": "评分",
+    "write": "写入",
+}
+
+
+def _mode_bytes(mode: str) -> int:
+    """颜色模式每像素占用的内存字节数（Pillow 中多通道模式每像素按 4 字节存储）"""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def _pixel_bytes(img: Image.Image) -> int:
+    """图像像素数据占用的内存字节数"""
+    return img.width * img.height * _mode_bytes(img.mode)
+
+
+class JobStats:
+    """单个调整任务的分阶段耗时（秒）、编码次数、写入字节数和峰值像素内存
+
+    由调用方创建后通过 stats 参数传给 resize_by_dimension / resize_by_filesize；
+    未传入且未注册钩子时引擎不做任何统计
+    """
+
+    def __init__(self, input_path: str, mode: str):
+        self.input_path = input_path
+        self.mode = mode
+        self.stages: Dict[str, float] = {}
+        self.total = 0.0
+        self.encodes = 0
+        self.bytes_written = 0
+        self.peak_image_bytes = 0  # 同时存在的已解码图像像素数据之和的最大值
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """累计 with 块内的耗时到阶段 name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def track(self, *images: Image.Image) -> None:
+        """记录同时存在的图像占用的像素内存"""
+        distinct = {id(img): img for img in images if img is not None}
+        self.peak_image_bytes = max(self.peak_image_bytes, sum(map(_pixel_bytes, distinct.values())))
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.total = time.perf_counter() - self._start
+        self.error = error
+
+    def merge(self, other: "JobStats") -> None:
+        """累加另一个任务的统计，用于批量汇总；峰值内存取最大值"""
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.total += other.total
+        self.encodes += other.encodes
+        self.bytes_written += other.bytes_written
+        self.peak_image_bytes = max(self.peak_image_bytes, other.peak_image_bytes)
+
+    def as_dict(self) -> dict:
+        return {
+            "input": self.input_path,
+            "mode": self.mode,
+            "ok": self.error is None,
+            "error": self.error,
+            "total_s": round(self.total, 6),
+            "stages_s": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "encodes": self.encodes,
+            "bytes_written": self.bytes_written,
+            "peak_image_bytes": self.peak_image_bytes,
+        }
+
+    def describe(self) -> str:
+        """单行摘要，如：解码 12 ms | 缩放 30 ms | 编码 85 ms (4 次) | 峰值内存 45.78 MB"""
+        parts = []
+        for name, label in STAGE_NAMES.items():
+            if name in self.stages:
+                text = f"{label} {self.stages[name] * 1000:.0f} ms"
+                if name == "encode":
+                    text += f" ({self.encodes} 次)"
+                parts.append(text)
+        parts.append(f"峰值内存 {format_size(self.peak_image_bytes)}")
+        return " | ".join(parts)
+
+
+_NO_STATS = contextlib.nullcontext()
+
+# 每个任务结束后以 JobStats 调用的钩子
+_stats_hooks: List[Callable[[JobStats], None]] = []
+
+
+def add_stats_hook(hook: Callable[[JobStats], None]) -> None:
+    """注册任务统计钩子；注册后即使调用方未传入 stats，引擎也会为每个任务收集统计
+
+    钩子在执行任务的线程中调用，只对当前进程内执行的任务生效
+    """
+    _stats_hooks.append(hook)
+
+
+def remove_stats_hook(hook: Callable[[JobStats], None]) -> None:
+    _stats_hooks.remove(hook)
+
+
+def stage(stats: Optional[JobStats], name: str):
+    """stats 为 None 时返回空上下文，统计关闭时几乎没有开销"""
+    return _NO_STATS if stats is None else stats.stage(name)
+
+
+def begin_stats(stats: Optional[JobStats], input_path: str, mode: str) -> Optional[JobStats]:
+    """任务开始时调用：调用方未传入 stats 但注册了钩子时创建统计对象"""
+    if stats is None and _stats_hooks:
+        return JobStats(input_path, mode)
+    return stats
+
+
+def finish_stats(stats: Optional[JobStats], error: Optional[str] = None) -> None:
+    """任务结束时调用：记录总耗时和错误并通知钩子"""
+    if stats is None:
+        return
+    stats.finish(error)
+    for hook in list(_stats_hooks):
+        hook(stats)
+
+
+class JsonLinesStatsLog:
+    """以 JSON Lines 格式追加写入任务统计，可作为钩子注册，也可直接调用 write"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, stats: JobStats) -> None:
+        line = json.dumps(dict(stats.as_dict(), timestamp=time.time()), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    __call__ = write
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _shared_view(img: Image.Image) -> Image.Image:
+    """返回与 img 共享像素数据的新 Image 对象
+
+    Image.save 会把编码参数写到图像对象的 encoderinfo 上，多个线程同时编码同一对象会互相覆盖，
+    因此并发编码时每个线程使用各自的轻量对象，而不复制像素；调用前 img 必须已解码。
+    Pillow 没有公开的共享像素方法，这里使用私有的 Image._new（tests/test_pillow_api.py 检查其行为），
+    不可用时退回复制像素
+    """
+    if not hasattr(img, "_new"):
+        return img.copy()
+    return img._new(img.im)
+
+
+class EncodeProbe:
+    """在内存中测量候选编码的大小，复用缓冲区，避免临时文件读写"""
+
+    def __init__(self, format: str = "JPEG", options: Optional[dict] = None):
+        load_codec(format)
+        self.format = format
+        self.options = options or {}  # 传给 Image.save 的其他编码参数
+        # 两个缓冲区交替使用：一个用于试编码，一个保存当前采用的编码结果
+        self._scratch = io.BytesIO()
+        self._kept = io.BytesIO()
+        self._spares = []  # 并发试编码使用的备用缓冲区
+        self.key = None  # 已保存编码的 (质量, 缩放比例)
+        self.encodes = 0  # 累计编码次数
+
+    def _encode(self, img, quality: int, buffer: io.BytesIO) -> int:
+        buffer.seek(0)
+        buffer.truncate()
+        img.save(buffer, format=self.format, quality=quality, **self.options)
+        return buffer.tell()
+
+    def measure(self, img, quality: int) -> int:
+        """以给定质量编码到草稿缓冲区并返回字节数"""
+        self.encodes += 1
+        return self._encode(img, quality, self._scratch)
+
+    def measure_many(self, img, qualities, executor) -> List[Tuple[int, io.BytesIO]]:
+        """在线程池中同时以多个质量编码，返回各自的 (字节数, 缓冲区)；用完后调用 release 归还缓冲区"""
+        buffers = [self._spares.pop() if self._spares else io.BytesIO() for _ in qualities]
+        img.load()
+        sizes = list(executor.map(
+            lambda args: self._encode(_shared_view(img), *args), zip(qualities, buffers)))
+        self.encodes += len(qualities)
+        return list(zip(sizes, buffers))
+
+    def keep(self, key, buffer: Optional[io.BytesIO] = None) -> None:
+        """采用一次试编码的结果（默认为草稿缓冲区中的最近一次），旧的保留结果成为备用缓冲区"""
+        if buffer is None or buffer is self._scratch:
+            self._scratch, self._kept = self._kept, self._scratch
+        else:
+            self._spares.append(self._kept)
+            self._kept = buffer
+        self.key = key
+
+    def release(self, buffers) -> None:
+        """归还 measure_many 借出且未被保留的缓冲区"""
+        self._spares.extend(buffer for buffer in buffers if buffer is not self._kept)
+
+    @property
+    def size(self) -> int:
+        """当前保留编码的字节数"""
+        return self._kept.tell()
+
+    def write_to(self, output_path: str) -> str:
+        """将当前保留的编码一次性写入输出文件，无需再次编码"""
+        with open(output_path, "wb") as f:
+            self.write_stream(f)
+        return output_path
+
+    def write_stream(self, output: BinaryIO) -> None:
+        """将当前保留的编码写入二进制流，不复制缓冲区"""
+        with self._kept.getbuffer() as view:
+            output.write(view)
+
+    def snapshot(self) -> io.BytesIO:
+        """当前保留编码的副本（位置在末尾，可再交给 keep）"""
+        buffer = io.BytesIO(self._kept.getvalue())
+        buffer.seek(0, io.SEEK_END)
+        return buffer
+
+    def decode(self) -> Image.Image:
+        """解码当前保留的编码，得到输出的实际像素"""
+        img = Image.open(io.BytesIO(self._kept.getvalue()))
+        img.load()
+        return img
+
+
+def quantize(img: Image.Image, colors: int, binary_alpha: bool = False) -> Image.Image:
+    """量化为 colors 色的调色板图像
+
+    binary_alpha 为 True 时（GIF 只支持一个透明色）用最后一个颜色表示透明，不透明度低于一半的像素映射为透明
+    """
+    # 八叉树量化支持透明通道，且比中位切分快一个数量级
+    if not (binary_alpha and img.mode == "RGBA"):
+        return img.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+    paletted = img.convert("RGB").quantize(colors=colors - 1, method=Image.Quantize.FASTOCTREE)
+    palette = paletted.getpalette()[:3 * (colors - 1)]
+    paletted.putpalette(palette + [0] * (3 * colors - len(palette)))
+    paletted.paste(colors - 1, mask=img.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+    paletted.info["transparency"] = colors - 1
+    return paletted
+
+
+class PaletteProbe(EncodeProbe):
+    """调色板 PNG/GIF 试编码，"质量"为量化后的颜色数"""
+
+    def _encode(self, img, quality: int, buffer: io.BytesIO) -> int:
+        paletted = quantize(img, quality, binary_alpha=self.format == "GIF")
+        buffer.seek(0)
+        buffer.truncate()
+        paletted.save(buffer, format=self.format, **self.options)
+        return buffer.tell()
+
+
+class QualityResult(NamedTuple):
+    """一次质量搜索的结果"""
+    quality: int
+    scale: float
+    size: int
+    encodes: int  # 本次搜索实际编码次数（不含缓存命中）
+    in_tolerance: bool
+
+
+class QualitySolver:
+    """在单调的 质量→文件大小 曲线上做区间割线/二分搜索，缓存所有测量点
+
+    提供 executor 时每轮在线程池中同时编码 parallel 个候选质量，并用全部结果收窄区间
+    """
+
+    min_quality = 1
+    max_quality = 95
+    initial_quality = 80
+
+    def __init__(self, probe: EncodeProbe, max_encodes: int = 8,
+                 progress: Optional[Callable[[ProgressEvent], None]] = None, cancel=None,
+                 executor=None, parallel: int = 1, quality_range: Optional[Tuple[int, int]] = None,
+                 initial_quality: Optional[int] = None):
+        self.probe = probe
+        if quality_range:
+            self.min_quality, self.max_quality = quality_range
+        if initial_quality:
+            self.initial_quality = initial_quality
+        self.max_encodes = max_encodes
+        self.progress = progress  # 每次试编码后调用
+        self.cancel = cancel  # 具有 is_set() 的取消标志，如 threading.Event
+        self.executor = executor
+        self.parallel = parallel if executor is not None else 1
+        self.curve: Dict[Tuple[int, float], int] = {}  # (质量, 缩放比例) → 字节数
+
+    def size_at(self, img, quality: int, scale: float) -> int:
+        """返回指定质量和缩放比例下的编码大小，优先使用缓存"""
+        key = (quality, scale)
+        if key not in self.curve:
+            check_cancelled(self.cancel)
+            self._record(quality, scale, self.probe.measure(img, quality))
+        return self.curve[key]
+
+    def _record(self, quality: int, scale: float, size: int) -> None:
+        self.curve[(quality, scale)] = size
+        if self.progress:
+            self.progress(ProgressEvent(self.probe.encodes, quality, scale, size))
+
+    def _measure_round(self, img, qualities, scale: float):
+        """测量一轮候选质量，返回 [(质量, 大小, 缓冲区)]；缓存命中或顺序编码时缓冲区为 None/草稿缓冲区"""
+        pending = [quality for quality in qualities if (quality, scale) not in self.curve]
+        measured = {}
+        if len(pending) > 1:
+            check_cancelled(self.cancel)
+            for quality, (size, buffer) in zip(pending, self.probe.measure_many(img, pending, self.executor)):
+                self._record(quality, scale, size)
+                measured[quality] = buffer
+        elif pending:
+            self.size_at(img, pending[0], scale)
+            measured[pending[0]] = self.probe._scratch
+        return [(quality, self.curve[(quality, scale)], measured.get(quality)) for quality in qualities]
+
+    def solve(self, img, target_size_bytes: int, tolerance: float, scale: float = 1.0,
+              initial_quality: Optional[int] = None, log_slope: Optional[float] = None) -> QualityResult:
+        """搜索最接近目标且在容差内的质量，返回时 probe 中保留该编码
+
+        log_slope 为预测的 d(ln 大小)/d(质量)，只测得区间一端时用它做牛顿步而不是二分
+        """
+        min_acceptable = target_size_bytes * (1 - tolerance)
+        max_acceptable = target_size_bytes * (1 + tolerance)
+        encodes_before = self.probe.encodes
+
+        # under: 已测得偏小的最高质量; over: 已测得偏大的最低质量
+        under: Optional[Tuple[int, int]] = None
+        over: Optional[Tuple[int, int]] = None
+        best: Optional[Tuple[float, int, int]] = None  # (与目标的对数距离, 质量, 大小)
+
+        quality = initial_quality or self.initial_quality
+        low, high = self.min_quality, self.max_quality
+        while True:
+            # 已有区间两端时，用两端之间的平均斜率安排并发候选的间距
+            slope = log_slope
+            if under and over:
+                slope = math.log(over[1] / under[1]) / (over[0] - under[0])
+            round_results = self._measure_round(
+                img, self._candidates(quality, low, high, tolerance, slope), scale)
+            for candidate, size, buffer in round_results:
+                in_tolerance = min_acceptable <= size <= max_acceptable
+
+                # 容差内的结果总是优于容差外的结果，其次比较与目标的距离
+                distance = abs(math.log(size / target_size_bytes)) + (0 if in_tolerance else 1)
+                if best is None or distance < best[0]:
+                    best = (distance, candidate, size)
+                    if buffer is not None:
+                        self.probe.keep((candidate, scale), buffer)
+
+                if size > max_acceptable:
+                    if over is None or candidate < over[0]:
+                        over = (candidate, size)
+                elif size < min_acceptable:
+                    if under is None or candidate > under[0]:
+                        under = (candidate, size)
+            self.probe.release(buffer for _, _, buffer in round_results if buffer is not None
+                               and buffer is not self.probe._scratch)
+
+            if best[0] < 1:  # 已找到容差内的结果
+                break
+
+            low = under[0] + 1 if under else self.min_quality
+            high = over[0] - 1 if over else self.max_quality
+            # 并发时编码预算按轮数计算，每轮最多 parallel 次编码
+            if low > high or self.probe.encodes - encodes_before >= self.max_encodes * self.parallel:
+                break
+
+            quality = self._next_quality(under, over, low, high, target_size_bytes, over or under, log_slope)
+
+        _, quality, size = best
+        # 最佳点来自缓存而未保留编码时，补编码一次
+        if self.probe.key != (quality, scale):
+            self.probe.measure(img, quality)
+            self.probe.keep((quality, scale))
+
+        return QualityResult(
+            quality=quality,
+            scale=scale,
+            size=size,
+            encodes=self.probe.encodes - encodes_before,
+            in_tolerance=min_acceptable <= size <= max_acceptable,
+        )
+
+    def _candidates(self, guess: int, low: int, high: int, tolerance: float,
+                    log_slope: Optional[float]) -> List[int]:
+        """本轮要测量的质量：顺序搜索时只有 guess；并发时按斜率在 guess 两侧补充候选，无斜率时均分区间"""
+        if self.parallel <= 1:
+            return [guess]
+
+        if not log_slope:
+            spread = (low + (high - low) * i // self.parallel for i in range(1, self.parallel))
+            return list(dict.fromkeys([guess, *spread]))
+
+        # 相邻候选的大小约相差一个容差带
+        step = max(1, round(math.log(1 + tolerance) / log_slope))
+        picks = [guess]
+        offset = 1
+        while len(picks) < self.parallel and (guess - offset * step >= low or guess + offset * step <= high):
+            for quality in (guess - offset * step, guess + offset * step):
+                if low <= quality <= high and len(picks) < self.parallel:
+                    picks.append(quality)
+            offset += 1
+        return picks
+
+    def _next_quality(self, under, over, low: int, high: int, target_size_bytes: int,
+                      last: Tuple[int, int], log_slope: Optional[float]) -> int:
+        """在 [low, high] 内选取下一个测试质量：有区间两端时用割线插值，否则按预测斜率或向未知端二分"""
+        if under and over:
+            (q1, s1), (q2, s2) = under, over
+            # 文件大小随质量近似指数增长，在对数空间中做线性插值
+            t = math.log(target_size_bytes / s1) / math.log(s2 / s1)
+            quality = round(q1 + t * (q2 - q1))
+        elif log_slope:
+            quality, size = last
+            quality = round(quality + math.log(target_size_bytes / size) / log_slope)
+        elif over:
+            quality = (low + over[0]) // 2
+        else:
+            quality = (under[0] + high + 1) // 2
+        return max(low, min(quality, high))
+
+
+def check_cancelled(cancel) -> None:
+    """取消标志已设置时抛出 ResizeCancelled"""
+    if cancel is not None and cancel.is_set():
+        raise ResizeCancelled("任务已取消")
+
+
+def format_size(size_bytes: int) -> str:
+    """将字节数转换为易读的格式（B, KB, MB）"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.2f} KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.2f} MB"
+
+
+def probe_header(file_path: str, file_size: int) -> ImageInfo:
+    """打开文件一次，只解析文件头，读取格式、像素尺寸、颜色模式和透明通道（不检查像素数上限）"""
+    with open_image(file_path, pixel_limit=False) as img:
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+        return ImageInfo(
+            path=file_path,
+            size=file_size,
+            dimensions=img.size,
+            format=img.format,
+            mode=img.mode,
+            has_alpha=has_alpha,
+        )
+
+
+class MetadataCache:
+    """以 (路径, 修改时间, 文件大小) 为键缓存文件头信息，文件变化后自动失效
+
+    每次查询只做一次 stat；无法识别的文件同样缓存（值为 None），重复扫描目录时不再反复打开
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], Optional[ImageInfo]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path: str) -> Optional[ImageInfo]:
+        """返回文件头信息；文件不存在或不是有效图像时返回 None"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        try:
+            info = probe_header(file_path, stat.st_size)
+        except Exception:
+            info = None
+
+        with self._lock:
+            self._entries[key] = info
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 引擎和 GUI 共用的元数据缓存
+metadata_cache = MetadataCache()
+
+
+class FormatMemo:
+    """在同一工作图像上按文件大小搜索某一输出格式时保留的中间结果，供换一个目标大小的下一次搜索复用"""
+
+    def __init__(self):
+        self.prepared: Optional[Image.Image] = None  # prepare_for_format 的结果
+        self.curve: Dict[Tuple[int, float], int] = {}  # (质量, 缩放比例) → 字节数
+        self.samples: Optional[tuple] = None  # (predict_samples 的结果,)，图像太小不预测时为 (None,)
+        self.resized: Optional[Image.Image] = None  # 最近一次使用的缩放结果
+        self.png_lossless: Optional[Tuple[int, int]] = None  # PNG 无损编码最小的 (字节数, 策略)
+        # PNG 256 色编码最小的 (字节数, 策略, 以 PNG_FINAL_LEVEL 编码与之的大小比例)
+        self.png_seed: Optional[Tuple[int, int, float]] = None
+        self.final_curve: Dict[Tuple[int, float], int] = {}  # PNG 以 PNG_FINAL_LEVEL 编码的 (颜色数, 缩放比例) → 字节数
+        self.png_scaled: Dict[Tuple[int, int], int] = {}  # 缩小尺寸的无损 PNG：像素尺寸 → 字节数
+        self.kept: Optional[Tuple[tuple, bytes]] = None  # 上次搜索采用的 (编码键, 编码结果)
+        self.scorer: Optional["SimilarityScorer"] = None  # 感知画质模式的参考图块和已评分的候选
+
+    def images(self) -> List[Image.Image]:
+        return [img for img in (self.prepared, self.resized) if img is not None]
+
+    def kept_buffer(self) -> Optional[io.BytesIO]:
+        """上次采用的编码结果的副本（位置在末尾，与 EncodeProbe 的缓冲区约定一致）"""
+        if self.kept is None:
+            return None
+        buffer = io.BytesIO(self.kept[1])
+        buffer.seek(0, io.SEEK_END)
+        return buffer
+
+    def remember(self, probe: EncodeProbe) -> None:
+        self.kept = (probe.key, probe._kept.getvalue())
+
+
+class SessionEntry:
+    """一个文件的会话缓存：已解码的源图像、按文件大小搜索的工作图像和各格式的搜索中间结果"""
+
+    def __init__(self, key: Tuple[int, int]):
+        self.key = key  # (修改时间, 文件大小)
+        self.lock = threading.Lock()
+        self.decoded: List[Image.Image] = []  # JPEG 可能为降采样解码的结果
+        self.working: Dict[bool, Image.Image] = {}  # 是否合成透明背景 → 工作图像
+        self.memos: Dict[bool, Dict[str, FormatMemo]] = {}  # 是否合成透明背景 → 格式名 → 中间结果
+
+    def decoded_for(self, request: Tuple[int, int]) -> Optional[Image.Image]:
+        """已解码的图像中宽高都不小于 request 的最小者"""
+        return min((img for img in self.decoded if img.width >= request[0] and img.height >= request[1]),
+                   key=lambda img: img.width * img.height, default=None)
+
+    @property
+    def nbytes(self) -> int:
+        images = self.decoded + list(self.working.values())
+        images += [img for memos in self.memos.values() for memo in memos.values() for img in memo.images()]
+        # 共享像素数据的视图（_shared_view）只计一次
+        return sum(map(_pixel_bytes, {id(img.im): img for img in images}.values()))
+
+
+# 会话缓存默认的像素内存上限
+DEFAULT_SESSION_BYTES = 512 * 1024 * 1024
+
+
+class SessionCache:
+    """在一个会话（如图形界面）内按文件缓存解码结果和搜索中间结果，对同一文件反复调整参数时不必重新解码和搜索
+
+    以 (修改时间, 文件大小) 识别文件内容，文件变化后旧条目失效；
+    像素内存超过 max_bytes 时从最久未使用的文件开始淘汰，正在使用的条目除外
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_SESSION_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextlib.contextmanager
+    def use(self, file_path: str):
+        """独占使用文件的缓存条目（同一文件的任务依次执行），退出后按内存上限淘汰"""
+        stat = os.stat(file_path)
+        path, key = os.path.abspath(file_path), (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry.key != key:
+                entry = self._entries[path] = SessionEntry(key)
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._entries.move_to_end(path)
+        try:
+            with entry.lock:
+                yield entry
+        finally:
+            self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            sizes = {path: entry.nbytes for path, entry in self._entries.items()}
+            total = sum(sizes.values())
+            for path in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                if self._entries[path].lock.locked():
+                    continue
+                del self._entries[path]
+                total -= sizes[path]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _use_session(session: Optional[SessionCache], file_path: str):
+    """session 为 None 时返回产出 None 的空上下文"""
+    return contextlib.nullcontext() if session is None else session.use(file_path)
+
+
+def is_valid_image(file_path: str) -> bool:
+    """检查文件是否为有效的图像"""
+    return metadata_cache.get(file_path) is not None
+
+
+def read_image_info(file_path: str) -> ImageInfo:
+    """读取图像文件大小、像素尺寸、格式、颜色模式和透明通道（只解析文件头，结果缓存）"""
+    info = metadata_cache.get(file_path)
+    if info is None:
+        raise Exception(f"无法识别的图像文件: {file_path}")
+    return info
+
+
+def expand_inputs(patterns: Iterable[str], wildcards: bool = True) -> List[str]:
+    """展开通配符和目录，返回去重后的图像文件列表（保持输入顺序）
+
+    wildcards 为 False 时只展开目录，其他路径按原样使用（图形界面选择或拖放的路径可能含有 [ ] * ? 等字符）
+    """
+    paths = []
+    for pattern in patterns:
+        matches = (sorted(glob.glob(pattern, recursive=True)) if wildcards else []) or [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                paths.extend(
+                    os.path.join(match, name) for name in sorted(os.listdir(match))
+                    if name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+            else:
+                paths.append(match)
+    return list(dict.fromkeys(os.path.normpath(p) for p in paths))
+
+
+def get_output_path(input_path: str, output_dir: Optional[str] = None) -> str:
+    """生成输出文件路径，默认与输入文件同目录"""
+    dir_name = os.path.dirname(input_path) if output_dir is None else output_dir
+    file_name = os.path.basename(input_path)
+    name_without_ext, ext = os.path.splitext(file_name)
+    output_file_name = f"{name_without_ext}_resized{ext}"
+    return os.path.join(dir_name, output_file_name)
+
+
+def converts_to_jpeg(input_path: str) -> bool:
+    """按文件大小调整时，该输入是否会被转换为 JPEG 输出"""
+    ext = os.path.splitext(input_path)[1].lower()
+    return ext not in OUTPUT_EXTENSIONS and ext != ".bmp"
+
+
+def flatten_alpha(img: Image.Image) -> Image.Image:
+    """将透明图像合成到白色背景上，并转换为 JPEG 可编码的颜色模式"""
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new(img.mode[:-1], img.size, 'white')
+        background.paste(img, img.split()[-1])
+        return background
+
+    if img.mode not in ('RGB', 'L', 'CMYK'):
+        return img.convert('RGB')
+    return img
+
+
+# 降采样解码/整数倍缩小后保留的余量：中间图像至少为目标尺寸的该倍数，再用 LANCZOS 精确缩放。
+# 数值越大越接近全分辨率缩放的效果，None 表示始终全分辨率解码并直接缩放
+REDUCING_GAP = 2.0
+
+
+def draft_for(img: Image.Image, target_size: Tuple[int, int], reducing_gap: Optional[float]) -> None:
+    """对尚未解码的 JPEG 请求 DCT 域降采样解码，解码尺寸不小于目标尺寸的 reducing_gap 倍"""
+    if reducing_gap and img.format == "JPEG":
+        width, height = target_size
+        img.draft(img.mode, (math.ceil(width * reducing_gap), math.ceil(height * reducing_gap)))
+
+
+def _decode_request(input_path: str, target_size: Tuple[int, int], reducing_gap: Optional[float]) -> Tuple[int, int]:
+    """缩放到 target_size 所需的最小解码尺寸，与 draft_for 请求的尺寸一致；不降采样时为原图尺寸"""
+    if not reducing_gap:
+        return read_image_info(input_path).dimensions
+    return (math.ceil(target_size[0] * reducing_gap), math.ceil(target_size[1] * reducing_gap))
+
+
+def resample(img: Image.Image, target_size: Tuple[int, int], reducing_gap: Optional[float]) -> Image.Image:
+    """先按整数倍 reduce() 缩小，再用 LANCZOS 缩放到精确尺寸"""
+    return img.resize(target_size, resample=Image.Resampling.LANCZOS, reducing_gap=reducing_gap)
+
+
+# 内存估算时每个像素占用的字节数（Pillow 的多通道图像按每像素 4 字节存储）
+BYTES_PER_PIXEL = 4
+
+# 未压缩 raw 数据中各原始模式的每像素位数，用于按行截取分块
+RAW_BITS = {
+    "1": 1, "L": 8, "P": 8, "LA": 16, "I;16": 16, "I;16B": 16,
+    "RGB": 24, "BGR": 24, "RGBA": 32, "RGBX": 32, "BGRA": 32, "BGRX": 32, "CMYK": 32,
+}
+
+# 分条带处理时预算中预留给分配器碎片和输出编码缓冲区的比例
+BUDGET_HEADROOM = 0.25
+
+# LANCZOS 滤波器在源图像上的支撑半径（以缩放比例为单位）
+LANCZOS_SUPPORT = 3
+
+# 分条带解码时每次从文件读取的最大字节数
+BAND_READ_BYTES = 1024 * 1024
+
+
+def _raw_args(args) -> Tuple[str, int, int]:
+    """将 raw 分块参数规范为 (原始模式, 行跨度, 方向)"""
+    if isinstance(args, str):
+        return args, 0, 1
+    args = tuple(args) + (0, 1)[len(args) - 1:]
+    return args[0], args[1], args[2]
+
+
+def _streamable(img: Image.Image) -> bool:
+    """图像数据是否全部为可按行截取的未压缩 raw 分块（如未压缩 TIFF、PPM、BMP）"""
+    return bool(img.tile) and all(
+        tile[0] == "raw" and _raw_args(tile[3])[0] in RAW_BITS for tile in img.tile
+    )
+
+
+def _band_tile(tile, y0: int, y1: int):
+    """截取 raw 分块中与 [y0, y1) 行相交的部分，坐标转换为相对于条带顶部"""
+    _, (ex0, ey0, ex1, ey1), offset, args = tile
+    rawmode, stride, orientation = _raw_args(args)
+    stride = stride or ((ex1 - ex0) * RAW_BITS[rawmode] + 7) // 8
+    top, bottom = max(y0, ey0), min(y1, ey1)
+    # 自下而上存储（如 BMP）时，条带数据从最底下一行开始
+    row = top - ey0 if orientation >= 0 else ey1 - bottom
+    return ("raw", (ex0, top - y0, ex1, bottom - y0), offset + row * stride, (rawmode, stride, orientation))
+
+
+def _load_band(input_path: str, y0: int, y1: int) -> Image.Image:
+    """只解码源图像 [y0, y1) 行：按 raw 分块的位置分段读取原始字节，以 Image.frombytes 解码后拼接"""
+    with open_image(input_path, pixel_limit=False) as img:
+        mode = img.mode
+        tiles = [_band_tile(tile, y0, y1) for tile in img.tile if tile[1][1] < y1 and tile[1][3] > y0]
+        band = Image.new(mode, (img.width, y1 - y0))
+        band.info = dict(img.info)
+        if mode == "P":
+            band.putpalette(img.palette.palette, img.palette.rawmode or img.palette.mode)
+
+    with open(input_path, "rb") as f:
+        for tile in tiles:
+            _, (x0, top, x1, bottom), _, (_, stride, _) = tile
+            rows = max(1, BAND_READ_BYTES // stride)
+            for chunk_top in range(top, bottom, rows):
+                _, (_, _, _, height), offset, args = _band_tile(tile, chunk_top, min(chunk_top + rows, bottom))
+                f.seek(offset)
+                chunk = Image.frombytes(mode, (x1 - x0, height), f.read(stride * height), "raw", *args)
+                band.paste(chunk, (x0, chunk_top))
+    return band
+
+
+def _draft_size(size: Tuple[int, int], request: Tuple[int, int]) -> Tuple[int, int]:
+    """JPEG 降采样解码（1/1 ~ 1/8）后不小于 request 的最小尺寸"""
+    width, height = size
+    for factor in (8, 4, 2, 1):
+        if math.ceil(width / factor) >= request[0] and math.ceil(height / factor) >= request[1]:
+            return (math.ceil(width / factor), math.ceil(height / factor))
+    return size
+
+
+def _flatten_copies(flatten: bool, mode: str, alpha: bool) -> int:
+    """解码结果加上（需要时）合成透明背景的副本数；不透明的 RGB/L/CMYK 图像合成时不产生副本"""
+    return 2 if flatten and (alpha or mode not in ("RGB", "L", "CMYK")) else 1
+
+
+def _decode_bytes(decoded: Tuple[int, int], target_size: Tuple[int, int], copies: int,
+                  reducing_gap: Optional[float]) -> int:
+    """解码为 decoded 尺寸（copies 份）并缩放到 target_size 时的峰值像素内存；尺寸相同时不缩放"""
+    total = decoded[0] * decoded[1] * BYTES_PER_PIXEL * copies
+    if decoded != target_size:
+        total += _resample_bytes(decoded, target_size, reducing_gap, BYTES_PER_PIXEL)
+    return total
+
+
+def _draft_factor(size: Tuple[int, int], target_size: Tuple[int, int], memory_budget: int, copies: int,
+                  reducing_gap: Optional[float], shrink_target: bool = False) -> int:
+    """JPEG 在内存预算内的降采样因子（1/2/4/8）
+
+    优先取解码尺寸不小于目标 reducing_gap 倍的最小尺寸；超出预算时依次尝试更大的因子，取预算内最大的解码尺寸。
+    shrink_target 为 True 时调用方接受以小于目标的解码尺寸作为结果（不再放大），否则按放大到目标计算内存；
+    都超出预算时返回 8，由调用方报错
+    """
+    width, height = size
+    preferred = 1
+    if reducing_gap:
+        request = (target_size[0] * reducing_gap, target_size[1] * reducing_gap)
+        preferred = next(factor for factor in (8, 4, 2, 1) if factor == 1 or (
+            math.ceil(width / factor) >= request[0] and math.ceil(height / factor) >= request[1]))
+    for factor in (1, 2, 4, 8):
+        if factor < preferred:
+            continue
+        decoded = (math.ceil(width / factor), math.ceil(height / factor))
+        target = decoded if shrink_target and decoded[0] < target_size[0] else target_size
+        if _decode_bytes(decoded, target, copies, reducing_gap) <= memory_budget:
+            return factor
+    return 8
+
+
+def _unstreamable_message(img: Image.Image, decoded_bytes: int, memory_budget: int) -> str:
+    compression = img.info.get("compression")
+    name = f"{img.format}（{compression} 压缩）" if compression and compression != "raw" else f"{img.format} 格式"
+    return (f"{name}不支持分块解码，整图解码约需 {format_size(decoded_bytes)}，超出内存预算 {format_size(memory_budget)}；"
+            f"可先转换为未压缩的 TIFF、PPM 或 BMP")
+
+
+def budget_error(input_path: str, memory_budget: int) -> Optional[str]:
+    """设置内存预算时预先检查：既不能分条带解码也不能降采样解码、整图解码又超出预算的图像返回原因，否则返回 None
+
+    只读取文件头；无法打开的文件返回 None，由实际处理时报告错误
+    """
+    try:
+        with open_image(input_path, pixel_limit=False) as img:
+            decoded_bytes = img.width * img.height * BYTES_PER_PIXEL
+            if img.format == "JPEG" or _streamable(img) or decoded_bytes <= memory_budget:
+                return None
+            return _unstreamable_message(img, decoded_bytes, memory_budget)
+    except Exception:
+        return None
+
+
+def load_within_budget(input_path: str, target_size: Tuple[int, int], memory_budget: int,
+                       flatten: bool = False, reducing_gap: Optional[float] = REDUCING_GAP,
+                       cancel=None, stats: Optional[JobStats] = None) -> Image.Image:
+    """在内存预算内解码并缩放到 target_size，返回已解码的图像
+
+    可按行截取的格式分条带解码、（可选）合成透明背景并缩放，峰值像素内存受 memory_budget 限制；
+    JPEG 在预算内选择降采样因子（预算不足时解码尺寸可能小于目标的 reducing_gap 倍）；
+    其他格式只有整图解码不超出预算时才能处理；解码前已按预算检查，因此不再检查 Pillow 的像素数上限
+    """
+    target_width, target_height = target_size
+    output_bytes = target_width * target_height * BYTES_PER_PIXEL
+
+    with open_image(input_path, pixel_limit=False) as img:
+        width, height = img.size
+        copies = _flatten_copies(flatten, img.mode, has_alpha(img))
+        if img.format == "JPEG":
+            factor = _draft_factor(img.size, target_size, memory_budget, copies, reducing_gap)
+            img.draft(img.mode, (width // factor, height // factor))
+        decoded_bytes = _decode_bytes(img.size, target_size, copies, reducing_gap)
+        if not _streamable(img) or decoded_bytes <= memory_budget:
+            if decoded_bytes > memory_budget:
+                raise Exception(_unstreamable_message(img, decoded_bytes, memory_budget))
+            img.load()
+            decoded = flatten_alpha(img) if flatten else img
+            resized = decoded if decoded.size == target_size else resample(decoded, target_size, reducing_gap)
+            if stats is not None:
+                stats.track(img, decoded, resized)
+            return resized
+
+    # 每个条带：解码行 + 合成副本 + 水平缩放后的中间结果；预留部分预算给分配器碎片和输出编码
+    usable = memory_budget * (1 - BUDGET_HEADROOM)
+    scale_y = height / target_height
+    margin = math.ceil(LANCZOS_SUPPORT * max(scale_y, 1)) + 1
+    row_bytes = width * BYTES_PER_PIXEL * copies + target_width * BYTES_PER_PIXEL
+    source_rows = (usable - output_bytes) // row_bytes
+    band_rows = int((source_rows - 2 * margin) / scale_y)
+    if band_rows < 1:
+        raise Exception(f"内存预算 {format_size(memory_budget)} 不足以按条带处理该图像")
+
+    output = None
+    for top in range(0, target_height, band_rows):
+        check_cancelled(cancel)
+        bottom = min(top + band_rows, target_height)
+        # 条带上下各多解码 margin 行，使滤波器在条带边界处看到与整图相同的像素
+        src_top, src_bottom = top * scale_y, bottom * scale_y
+        y0 = max(0, math.floor(src_top) - margin)
+        y1 = min(height, math.ceil(src_bottom) + margin)
+
+        band = _load_band(input_path, y0, y1)
+        flattened = flatten_alpha(band) if flatten else band
+        resized = flattened.resize((target_width, bottom - top), resample=Image.Resampling.LANCZOS,
+                                   box=(0, src_top - y0, width, src_bottom - y0))
+        if stats is not None:
+            stats.track(band, flattened, resized, output)
+        del band, flattened
+
+        if output is None:
+            output = Image.new(resized.mode, target_size)
+            if resized.mode == "P":
+                output.putpalette(resized.getpalette())
+        output.paste(resized, (0, top))
+    return output
+
+
+def resize_by_dimension(input_path: str, target_size: Tuple[int, int],
+                        output_path: Optional[str] = None, cancel=None,
+                        reducing_gap: Optional[float] = REDUCING_GAP,
+                        memory_budget: Optional[int] = None,
+                        stats: Optional[JobStats] = None,
+                        session: Optional[SessionCache] = None) -> ResizeResult:
+    """按像素尺寸调整图像；设置 memory_budget（字节）时分条带处理，峰值像素内存不超出预算
+
+    stats 用于收集分阶段耗时，编码阶段包含写入输出文件；
+    给出 session 时复用（并缓存）该文件已解码的图像，未设置 memory_budget 时有效
+    """
+    output_path = output_path or get_output_path(input_path)
+    stats = begin_stats(stats, input_path, "dimension")
+    error = None
+
+    try:
+        if memory_budget:
+            with stage(stats, "decode"):
+                resized_img = load_within_budget(input_path, target_size, memory_budget,
+                                                 reducing_gap=reducing_gap, cancel=cancel, stats=stats)
+        else:
+            with _use_session(session, input_path) as entry:
+                img = entry.decoded_for(_decode_request(input_path, target_size, reducing_gap)) if entry else None
+                if img is None:
+                    with open_image(input_path) as img:
+                        # 缩小时无需解码全部像素
+                        with stage(stats, "decode"):
+                            draft_for(img, target_size, reducing_gap)
+                            img.load()
+                    if entry is not None:
+                        entry.decoded.append(img)
+
+                # 调整图像大小
+                with stage(stats, "resize"):
+                    resized_img = resample(img, target_size, reducing_gap)
+                if stats is not None:
+                    stats.track(img, resized_img)
+        check_cancelled(cancel)
+
+        # 保存调整后的图像
+        with stage(stats, "encode"):
+            save_resized(resized_img, output_path)
+        size = os.path.getsize(output_path)
+        if stats is not None:
+            stats.encodes, stats.bytes_written = 1, size
+
+    except ResizeCancelled:
+        error = "已取消"
+        raise
+    except Exception as e:
+        error = f"调整尺寸失败: {str(e)}"
+        raise Exception(error)
+    finally:
+        finish_stats(stats, error)
+
+    return ResizeResult(output_path, size, resized_img.size, 1)
+
+
+# 按像素尺寸调整时 JPEG 输出的质量
+DIMENSION_JPEG_QUALITY = 90
+
+
+def dimension_save_options(format: Optional[str]) -> dict:
+    """按像素尺寸调整时各格式的编码参数"""
+    return {"quality": DIMENSION_JPEG_QUALITY} if format == "JPEG" else {}
+
+
+def save_resized(img: Image.Image, output: Union[str, BinaryIO], format: Optional[str] = None) -> None:
+    """保存按像素尺寸调整后的图像，格式由 format 或输出扩展名确定（输出到流时必须给出 format），JPEG 使用质量 90"""
+    format = format or codec_for_path(output)
+    load_codec(format)
+    img.save(output, format=format, **dimension_save_options(format))
+
+
+def load_working_image(input_path: str, memory_budget: Optional[int] = None,
+                       reducing_gap: Optional[float] = REDUCING_GAP, cancel=None,
+                       stats: Optional[JobStats] = None, flatten: bool = True) -> Image.Image:
+    """解码并（flatten 为 True 时）合成透明背景，得到按文件大小搜索使用的工作图像；超出内存预算时按预算缩小"""
+    if memory_budget:
+        info = read_image_info(input_path)
+        width, height = info.dimensions
+        # 搜索过程中同时存在工作图像和一份缩放后的副本（不放大，不超过工作图像），保留透明通道时不能保留透明通道的格式
+        # 还需要一份合成背景的副本（代理图和编码缓冲区很小，计入预算余量）
+        max_pixels = memory_budget // (BYTES_PER_PIXEL * (2 if flatten else 3))
+        if width * height > max_pixels:
+            scale = math.sqrt(max_pixels / (width * height))
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            if info.format == "JPEG":
+                # 预算内只能以更低分辨率降采样解码时，工作图像取解码尺寸，不再放大
+                factor = _draft_factor(info.dimensions, size, memory_budget,
+                                       _flatten_copies(flatten, info.mode, info.has_alpha), reducing_gap,
+                                       shrink_target=True)
+                decoded = (math.ceil(width / factor), math.ceil(height / factor))
+                if decoded[0] < size[0]:
+                    size = decoded
+            with stage(stats, "decode"):
+                return load_within_budget(input_path, size, memory_budget, flatten=flatten,
+                                          reducing_gap=reducing_gap, cancel=cancel, stats=stats)
+
+    with open_image(input_path) as img:
+        with stage(stats, "decode"):
+            img.load()
+        if not flatten:
+            if stats is not None:
+                stats.track(img)
+            return img
+        with stage(stats, "flatten"):
+            flattened = flatten_alpha(img)
+        if stats is not None:
+            stats.track(img, flattened)
+        return flattened
+
+
+# 峰值内存估算中为编码器内部缓冲区和分配器碎片预留的比例
+ESTIMATE_HEADROOM = 0.25
+
+
+def _resample_bytes(size: Tuple[int, int], target_size: Tuple[int, int], reducing_gap: Optional[float],
+                    bytes_per_pixel: int) -> int:
+    """resample() 从 size 缩放到 target_size 时输出和中间图像占用的内存
+
+    中间图像包括 reduce() 的整数倍缩小结果和 LANCZOS 先水平后垂直两趟缩放之间的 目标宽×源高 图像
+    """
+    width, height = size
+    target_width, target_height = target_size
+    total = target_width * target_height * BYTES_PER_PIXEL
+    if reducing_gap:
+        factor_x = max(1, int(width / (target_width * reducing_gap)))
+        factor_y = max(1, int(height / (target_height * reducing_gap)))
+        if factor_x > 1 or factor_y > 1:
+            width, height = math.ceil(width / factor_x), math.ceil(height / factor_y)
+            total += width * height * bytes_per_pixel
+    if (width, height) != target_size:
+        total += target_width * height * bytes_per_pixel
+    return total
+
+
+def estimate_peak_bytes(info: ImageInfo, mode: str, target, reducing_gap: Optional[float] = REDUCING_GAP,
+                        memory_budget: Optional[int] = None, formats: Optional[Iterable[str]] = None) -> int:
+    """只根据文件头中的尺寸、格式和颜色模式估算一个任务的峰值内存（字节），用于解码前的准入控制
+
+    包括像素数据和按文件大小搜索时保留的编码缓冲区；mode、target 和 formats 的含义同 resize_batch.ResizeJob；
+    设置 memory_budget 时引擎在预算内处理像素，像素部分不超过预算
+    """
+    width, height = info.dimensions
+    source_bpp = _mode_bytes(info.mode)
+
+    def decoded_size(request: Tuple[int, int]) -> Tuple[int, int]:
+        """draft_for() 之后实际解码的尺寸"""
+        if info.format != "JPEG" or not reducing_gap:
+            return info.dimensions
+        return _draft_size(info.dimensions, (math.ceil(request[0] * reducing_gap),
+                                             math.ceil(request[1] * reducing_gap)))
+
+    if mode == "dimension":
+        decoded = decoded_size(target)
+        peak = decoded[0] * decoded[1] * source_bpp + _resample_bytes(decoded, target, reducing_gap, source_bpp)
+    elif mode == "filesize":
+        # 解码图像、（需要时）合成透明背景的副本和透明通道，以及每个格式搜索中的缩放副本和缩放中间图像
+        # （目标宽×源高），调色板格式另有量化后的副本；搜索不放大，各项都不超过整图；
+        # 未设置预算时各格式并发搜索，各自的副本同时存在
+        choices = resolve_formats(formats, default_output_format(info.format))
+        per_search = 2 * BYTES_PER_PIXEL + any(choice.palette for choice in choices)
+        copies = source_bpp + per_search * (1 if memory_budget else len(choices))
+        if info.has_alpha or info.mode not in ("RGB", "L", "CMYK"):
+            copies += BYTES_PER_PIXEL + 1
+        peak = width * height * copies
+        if memory_budget:
+            peak = min(peak, memory_budget)
+        # 编码缓冲区：保留的最佳结果和当前候选约为输入文件大小；PNG 无损尝试同时保留每种过滤策略的结果
+        buffers = len(PNG_STRATEGIES) if any(choice.name == "PNG" for choice in choices) else 2
+        return int(peak * (1 + ESTIMATE_HEADROOM)) + buffers * info.size
+    elif mode == "renditions":
+        targets = [rendition.dimensions(info.dimensions) for rendition in target]
+        largest = max(targets, key=lambda size: size[0] * size[1])
+        decoded = decoded_size(largest)
+        # 已生成的各规格都保留到任务结束，中间图像只按最大规格计一次
+        peak = (decoded[0] * decoded[1] * source_bpp
+                + _resample_bytes(decoded, largest, reducing_gap, source_bpp)
+                + sum(w * h * BYTES_PER_PIXEL for w, h in targets) - largest[0] * largest[1] * BYTES_PER_PIXEL)
+    else:
+        raise Exception(f"未知的调整方式: {mode}")
+
+    peak = int(peak * (1 + ESTIMATE_HEADROOM))
+    return min(peak, memory_budget) if memory_budget else peak
+
+
+class Prediction(NamedTuple):
+    """由小代理图像预测的搜索起点"""
+    quality: int
+    scale: float
+    log_slope: float  # 起始质量附近 d(ln 大小)/d(质量)
+    scale_exponent: float  # 大小 ∝ 缩放比例^scale_exponent
+    encodes: int  # 预测使用的小图编码次数
+
+
+# 预测时用于拟合 质量→大小 曲线的采样质量；低质量段的曲线明显更陡，需要单独采样，否则外推到最低质量时大小会偏大约一倍
+PREDICT_QUALITIES = (1, 20, 50, 85)
+
+# 估计文件头开销和缩放指数时使用的采样质量
+PREDICT_REFERENCE_QUALITY = 50
+
+# 拼接图块的边长和每行/列块数（图块对齐到 JPEG 的 16 像素 MCU）
+PREDICT_TILE = 128
+PREDICT_GRID = 4
+
+# 估计 缩放→大小 关系时代理图像的最长边
+PREDICT_PROXY_SIDE = 512
+
+
+def _encoded_size(img: Image.Image, quality: int, buffer: io.BytesIO, format: str = "JPEG",
+                  options: Optional[dict] = None) -> int:
+    buffer.seek(0)
+    buffer.truncate()
+    img.save(buffer, format=format, quality=quality, **(options or {}))
+    return buffer.tell()
+
+
+def _tile_origins(size: Tuple[int, int], tile: int, grid: int) -> List[Tuple[int, int]]:
+    """均匀分布的 grid x grid 个图块的左上角坐标，按行排列"""
+    width, height = size
+    return [(int((width - tile) * (col + 0.5) / grid) // 16 * 16, int((height - tile) * (row + 0.5) / grid) // 16 * 16)
+            for row in range(grid) for col in range(grid)]
+
+
+def _tile_mosaic(img: Image.Image, tile: int = PREDICT_TILE, grid: int = PREDICT_GRID,
+                 factor: int = 1) -> Image.Image:
+    """从全分辨率图像中均匀采样 grid x grid 个边长为 tile 的图块并拼接，保留原始细节密度
+
+    factor 大于 1 时采样边长为 tile x factor 的图块，并以与输出相同的 resample 缩小到 tile，得到缩小 factor 倍后的细节密度
+    """
+    mosaic = Image.new(img.mode, (tile * grid, tile * grid))
+    side = tile * factor
+    for index, (x, y) in enumerate(_tile_origins(img.size, side, grid)):
+        crop = img.crop((x, y, x + side, y + side))
+        if factor > 1:
+            crop = resample(crop, (tile, tile), REDUCING_GAP)
+        mosaic.paste(crop, (index % grid * tile, index // grid * tile))
+    return mosaic
+
+
+def predict_samples(img: Image.Image, format: str = "JPEG",
+                    options: Optional[dict] = None) -> Optional[Tuple[List[Tuple[int, float]], float]]:
+    """编码采样图块拼图和缩小的代理图，返回全尺寸的 [(质量, ln 大小)] 和缩放指数，与目标大小无关
+
+    图像太小（全尺寸编码已足够便宜）时返回 None
+    """
+    pixels = img.width * img.height
+    mosaic_side = PREDICT_TILE * PREDICT_GRID
+    if pixels <= 4 * mosaic_side * mosaic_side or min(img.size) < PREDICT_TILE:
+        return None
+
+    buffer = io.BytesIO()
+    mosaic = _tile_mosaic(img)
+    # 文件头和量化表等固定开销，不随像素数增长
+    header = _encoded_size(mosaic.crop((0, 0, 16, 16)), PREDICT_REFERENCE_QUALITY, buffer, format, options)
+    pixel_ratio = pixels / (mosaic_side * mosaic_side)
+    curve = [
+        (quality, math.log(max(1.0, (_encoded_size(mosaic, quality, buffer, format, options) - header) * pixel_ratio
+                               + header)))
+        for quality in PREDICT_QUALITIES
+    ]
+
+    # 代理图与全尺寸在同一质量下的大小之比给出缩放指数；整数倍 reduce() 足够快且近似最终的缩放效果
+    proxy = img.reduce(max(2, max(img.size) // PREDICT_PROXY_SIDE))
+    proxy_scale = proxy.width / img.width
+    proxy_size = _encoded_size(proxy, PREDICT_REFERENCE_QUALITY, buffer, format, options)
+    full_log_size = dict(curve)[PREDICT_REFERENCE_QUALITY]
+    scale_exponent = (full_log_size - math.log(proxy_size)) / math.log(1 / proxy_scale)
+    return curve, max(1.0, min(scale_exponent, 2.0))
+
+
+def predict_start(img: Image.Image, target_size_bytes: int,
+                  min_quality: int = QualitySolver.min_quality,
+                  max_quality: int = QualitySolver.max_quality, format: str = "JPEG",
+                  options: Optional[dict] = None,
+                  samples: Optional[Tuple[List[Tuple[int, float]], float]] = None) -> Optional[Prediction]:
+    """预测全尺寸的 质量→大小 与 缩放→大小 关系并给出搜索起点
+
+    samples 为 predict_samples(img) 的结果，未给出时在 img 上采样；图像太小（全尺寸编码已足够便宜）时返回 None
+    """
+    samples = samples or predict_samples(img, format, options)
+    if samples is None:
+        return None
+    curve, scale_exponent = samples
+
+    # 目标所在（超出采样范围时外推）的对数线性分段
+    target_log = math.log(target_size_bytes)
+    segments = list(zip(curve, curve[1:]))
+    (q1, l1), (q2, l2) = next((seg for seg in segments if target_log <= seg[1][1]), segments[-1])
+    log_slope = max((l2 - l1) / (q2 - q1), 1e-3)
+    quality = max(min_quality, min(round(q1 + (target_log - l1) / log_slope), max_quality))
+
+    # 最低质量仍然偏大时，仅调整质量无法达到目标，直接从预测的缩放比例开始
+    log_size = l1 + log_slope * (quality - q1)
+    scale = 1.0
+    if quality == min_quality and log_size > target_log:
+        scale = math.exp((target_log - log_size) / scale_exponent)
+
+    return Prediction(quality, scale, log_slope, scale_exponent, len(PREDICT_QUALITIES) + 2)
+
+
+# 感知画质评分：在参考图像上均匀采样 SSIM_GRID x SSIM_GRID 个边长为 SSIM_TILE 的全分辨率图块，
+# 以 SSIM_BLOCK x SSIM_BLOCK 的不重叠窗口计算亮度 SSIM
+SSIM_TILE = 128
+SSIM_GRID = 4
+SSIM_BLOCK = 8
+
+# SSIM 的稳定常数 (0.01 x 255)² 和 (0.03 x 255)²
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def _luma(img: Image.Image) -> Image.Image:
+    """合成白色背景后的亮度通道（L 模式）"""
+    img = flatten_alpha(img)
+    if img.mode == "CMYK":
+        img = img.convert("RGB")
+    return img if img.mode == "L" else img.convert("L")
+
+
+def _block_moments(luma: Image.Image) -> Tuple[Image.Image, Image.Image, Image.Image]:
+    """返回 (F 模式亮度, 各窗口均值, 各窗口方差)；整数倍 reduce() 在 C 中逐块求平均"""
+    from PIL import ImageMath
+
+    values = luma.convert("F")
+    mean = values.reduce(SSIM_BLOCK)
+    square_mean = ImageMath.lambda_eval(lambda a: a["x"] * a["x"], x=values).reduce(SSIM_BLOCK)
+    variance = ImageMath.lambda_eval(lambda a: a["s"] - a["m"] * a["m"], s=square_mean, m=mean)
+    return values, mean, variance
+
+
+class SimilarityScorer:
+    """按亮度 SSIM 评估候选编码相对参考图像的画质，1 表示完全相同
+
+    比较的是全分辨率图块而不是整体缩小的图像，缩小尺寸损失的细节仍能体现在得分中：
+    候选图像按比例放大回参考分辨率后截取相同位置的图块。参考图块的亮度及其窗口均值、方差只计算一次，
+    每个候选 (质量, 缩放比例) 的得分缓存在 scores 中
+    """
+
+    def __init__(self, reference: Image.Image):
+        self.size = reference.size
+        # 小图缩小图块，不足一个窗口时不评分（所有候选得分相同）
+        self.tile = min(SSIM_TILE, min(reference.size) // SSIM_GRID // SSIM_BLOCK * SSIM_BLOCK)
+        self.origins = _tile_origins(reference.size, self.tile, SSIM_GRID) if self.tile else []
+        self.scores: Dict[Tuple[int, float], float] = {}
+        if self.tile:
+            self.luma, self.mean, self.variance = _block_moments(self._mosaic(_luma(reference)))
+
+    def _mosaic(self, luma: Image.Image) -> Image.Image:
+        """截取参考图像坐标中各图块对应的区域并拼接；尺寸与参考图像不同时按比例缩放回图块大小"""
+        tile = self.tile
+        scale_x, scale_y = luma.width / self.size[0], luma.height / self.size[1]
+        mosaic = Image.new("L", (tile * SSIM_GRID, tile * SSIM_GRID))
+        for index, (x, y) in enumerate(self.origins):
+            if luma.size == self.size:
+                patch = luma.crop((x, y, x + tile, y + tile))
+            else:
+                patch = luma.resize((tile, tile), resample=Image.Resampling.BICUBIC,
+                                    box=(x * scale_x, y * scale_y, (x + tile) * scale_x, (y + tile) * scale_y))
+            mosaic.paste(patch, (index % SSIM_GRID * tile, index // SSIM_GRID * tile))
+        return mosaic
+
+    def score(self, key: Tuple[int, float], decode: Callable[[], Image.Image]) -> float:
+        """候选 key 的得分；未缓存时才调用 decode() 取得解码后的候选图像"""
+        if key not in self.scores:
+            self.scores[key] = self.similarity(decode()) if self.tile else 1.0
+        return self.scores[key]
+
+    def similarity(self, img: Image.Image) -> float:
+        """img（任意尺寸）与参考图像的平均 SSIM"""
+        from PIL import ImageMath
+
+        values, mean, variance = _block_moments(self._mosaic(_luma(img)))
+        product_mean = ImageMath.lambda_eval(lambda a: a["x"] * a["y"], x=self.luma, y=values).reduce(SSIM_BLOCK)
+        ssim = ImageMath.lambda_eval(
+            lambda a: (2 * a["mx"] * a["my"] + SSIM_C1) * (2 * (a["p"] - a["mx"] * a["my"]) + SSIM_C2)
+            / ((a["mx"] * a["mx"] + a["my"] * a["my"] + SSIM_C1) * (a["vx"] + a["vy"] + SSIM_C2)),
+            mx=self.mean, my=mean, p=product_mean, vx=self.variance, vy=variance)
+        return ssim.reduce(ssim.size).getpixel((0, 0))
+
+
+# 感知画质模式下在搜索得到的尺寸之外再比较的更小尺寸数，及相邻尺寸之间的缩放比例
+PERCEPTUAL_STEPS = 2
+PERCEPTUAL_STEP_SCALE = 0.8
+
+
+# 仅调整质量无法达到目标时，最多尝试的缩放次数
+MAX_SCALE_STEPS = 3
+
+# 缩放后的最小边长
+MIN_DIMENSION = 100
+
+
+def scaled_dimensions(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    """按比例缩放尺寸，每边不小于 MIN_DIMENSION"""
+    width, height = size
+    return (max(MIN_DIMENSION, int(width * scale)), max(MIN_DIMENSION, int(height * scale)))
+
+
+class OutputFormat(NamedTuple):
+    """按文件大小调整时的输出格式；调色板格式（PNG/GIF）的质量为颜色数"""
+    name: str  # Pillow 格式名
+    extension: str
+    min_quality: int
+    max_quality: int
+    initial_quality: int
+    keeps_alpha: bool
+    feature: Optional[str] = None  # Pillow 中需要检查的可选编码器
+    options: Optional[dict] = None  # 其他编码参数
+    palette: bool = False  # 按颜色数搜索
+
+
+OUTPUT_FORMATS = {
+    "JPEG": OutputFormat("JPEG", ".jpg", 1, 95, 80, False),
+    "WEBP": OutputFormat("WEBP", ".webp", 1, 100, 80, True, "webp"),
+    # 默认编码速度下单次 AVIF 编码比 JPEG 慢约百倍，搜索时使用较快的速度档
+    "AVIF": OutputFormat("AVIF", ".avif", 1, 100, 70, True, "avif", {"speed": 8}),
+    # 图形类图像的调色板大小在十几色以上时对文件大小影响很小，颜色再少则画质骤降，此时改为缩小尺寸
+    "PNG": OutputFormat("PNG", ".png", 16, 256, 256, True, palette=True),
+    "GIF": OutputFormat("GIF", ".gif", 16, 256, 256, True, options={"optimize": True}, palette=True),
+}
+
+# PNG 试编码时并发尝试的 zlib 压缩策略：默认和 RLE（纯色区域多的图形上接近默认策略，编码快得多）；
+# FILTERED、HUFFMAN_ONLY、FIXED 在照片和图形上都很少更小
+PNG_STRATEGIES = (0, 3)
+
+# 搜索时 PNG 的 zlib 压缩级别；最终输出以 PNG_FINAL_LEVEL 重新编码一次，只会更小
+PNG_SEARCH_LEVEL = 6
+PNG_FINAL_LEVEL = 9
+# PNG_FINAL_LEVEL 的无损编码最多比 PNG_SEARCH_LEVEL 小约这么多倍，搜索级别的无损结果在此范围内超出目标时再以最终级别确认
+PNG_FINAL_GAIN = 1.1
+# 缩小尺寸编码无损 PNG 时用于估计 缩放→大小 指数的代理尺寸比例
+PNG_PROXY_SCALE = 0.25
+
+
+def available_formats() -> List[str]:
+    """当前 Pillow 可编码的输出格式名"""
+    from PIL import features
+
+    return [name for name, output_format in OUTPUT_FORMATS.items()
+            if output_format.feature is None or features.check(output_format.feature)]
+
+
+def default_output_format(format: Optional[str]) -> OutputFormat:
+    """Pillow 格式名对应的默认输出格式：可搜索的格式保留，BMP 为 PNG，其他为 JPEG"""
+    if format in OUTPUT_FORMATS:
+        return OUTPUT_FORMATS[format]
+    return OUTPUT_FORMATS["PNG" if format == "BMP" else "JPEG"]
+
+
+def output_format_for(path: str) -> OutputFormat:
+    """按扩展名确定的默认输出格式：BMP 为 PNG，其他不在 OUTPUT_EXTENSIONS 中的扩展名为 JPEG"""
+    return default_output_format(codec_for_path(path))
+
+
+def with_format_extension(path: str, output_format: OutputFormat) -> str:
+    """扩展名与输出格式不符时替换为该格式的扩展名（.jpeg 等同义扩展名保留）"""
+    root, ext = os.path.splitext(path)
+    if OUTPUT_EXTENSIONS.get(ext.lower()) == output_format.name:
+        return path
+    return root + output_format.extension
+
+
+def has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def prepare_for_format(img: Image.Image, output_format: OutputFormat) -> Image.Image:
+    """转换为输出格式可编码的颜色模式；不支持透明通道的格式合成白色背景"""
+    if not output_format.keeps_alpha:
+        return flatten_alpha(img)
+    mode = "RGBA" if has_alpha(img) else "RGB"
+    return img if img.mode == mode else img.convert(mode)
+
+
+class FormatCandidate(NamedTuple):
+    """单个输出格式的搜索结果，编码保留在 probe 中"""
+    format: OutputFormat
+    probe: EncodeProbe
+    quality: int
+    dimensions: Tuple[int, int]
+    size: int
+    in_tolerance: bool
+    lossless: bool = False  # 未量化的无损编码
+    similarity: Optional[float] = None  # 感知画质模式下的亮度 SSIM
+
+    @property
+    def quality_fraction(self) -> float:
+        """质量在该格式质量范围内的相对位置（0~1，无损为 1），不同格式之间只能粗略比较"""
+        if self.lossless:
+            return 1.0
+        low, high = self.format.min_quality, self.format.max_quality
+        return (self.quality - low) / (high - low)
+
+    def describe(self) -> str:
+        quality = "无损" if self.lossless else f"质量 {self.quality}{'色' if self.format.palette else ''}"
+        similarity = f" SSIM {self.similarity:.3f}" if self.similarity is not None else ""
+        return (f"{self.format.name} {self.dimensions[0]}x{self.dimensions[1]}px {quality} "
+                f"{format_size(self.size)}{similarity}")
+
+
+def _png_trials(img: Image.Image, executor, colors: Optional[int] = None) -> List[Tuple[int, int, io.BytesIO]]:
+    """以各 zlib 策略并发编码 PNG（给出 colors 时先量化），返回按大小排序的 [(字节数, 策略, 缓冲区)]"""
+    source = quantize(img, colors) if colors else img
+    source.load()
+    trials = executor.map(lambda strategy: _png_encode(_shared_view(source), strategy), PNG_STRATEGIES)
+    return sorted(trials, key=lambda trial: trial[:2])
+
+
+def _png_encode(img: Image.Image, strategy: int, level: int = PNG_SEARCH_LEVEL) -> Tuple[int, int, io.BytesIO]:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=level, compress_type=strategy)
+    return buffer.tell(), strategy, buffer
+
+
+def _png_lossless_scaled(img: Image.Image, strategy: int, lossless_size: int, target_size_bytes: int,
+                         tolerance: float, reducing_gap: Optional[float], cancel, stats: Optional[JobStats],
+                         max_scale: float = 1.0, working: Optional[Image.Image] = None,
+                         memo: Optional[FormatMemo] = None) -> Optional[FormatCandidate]:
+    """按 大小∝缩放比例^指数 缩小尺寸编码无损 PNG（PNG_FINAL_LEVEL），最多 MAX_SCALE_STEPS 次
+
+    先编码 PNG_PROXY_SCALE 的代理尺寸；每步从最接近目标的测量点出发，指数由最接近目标的两个点拟合（限制在 1~3，
+    只有一个点时取 2）；lossless_size 为原尺寸无损编码的大小，只在没有代理尺寸时作为起点。
+    返回不超出目标上限的结果中最大的一个，都超出时返回 None；
+    给出 memo 时已测量过的尺寸直接取 memo.png_scaled 中的大小，只有采用的尺寸需要（未保留时）重新编码，
+    缩放路径与不使用 memo 时相同
+    """
+    sizes = memo.png_scaled if memo is not None else {}
+    min_acceptable, max_acceptable = target_size_bytes * (1 - tolerance), target_size_bytes * (1 + tolerance)
+    best, encodes, scaled = None, 0, None
+
+    def encode(dimensions: Tuple[int, int]) -> io.BytesIO:
+        nonlocal encodes, scaled
+        check_cancelled(cancel)
+        scaled = None  # 先释放上一份缩放副本
+        with stage(stats, "resize"):
+            scaled = resample(img, dimensions, reducing_gap)
+        if stats is not None:
+            stats.track(working, img, scaled)
+        with stage(stats, "encode"):
+            sizes[dimensions], _, buffer = _png_encode(scaled, strategy, PNG_FINAL_LEVEL)
+        encodes += 1
+        return buffer
+
+    # 本次搜索路径上测得的 (缩放比例, 大小)
+    points = [(1.0, lossless_size)]
+    proxy = scaled_dimensions(img.size, PNG_PROXY_SCALE)
+    if proxy[0] < img.width:
+        if proxy not in sizes:
+            encode(proxy)
+        points = [(proxy[0] / img.width, sizes[proxy])]
+
+    for _ in range(MAX_SCALE_STEPS):
+        if best is not None and best[0] >= min_acceptable:
+            break
+        nearest = sorted(points, key=lambda point: abs(math.log(point[1] / target_size_bytes)))
+        exponent = 2.0
+        if len(nearest) > 1 and nearest[0][0] != nearest[1][0] and nearest[0][1] != nearest[1][1]:
+            exponent = math.log(nearest[0][1] / nearest[1][1]) / math.log(nearest[0][0] / nearest[1][0])
+            exponent = max(1.0, min(exponent, 3.0))
+        scale, size = nearest[0]
+        scale_factor = min(max_scale, scale * (target_size_bytes / size) ** (1 / exponent))
+        dimensions = scaled_dimensions(img.size, scale_factor)
+        scale_factor = dimensions[0] / img.width
+        if any(scale_factor == s for s, _ in points):
+            break
+        buffer = None if dimensions in sizes else encode(dimensions)
+        size = sizes[dimensions]
+        points.append((scale_factor, size))
+        if size <= max_acceptable and (best is None or size > best[0]):
+            best = (size, dimensions, scale_factor, buffer)
+    if best is None:
+        return None
+    size, dimensions, scale, buffer = best
+    if buffer is None:
+        if memo is not None and memo.kept is not None and memo.kept[0] == ("lossless", scale):
+            buffer = memo.kept_buffer()
+        else:
+            buffer = encode(dimensions)
+    probe = EncodeProbe("PNG")
+    probe.keep(("lossless", scale), buffer)
+    probe.encodes = encodes
+    output_format = OUTPUT_FORMATS["PNG"]
+    return FormatCandidate(output_format, probe, output_format.max_quality, dimensions, size,
+                           size >= target_size_bytes * (1 - tolerance), lossless=True)
+
+
+def _warm_quality(curve: Dict[Tuple[int, float], int], scale: float, target_size_bytes: int,
+                  scale_exponent: float) -> Optional[int]:
+    """由上次搜索的曲线选择起始质量：取缩放比例最接近 scale 的测量点，按 大小∝缩放比例^scale_exponent 换算到 scale 后
+    最接近目标的质量；曲线为空时返回 None"""
+    if not curve:
+        return None
+    nearest = min({s for _, s in curve}, key=lambda s: abs(math.log(s / scale)))
+    factor = (scale / nearest) ** scale_exponent
+    points = [(quality, size * factor) for (quality, s), size in curve.items() if s == nearest]
+    return min(points, key=lambda point: abs(math.log(point[1] / target_size_bytes)))[0]
+
+
+def _search_format(img: Image.Image, output_format: OutputFormat, target_size_bytes: int, tolerance: float,
+                   predict: bool, reducing_gap: Optional[float], progress, cancel, executor, parallel: int,
+                   stats: Optional[JobStats], max_scale: float = 1.0,
+                   memo: Optional[FormatMemo] = None, perceptual: bool = False,
+                   final_ratio: Optional[float] = None, working: Optional[Image.Image] = None) -> FormatCandidate:
+    """在一个输出格式内搜索质量，质量不够时按预测的缩放指数缩小后继续搜索
+
+    缩放比例不超过 max_scale（相对 img，默认 1 即不放大），原尺寸下最高质量仍小于目标时返回该低于目标的结果；
+    PNG 先并发尝试各压缩策略的无损编码，不超过目标上限则直接采用（低于容差下限时也不再放大）；
+    256 色原尺寸已低于容差下限时改为缩小尺寸编码无损 PNG（_png_lossless_scaled），都超出目标上限时仍搜索颜色数；
+    否则以 256 色下最小的策略按颜色数搜索；搜索使用 PNG_SEARCH_LEVEL，目标按 256 色时两个压缩级别的大小比例换算
+    （final_ratio 给出时使用该比例），最后在最终尺寸上以 PNG_FINAL_LEVEL 重新搜索颜色数；换算后仍超出目标时按比例 1 重新搜索；
+    给出 memo 时复用并更新上次在同一图像上的测量结果：缩放比例的选择与不使用 memo 时相同（输出尺寸一致），
+    已测量的点不再编码，并由曲线选择各尺寸的起始质量；
+    perceptual 为 True 时再按 PERCEPTUAL_STEP_SCALE 逐级缩小尺寸搜索质量，不超出目标上限的候选中取亮度 SSIM 最高者；
+    working 为转换颜色模式前的工作图像（与 img 同时存在），只用于统计峰值内存；
+    每次缩放前先释放上一份缩放副本，同时存在的只有 working、img 和一份缩放副本
+    """
+    seed = None
+    final_target = target_size_bytes
+    if output_format.name == "PNG":
+        encodes = 0
+        with stage(stats, "encode"), ThreadPoolExecutor(max_workers=len(PNG_STRATEGIES)) as trial_executor:
+            check_cancelled(cancel)
+            if memo is not None and memo.png_lossless is not None:
+                (size, strategy), buffer = memo.png_lossless, None
+            else:
+                size, strategy, buffer = _png_trials(img, trial_executor)[0]
+                encodes += len(PNG_STRATEGIES)
+                if memo is not None:
+                    memo.png_lossless = (size, strategy)
+            lossless = None
+            if memo is not None and memo.kept is not None and memo.kept[0] == ("lossless", 1.0):
+                buffer = memo.kept_buffer()
+                lossless = (buffer.tell(), strategy, buffer)
+            elif size <= target_size_bytes * (1 + tolerance) * PNG_FINAL_GAIN:
+                lossless = _png_encode(img, strategy, PNG_FINAL_LEVEL)
+                encodes += 1
+            if lossless is not None and lossless[0] <= target_size_bytes * (1 + tolerance):
+                size, strategy, buffer = lossless
+                probe = EncodeProbe("PNG")
+                probe.keep(("lossless", 1.0), buffer)
+                probe.encodes = encodes
+                if memo is not None:
+                    memo.remember(probe)
+                return FormatCandidate(output_format, probe, output_format.max_quality, img.size, size,
+                                       size >= target_size_bytes * (1 - tolerance), lossless=True,
+                                       similarity=1.0 if perceptual else None)
+            check_cancelled(cancel)
+            if memo is not None and memo.png_seed is not None:
+                seed, measured_ratio = memo.png_seed[:2] + (None,), memo.png_seed[2]
+            else:
+                paletted = quantize(img, output_format.max_quality)
+                seed = _png_trials(paletted, trial_executor)[0]
+                measured_ratio = _png_encode(paletted, seed[1], PNG_FINAL_LEVEL)[0] / seed[0]
+                encodes += len(PNG_STRATEGIES) + 1
+                if memo is not None:
+                    memo.png_seed = seed[:2] + (measured_ratio,)
+        if seed[0] * measured_ratio < final_target * (1 - tolerance):
+            # 256 色原尺寸已低于容差下限而无损超出上限：颜色数无法补足大小，改为缩小尺寸编码无损 PNG
+            scaled = _png_lossless_scaled(img, strategy, lossless[0] if lossless else size, final_target, tolerance,
+                                          reducing_gap, cancel, stats, max_scale, working, memo)
+            if scaled is not None:
+                scaled.probe.encodes += encodes
+                if memo is not None:
+                    memo.remember(scaled.probe)
+                return scaled._replace(similarity=1.0 if perceptual else None)
+        # 最终编码的大小约为搜索级别的固定比例（图形类图像约 0.75），按该比例换算搜索目标
+        final_ratio = final_ratio or measured_ratio
+        target_size_bytes = round(target_size_bytes / final_ratio)
+        options = {"compress_level": PNG_SEARCH_LEVEL, "compress_type": seed[1]}
+        probe = PaletteProbe("PNG", options)
+        probe.encodes = encodes
+    elif output_format.palette:
+        probe = PaletteProbe(output_format.name, output_format.options)
+    else:
+        probe = EncodeProbe(output_format.name, output_format.options)
+    # 在内存中试编码并缓存 质量→大小 曲线，最终结果直接写入输出文件
+    solver = QualitySolver(probe, progress=progress, cancel=cancel, executor=executor, parallel=parallel,
+                           quality_range=(output_format.min_quality, output_format.max_quality),
+                           initial_quality=output_format.initial_quality)
+    if memo is not None:
+        solver.curve = memo.curve
+        if memo.kept is not None and output_format.name != "PNG":
+            # 最佳点与上次相同时无需补编码（PNG 保留的是最终级别的编码，在最终搜索时使用）
+            probe.keep(memo.kept[0], memo.kept_buffer())
+    if seed is not None:
+        # 256 色的试编码结果直接作为搜索的第一个测量点
+        solver._record(output_format.max_quality, 1.0, seed[0])
+        if seed[2] is not None:
+            probe.keep((output_format.max_quality, 1.0), seed[2])
+    current_width = img.width
+
+    def resized(size: Tuple[int, int]) -> Image.Image:
+        if memo is not None and memo.resized is not None and memo.resized.size == size:
+            return memo.resized
+        if memo is not None:
+            memo.resized = None
+        with stage(stats, "resize"):
+            scaled = resample(img, size, reducing_gap)
+        if memo is not None:
+            memo.resized = scaled
+        return scaled
+
+    # 由小代理图预测起始质量和缩放比例，预测失败或关闭时从默认质量开始；调色板格式的颜色数不做预测。
+    # 给出 memo 时缩放比例的选择与不使用 memo 时相同（输出尺寸一致），曲线只用于跳过已测量的点和选择起始质量
+    with stage(stats, "predict"):
+        prediction = None
+        if predict and not output_format.palette:
+            if memo is None or memo.samples is None:
+                samples = predict_samples(img, output_format.name, output_format.options)
+                if memo is not None:
+                    memo.samples = (samples,)
+            else:
+                samples = memo.samples[0]
+            if samples is not None:
+                prediction = predict_start(img, target_size_bytes, output_format.min_quality,
+                                           output_format.max_quality, output_format.name, output_format.options,
+                                           samples)
+    scale_exponent = prediction.scale_exponent if prediction else 2.0
+    if prediction and prediction.scale < 1:
+        work_img = resized(scaled_dimensions(img.size, prediction.scale))
+        scale = work_img.width / current_width
+    else:
+        work_img, scale = img, 1.0
+    if stats is not None:
+        stats.track(working, img, work_img)
+
+    # 先尝试只调整质量
+    with stage(stats, "encode"):
+        result = solver.solve(work_img, target_size_bytes, tolerance, scale,
+                              initial_quality=_warm_quality(solver.curve, scale, target_size_bytes, scale_exponent)
+                              or (prediction.quality if prediction else None),
+                              log_slope=prediction.log_slope if prediction else None)
+    dimensions = work_img.size
+
+    # 如果仅调整质量不够，按 大小∝缩放比例^指数 估计缩放比例，并从上次的质量开始继续搜索
+    for _ in range(MAX_SCALE_STEPS):
+        if result.in_tolerance:
+            break
+
+        scale_factor = min(max_scale, result.scale * (target_size_bytes / result.size) ** (1 / scale_exponent))
+        new_width, new_height = scaled_dimensions(img.size, scale_factor)
+        scale_factor = new_width / current_width
+        if scale_factor == result.scale:
+            break
+
+        check_cancelled(cancel)
+        work_img = resized_img = None
+        resized_img = resized((new_width, new_height))
+        if stats is not None:
+            stats.track(working, img, resized_img)
+        with stage(stats, "encode"):
+            result = solver.solve(resized_img, target_size_bytes, tolerance, scale_factor,
+                                  initial_quality=_warm_quality(solver.curve, scale_factor, target_size_bytes,
+                                                                scale_exponent) or result.quality,
+                                  log_slope=prediction.log_slope if prediction else None)
+        dimensions = resized_img.size
+
+    similarity = None
+    if perceptual and result.size <= target_size_bytes * (1 + tolerance):
+        # 同一尺寸下质量越高画质越好，每个尺寸只需比较搜索得到的质量；更小的尺寸可换取更高的质量
+        if memo is not None and memo.scorer is not None:
+            scorer = memo.scorer
+        else:
+            with stage(stats, "score"):
+                scorer = SimilarityScorer(img)
+            if memo is not None:
+                memo.scorer = scorer
+        with stage(stats, "score"):
+            similarity = scorer.score((result.quality, result.scale), probe.decode)
+        best = (similarity, result, dimensions, probe.snapshot())
+        scale_factor = result.scale
+        for _ in range(PERCEPTUAL_STEPS):
+            new_size = scaled_dimensions(img.size, scale_factor * PERCEPTUAL_STEP_SCALE)
+            if new_size[0] / current_width == scale_factor:
+                break  # 已到最小边长
+            scale_factor = new_size[0] / current_width
+
+            check_cancelled(cancel)
+            work_img = resized_img = None
+            resized_img = resized(new_size)
+            if stats is not None:
+                stats.track(working, img, resized_img)
+            with stage(stats, "encode"):
+                candidate = solver.solve(resized_img, target_size_bytes, tolerance, scale_factor,
+                                         initial_quality=best[1].quality,
+                                         log_slope=prediction.log_slope if prediction else None)
+            if candidate.size > target_size_bytes * (1 + tolerance):
+                continue
+            with stage(stats, "score"):
+                score = scorer.score((candidate.quality, candidate.scale), probe.decode)
+            if score > best[0]:
+                best = (score, candidate, resized_img.size, probe.snapshot())
+
+        similarity, result, dimensions, buffer = best
+        if probe.key != (result.quality, result.scale):
+            probe.keep((result.quality, result.scale), buffer)
+
+    if output_format.name == "PNG":
+        # 以 PNG_FINAL_LEVEL 重新编码只会更小：在最终尺寸上从搜索得到的颜色数开始重新搜索颜色数，补回变小的部分
+        # 给出 memo 时复用最终级别的 颜色数→大小 曲线，只有采用的点（不是上次保留的编码时）需要重新编码
+        check_cancelled(cancel)
+        probe.options["compress_level"] = PNG_FINAL_LEVEL
+        probe.key = None  # 保留的是搜索级别的编码
+        final_solver = QualitySolver(probe, progress=progress, cancel=cancel,
+                                     quality_range=(output_format.min_quality, output_format.max_quality),
+                                     initial_quality=result.quality)
+        if memo is not None:
+            final_solver.curve = memo.final_curve
+            if memo.kept is not None:
+                probe.keep(memo.kept[0], memo.kept_buffer())
+        with stage(stats, "encode"):
+            result = final_solver.solve(img if dimensions == img.size else resized(dimensions), final_target,
+                                        tolerance, result.scale, initial_quality=result.quality)
+        if result.size > final_target * (1 + tolerance) and final_ratio < 1:
+            # 该尺寸下的大小比例不如 256 色原图：按搜索级别的大小（只会偏大）重新搜索
+            retry = _search_format(img, output_format, final_target, tolerance, predict, reducing_gap, progress,
+                                   cancel, executor, parallel, stats, max_scale, memo, perceptual, final_ratio=1.0)
+            retry.probe.encodes += probe.encodes
+            return retry
+
+    if memo is not None:
+        memo.remember(probe)
+    return FormatCandidate(output_format, probe, result.quality, dimensions, result.size, result.in_tolerance,
+                           similarity=similarity)
+
+
+def choose_format(candidates: List[FormatCandidate], target_size_bytes: int, tolerance: float,
+                  source_alpha: bool = False,
+                  reference: Optional[Image.Image] = None) -> Tuple[FormatCandidate, str]:
+    """在不超出目标上限的候选中选择格式并说明原因
+
+    依次比较：能否保留透明通道（源图像有透明通道时）、像素数、亮度 SSIM、文件大小（越小越好）。
+    各格式的质量参数含义不同，不直接比较：像素数相同的候选有多个时，以 reference（搜索用的工作图像）
+    计算这些候选的 SSIM（无损编码为 1），返回的候选带有该得分；未给出 reference 时像素数之后只比较文件大小。
+    候选都有感知画质得分时，透明通道之后只比较 SSIM 和文件大小；没有候选达到目标时选文件最小的格式
+    """
+    max_acceptable = target_size_bytes * (1 + tolerance)
+    fitting = [c for c in candidates if c.size <= max_acceptable]
+    if not fitting:
+        winner = min(candidates, key=lambda c: c.size)
+        why = "所有格式均超出目标大小，选择文件最小的格式"
+    else:
+        if all(c.similarity is not None for c in fitting):
+            def rank(c):
+                return (c.format.keeps_alpha or not source_alpha, c.similarity, -c.size)
+
+            reasons = ("保留透明通道", "亮度 SSIM 最高", "画质相同时文件最小")
+        else:
+            def rank(c):
+                return (c.format.keeps_alpha or not source_alpha, c.dimensions[0] * c.dimensions[1],
+                        -1.0 if c.similarity is None else c.similarity, -c.size)
+
+            reasons = ("保留透明通道", "达到目标大小时保留的像素最多", "像素相同时亮度 SSIM 最高",
+                       "像素和画质相同时文件最小")
+            best = max(rank(c)[:2] for c in fitting)
+            tied = [c for c in fitting if rank(c)[:2] == best]
+            if len(tied) > 1 and reference is not None:
+                scorer = SimilarityScorer(reference)
+                scored = {id(c): c._replace(similarity=1.0 if c.lossless else scorer.similarity(c.probe.decode()))
+                          for c in tied}
+                candidates = [scored.get(id(c), c) for c in candidates]
+                fitting = [scored.get(id(c), c) for c in fitting]
+
+        ranked = sorted(fitting, key=rank, reverse=True)
+        winner = ranked[0]
+        if len(ranked) == 1:
+            why = "唯一达到目标大小的格式"
+        else:
+            # 原因取与第二名第一个不同的比较项
+            why = reasons[-1]
+            for reason, ours, theirs in zip(reasons, rank(winner), rank(ranked[1])):
+                if ours != theirs:
+                    why = reason
+                    break
+
+    others = "；".join(c.describe() + ("" if c.size <= max_acceptable else "（超出目标）")
+                      for c in candidates if c is not winner)
+    return winner, f"{winner.describe()}，{why}" + (f"。其他: {others}" if others else "")
+
+
+def resolve_formats(formats: Optional[Iterable[str]], default: OutputFormat) -> List[OutputFormat]:
+    """校验并去重 formats 中的格式名，未给出时只有 default"""
+    if not formats:
+        return [default]
+    names = dict.fromkeys(name.upper() for name in formats)
+    unknown = [name for name in names if name not in available_formats()]
+    if unknown:
+        raise Exception(f"不支持的输出格式: {', '.join(unknown)}（可用: {', '.join(available_formats())}）")
+    return [OUTPUT_FORMATS[name] for name in names]
+
+
+# 量化为 256 色后的均方根误差不超过该值时视为量化几乎无损（图形类图像），照片约为 4
+PALETTE_RMS_LIMIT = 2.0
+
+# 估算 JPEG 在原尺寸下可接受的最小大小时使用的质量（较低但仍可接受）
+FORMAT_PROBE_JPEG_QUALITY = 25
+
+
+def _estimated_scale(encoded_size: int, sample: Image.Image, dimensions: Tuple[int, int],
+                     max_acceptable: float) -> float:
+    """按采样图编码后每像素的字节数，估算 dimensions 尺寸的图像编码后不超过 max_acceptable 的缩放比例（不大于 1）"""
+    density = encoded_size / (sample.width * sample.height)
+    return min(1.0, math.sqrt(max_acceptable / (density * dimensions[0] * dimensions[1])))
+
+
+def filesize_output_format(img: Image.Image, default: OutputFormat, target_size_bytes: int, tolerance: float,
+                           dimensions: Optional[Tuple[int, int]] = None) -> OutputFormat:
+    """未指定输出格式时按文件大小调整使用的格式
+
+    default 为 PNG 且图像不透明时，试编码全分辨率图块拼图（_tile_mosaic，压缩率与原图接近），估算原尺寸下
+    PNG 256 色和无损的大小，以及 JPEG 可达到的大小范围 [质量 FORMAT_PROBE_JPEG_QUALITY, 最高质量]，依次：
+    无损 PNG 不超出目标上限、且 JPEG 最高质量也达不到容差下限时保留 PNG（目标大于两者可达的大小，取无损）；
+    只有一种格式能在容差区间内时选该格式，都能时量化几乎无损（PALETTE_RMS_LIMIT）保留 PNG，否则选 JPEG；
+    都不相交时 JPEG 原尺寸最高质量小于目标则选 JPEG，否则（都需要缩小）选估算缩放比例更大的格式。
+    img 可以是缩小后的图像，dimensions 为实际搜索的图像尺寸，默认为 img 的尺寸
+    """
+    from PIL import ImageChops, ImageStat
+
+    if default.name != "PNG" or has_alpha(img):
+        return default
+    dimensions = dimensions or img.size
+    img = prepare_for_format(img, default).convert("RGB")
+    mosaic_side = PREDICT_TILE * PREDICT_GRID
+    sample = _tile_mosaic(img) if min(img.size) >= mosaic_side else img
+    pixel_ratio = dimensions[0] * dimensions[1] / (sample.width * sample.height)
+    paletted = quantize(sample, default.max_quality)
+    jpeg = EncodeProbe("JPEG")
+    png_sizes = (_png_encode(paletted, 0, PNG_FINAL_LEVEL)[0] * pixel_ratio,
+                 _png_encode(sample, 0, PNG_FINAL_LEVEL)[0] * pixel_ratio)
+    jpeg_range = (jpeg.measure(sample, FORMAT_PROBE_JPEG_QUALITY) * pixel_ratio,
+                  jpeg.measure(sample, OUTPUT_FORMATS["JPEG"].max_quality) * pixel_ratio)
+
+    low, high = target_size_bytes * (1 - tolerance), target_size_bytes * (1 + tolerance)
+    if png_sizes[1] <= high and jpeg_range[1] < low:
+        return default
+    # PNG 在原尺寸下只有调色板的大小（不超过 256 色）和无损一个点，两者之间没有可选的大小
+    png_hits = any(low <= size <= high for size in png_sizes)
+    jpeg_hits = jpeg_range[0] <= high and jpeg_range[1] >= low
+    if png_hits and jpeg_hits:
+        difference = ImageStat.Stat(ImageChops.difference(sample, paletted.convert("RGB")))
+        near_lossless = math.sqrt(sum(difference.sum2) / (sample.width * sample.height * 3)) <= PALETTE_RMS_LIMIT
+        return default if near_lossless else OUTPUT_FORMATS["JPEG"]
+    if png_hits != jpeg_hits:
+        return default if png_hits else OUTPUT_FORMATS["JPEG"]
+    if jpeg_range[1] < low:
+        return OUTPUT_FORMATS["JPEG"]
+    png_scale = _estimated_scale(png_sizes[0] / pixel_ratio, sample, dimensions, high)
+    jpeg_scale = _estimated_scale(jpeg_range[0] / pixel_ratio, sample, dimensions, high)
+    return default if png_scale > jpeg_scale else OUTPUT_FORMATS["JPEG"]
+
+
+def search_formats(img: Image.Image, choices: List[OutputFormat], target_size_bytes: int, tolerance: float,
+                   predict: bool = True, reducing_gap: Optional[float] = REDUCING_GAP,
+                   progress: Optional[Callable[[ProgressEvent], None]] = None, cancel=None, parallel: int = 1,
+                   stats: Optional[JobStats] = None, memos: Optional[Dict[str, FormatMemo]] = None,
+                   perceptual: bool = False,
+                   memory_budget: Optional[int] = None) -> Tuple[FormatCandidate, List[FormatCandidate], Optional[str]]:
+    """在已解码的图像上搜索各输出格式，返回 (选中的候选, 已搜索的候选, 选择原因)；只有一个格式时原因为 None
+
+    多个格式时先并行搜索有损格式，其中有格式在原尺寸达到目标时跳过调色板格式（PNG/GIF）；
+    memos 为 格式名 → FormatMemo，给出时复用并更新上次在同一图像上搜索的中间结果；
+    perceptual 为 True 时各格式按感知画质选择尺寸和质量，格式之间也按亮度 SSIM 选择；
+    设置 memory_budget 时各格式依次搜索，同时只存在一个格式的转换副本和缩放副本
+    """
+    executor = None
+    memo_list = [None if memos is None else memos.setdefault(choice.name, FormatMemo()) for choice in choices]
+
+    def prepared(choice: OutputFormat, memo: Optional[FormatMemo], source: Image.Image) -> Image.Image:
+        if memo is None:
+            return prepare_for_format(source, choice)
+        if memo.prepared is None:
+            memo.prepared = prepare_for_format(source, choice)
+        return memo.prepared
+
+    try:
+        if len(choices) == 1:
+            if parallel > 1:
+                executor = ThreadPoolExecutor(max_workers=parallel)
+            with stage(stats, "flatten"):
+                work_img = prepared(choices[0], memo_list[0], img)
+            winner = _search_format(work_img, choices[0], target_size_bytes, tolerance, predict, reducing_gap,
+                                    progress, cancel, executor, parallel, stats, memo=memo_list[0],
+                                    perceptual=perceptual, working=img)
+            return winner, [winner], None
+
+        # 各格式在各自线程中顺序搜索，编码器释放 GIL，格式之间并行；有内存预算时依次搜索并统计峰值内存
+        executor = ThreadPoolExecutor(max_workers=1 if memory_budget else len(choices))
+        img.load()
+
+        def search(choice, memo):
+            # 依次搜索时不会并发编码同一对象，无需共享视图
+            source = img if memory_budget else _shared_view(img)
+            return _search_format(prepared(choice, memo, source), choice, target_size_bytes, tolerance, predict,
+                                  reducing_gap, progress, cancel, None, 1, stats if memory_budget else None,
+                                  memo=memo, perceptual=perceptual, working=img)
+
+        # 先搜索有损格式：已有格式在原尺寸达到目标时，调色板格式（慢得多）最多只能在画质上胜出，不再搜索
+        source_alpha = has_alpha(img)
+        max_acceptable = target_size_bytes * (1 + tolerance)
+        candidates = []
+        skipped = []
+        for palette in (False, True):
+            group = [(choice, memo) for choice, memo in zip(choices, memo_list) if choice.palette == palette]
+            if palette and any(c.dimensions == img.size and c.size <= max_acceptable
+                               and (c.format.keeps_alpha or not source_alpha) for c in candidates):
+                skipped = [choice.name for choice, _ in group]
+                break
+            if group:
+                with stage(stats, "encode"):
+                    candidates += executor.map(search, *zip(*group))
+        winner, reason = choose_format(candidates, target_size_bytes, tolerance, source_alpha, img)
+        if skipped:
+            reason += f"。{'、'.join(skipped)}: 已有格式在原尺寸达到目标，未搜索"
+        return winner, candidates, reason
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def resize_by_filesize(input_path: str, target_size_bytes: int, tolerance: float,
+                       output_path: Optional[str] = None,
+                       progress: Optional[Callable[[ProgressEvent], None]] = None,
+                       cancel=None, reducing_gap: Optional[float] = REDUCING_GAP,
+                       predict: bool = True, parallel: int = 1,
+                       memory_budget: Optional[int] = None,
+                       stats: Optional[JobStats] = None,
+                       formats: Optional[Iterable[str]] = None,
+                       session: Optional[SessionCache] = None, perceptual: bool = False) -> ResizeResult:
+    """按目标文件大小调整图像，确保在容差范围内
+
+    默认保留 JPEG/WebP/AVIF/PNG/GIF 输入的格式（BMP 输出为 PNG），其他格式的输入输出为 JPEG；
+    PNG/GIF 保留透明通道，先尝试无损编码，再按调色板颜色数和缩放比例搜索；
+    未给出 formats 时不透明的 PNG/BMP 输入按 filesize_output_format 判断，照片类图像输出为 JPEG；
+    formats 给出多个格式名（JPEG/WEBP/AVIF/PNG/GIF）时在线程池中同时搜索各格式，按 choose_format 选择输出格式，
+    结果的 format 和 reason 记录所选格式及原因；
+    progress 在每次试编码后收到 ProgressEvent；cancel 被设置后在下一次编码前抛出 ResizeCancelled；
+    predict 为 True 时先用小代理图预测起始质量和缩放比例；parallel 大于 1 时每轮并发编码多个候选质量；
+    设置 memory_budget（字节）时工作图像按预算分条带解码并缩小；stats 用于收集分阶段耗时；
+    给出 session 时复用（并缓存）该文件的工作图像和各格式的 质量→大小 曲线，换一个相近的目标大小时通常无需重新解码和搜索，
+    未设置 memory_budget 时有效；
+    perceptual 为 True 时不再只取第一个达到目标的尺寸，而是在几个逐级缩小的尺寸中按亮度 SSIM 选择画质最好的组合
+    """
+    output_path = output_path or get_output_path(input_path)
+    stats = begin_stats(stats, input_path, "filesize")
+    error = None
+
+    try:
+        # 如果目标大小大于当前大小，直接复制
+        if target_size_bytes >= read_image_info(input_path).size:
+            with stage(stats, "write"):
+                if memory_budget:
+                    # 按字节复制，不解码
+                    shutil.copyfile(input_path, output_path)
+                    dimensions, encodes = read_image_info(input_path).dimensions, 0
+                else:
+                    with open_image(input_path) as img:
+                        load_codec(codec_for_path(output_path))
+                        img.save(output_path)
+                        dimensions, encodes = img.size, 1
+            size = os.path.getsize(output_path)
+            if stats is not None:
+                stats.encodes, stats.bytes_written = encodes, size
+            return ResizeResult(output_path, size, dimensions, encodes)
+
+        choices = resolve_formats(formats, output_format_for(output_path))
+        flatten = not any(choice.keeps_alpha for choice in choices)
+        with _use_session(None if memory_budget else session, input_path) as entry:
+            img = entry.working.get(flatten) if entry else None
+            if img is None:
+                img = load_working_image(input_path, memory_budget, reducing_gap, cancel, stats, flatten=flatten)
+                if entry is not None:
+                    entry.working[flatten] = img
+            if not formats:
+                with stage(stats, "predict"):
+                    choices = [filesize_output_format(img, choices[0], target_size_bytes, tolerance)]
+            memos = entry.memos.setdefault(flatten, {}) if entry else None
+            winner, candidates, reason = search_formats(img, choices, target_size_bytes, tolerance, predict,
+                                                        reducing_gap, progress, cancel, parallel, stats, memos,
+                                                        perceptual, memory_budget)
+
+        check_cancelled(cancel)
+        output_path = with_format_extension(output_path, winner.format)
+        with stage(stats, "write"):
+            winner.probe.write_to(output_path)
+        encodes = sum(candidate.probe.encodes for candidate in candidates)
+        if stats is not None:
+            stats.encodes, stats.bytes_written = encodes, winner.size
+
+    except ResizeCancelled:
+        error = "已取消"
+        raise
+    except Exception as e:
+        error = f"调整文件大小失败: {str(e)}"
+        raise Exception(error)
+    finally:
+        finish_stats(stats, error)
+
+    return ResizeResult(output_path, winner.size, winner.dimensions, encodes, winner.format.name, reason)
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    """可定位流从当前位置到末尾的字节数"""
+    start = stream.tell()
+    size = stream.seek(0, io.SEEK_END) - start
+    stream.seek(start)
+    return size
+
+
+def resize_stream_by_dimension(source: BinaryIO, target_size: Tuple[int, int], output: BinaryIO,
+                               format: Optional[str] = None, cancel=None,
+                               reducing_gap: Optional[float] = REDUCING_GAP,
+                               stats: Optional[JobStats] = None) -> ResizeResult:
+    """从可定位的二进制流读取图像，按像素尺寸调整后写入 output，不经过文件
+
+    format 为输出格式名，默认与输入相同；不支持透明通道的输出格式合成白色背景；结果的 output_path 为 None
+    """
+    stats = begin_stats(stats, "", "dimension")
+    error = None
+
+    try:
+        with open_image(source) as img:
+            output_format = (format or img.format).upper()
+            with stage(stats, "decode"):
+                draft_for(img, target_size, reducing_gap)
+                img.load()
+            with stage(stats, "resize"):
+                resized_img = resample(img, target_size, reducing_gap)
+            if stats is not None:
+                stats.track(img, resized_img)
+        check_cancelled(cancel)
+
+        if output_format in OUTPUT_FORMATS:
+            with stage(stats, "flatten"):
+                resized_img = prepare_for_format(resized_img, OUTPUT_FORMATS[output_format])
+        buffer = io.BytesIO()
+        with stage(stats, "encode"):
+            save_resized(resized_img, buffer, output_format)
+        with stage(stats, "write"), buffer.getbuffer() as view:
+            output.write(view)
+        size = buffer.tell()
+        if stats is not None:
+            stats.encodes, stats.bytes_written = 1, size
+
+    except ResizeCancelled:
+        error = "已取消"
+        raise
+    except Exception as e:
+        error = f"调整尺寸失败: {str(e)}"
+        raise Exception(error)
+    finally:
+        finish_stats(stats, error)
+
+    return ResizeResult(None, size, resized_img.size, 1, output_format)
+
+
+def resize_stream_by_filesize(source: BinaryIO, target_size_bytes: int, tolerance: float, output: BinaryIO,
+                              progress: Optional[Callable[[ProgressEvent], None]] = None,
+                              cancel=None, reducing_gap: Optional[float] = REDUCING_GAP,
+                              predict: bool = True, parallel: int = 1,
+                              stats: Optional[JobStats] = None,
+                              formats: Optional[Iterable[str]] = None, perceptual: bool = False) -> ResizeResult:
+    """从可定位的二进制流读取图像，按目标文件大小调整后写入 output，不经过文件
+
+    输入不大于目标时原样复制；默认输出格式按输入格式确定（与 resize_by_filesize 按扩展名的规则相同），
+    其他参数同 resize_by_filesize；结果的 output_path 为 None
+    """
+    stats = begin_stats(stats, "", "filesize")
+    start = source.tell()
+    error = None
+
+    try:
+        with open_image(source) as img:
+            input_format, dimensions = img.format, img.size
+        source.seek(start)
+
+        if target_size_bytes >= _stream_size(source):
+            with stage(stats, "write"):
+                shutil.copyfileobj(source, output)
+            size = source.tell() - start
+            if stats is not None:
+                stats.bytes_written = size
+            return ResizeResult(None, size, dimensions, 0, input_format)
+
+        choices = resolve_formats(formats, default_output_format(input_format))
+        img = load_working_image(source, None, reducing_gap, cancel, stats,
+                                 flatten=not any(choice.keeps_alpha for choice in choices))
+        winner, candidates, reason = search_formats(img, choices, target_size_bytes, tolerance, predict,
+                                                    reducing_gap, progress, cancel, parallel, stats,
+                                                    perceptual=perceptual)
+
+        check_cancelled(cancel)
+        with stage(stats, "write"):
+            winner.probe.write_stream(output)
+        encodes = sum(candidate.probe.encodes for candidate in candidates)
+        if stats is not None:
+            stats.encodes, stats.bytes_written = encodes, winner.size
+
+    except ResizeCancelled:
+        error = "已取消"
+        raise
+    except Exception as e:
+        error = f"调整文件大小失败: {str(e)}"
+        raise Exception(error)
+    finally:
+        finish_stats(stats, error)
+
+    return ResizeResult(None, winner.size, winner.dimensions, encodes, winner.format.name, reason)
+
+
+class Rendition(NamedTuple):
+    """多尺寸输出中的一个规格
+
+    只给出宽或高时按原图宽高比计算另一边，都不给出时为原图尺寸；
+    给出 max_bytes 时在该尺寸下按文件大小搜索（只缩小不放大），输出不超过 max_bytes，缩小到最小边长仍超出时报错
+    """
+    width: Optional[int] = None
+    height: Optional[int] = None
+    max_bytes: Optional[int] = None
+
+    def dimensions(self, source_size: Tuple[int, int]) -> Tuple[int, int]:
+        width, height = source_size
+        if self.width and self.height:
+            return (self.width, self.height)
+        if self.width:
+            return (self.width, max(1, round(height * self.width / width)))
+        if self.height:
+            return (max(1, round(width * self.height / height)), self.height)
+        return source_size
+
+
+# 多尺寸输出的默认文件名模板；可用字段 stem（输入文件名）、ext（扩展名，含点）、width、height、index（从 0 开始）
+RENDITION_TEMPLATE = "{stem}_{width}x{height}{ext}"
+
+
+def rendition_path(input_path: str, dimensions: Tuple[int, int], index: int,
+                   output_dir: Optional[str] = None, template: str = RENDITION_TEMPLATE) -> str:
+    """按模板生成单个规格的输出路径，默认与输入文件同目录"""
+    stem, ext = os.path.splitext(os.path.basename(input_path))
+    try:
+        name = template.format(stem=stem, ext=ext, width=dimensions[0], height=dimensions[1], index=index)
+    except (KeyError, IndexError, ValueError) as e:
+        raise Exception(f"无效的文件名模板 {template}: {e}")
+    return os.path.join(os.path.dirname(input_path) if output_dir is None else output_dir, name)
+
+
+def resize_renditions(input_path: str, renditions: Iterable[Rendition], output_dir: Optional[str] = None,
+                      template: str = RENDITION_TEMPLATE, tolerance: float = 0.2, cancel=None,
+                      reducing_gap: Optional[float] = REDUCING_GAP, memory_budget: Optional[int] = None,
+                      stats: Optional[JobStats] = None) -> List[ResizeResult]:
+    """只解码一次，按从大到小的顺序输出多个尺寸，返回与 renditions 顺序一致的结果
+
+    每个规格从已生成的、各边不小于目标 reducing_gap 倍的最小中间图像缩放（reducing_gap 为 None 时都从原图缩放），
+    JPEG 按最大规格的 reducing_gap 倍降采样解码；设置 memory_budget（字节）时按预算分条带解码为最大规格；
+    给出 max_bytes 的规格按输出扩展名确定格式，以 tolerance 为容差搜索不超过 max_bytes 的质量和尺寸，
+    搜索结果仍超出时继续缩小，缩小到最小边长仍超出时报错；多个规格的输出路径相同时报错
+    """
+    renditions = list(renditions)
+    if not renditions:
+        raise Exception("没有指定输出尺寸")
+    stats = begin_stats(stats, input_path, "renditions")
+    source_size = read_image_info(input_path).dimensions
+    targets = [rendition.dimensions(source_size) for rendition in renditions]
+    largest = max(targets, key=lambda size: size[0] * size[1])
+    gap = reducing_gap or 1
+    results: List[Optional[ResizeResult]] = [None] * len(renditions)
+    encodes = 0
+    error = None
+
+    try:
+        # 输出路径 → 规格序号；按大小搜索的规格缩小后路径会变化，写入前再检查一次
+        claimed: Dict[str, int] = {}
+        for index, target in enumerate(targets):
+            path = os.path.normcase(os.path.abspath(rendition_path(input_path, target, index, output_dir, template)))
+            if path in claimed:
+                raise Exception(f"规格 {claimed[path] + 1} 和 {index + 1} 的输出文件同名: {os.path.basename(path)}"
+                                f"（可在文件名模板中使用 {{index}}）")
+            claimed[path] = index
+
+        if memory_budget:
+            # 按预算直接解码缩放为最大规格，更小的规格都从它缩放
+            with stage(stats, "decode"):
+                source = load_within_budget(input_path, largest, memory_budget,
+                                            reducing_gap=reducing_gap, cancel=cancel, stats=stats)
+        else:
+            with open_image(input_path) as img:
+                with stage(stats, "decode"):
+                    draft_for(img, largest, reducing_gap)
+                    img.load()
+                source = img
+        # 已生成的图像都可作为更小规格的缩放源
+        sources = [source]
+
+        for index in sorted(range(len(renditions)), key=lambda i: -targets[i][0] * targets[i][1]):
+            check_cancelled(cancel)
+            rendition, target = renditions[index], targets[index]
+            base = source
+            if reducing_gap is not None:
+                base = min((img for img in sources
+                            if img.width >= target[0] * gap and img.height >= target[1] * gap),
+                           key=lambda img: img.width * img.height, default=source)
+            with stage(stats, "resize"):
+                resized = base if base.size == target else resample(base, target, reducing_gap)
+            sources.append(resized)
+            if stats is not None:
+                stats.track(*sources)
+
+            output_path = rendition_path(input_path, target, index, output_dir, template)
+            if rendition.max_bytes is None:
+                with stage(stats, "encode"):
+                    save_resized(resized, output_path)
+                encodes += 1
+                results[index] = ResizeResult(output_path, os.path.getsize(output_path), target, 1)
+                continue
+
+            with stage(stats, "predict"):
+                output_format = filesize_output_format(resized, output_format_for(output_path),
+                                                       int(rendition.max_bytes / (1 + tolerance)), tolerance)
+            with stage(stats, "flatten"):
+                work_img = prepare_for_format(resized, output_format)
+            target_bytes = int(rendition.max_bytes / (1 + tolerance))
+            candidate = _search_format(work_img, output_format, target_bytes, tolerance, True, reducing_gap, None,
+                                       cancel, None, 1, stats)
+            encodes += candidate.probe.encodes
+            for _ in range(MAX_SCALE_STEPS):
+                if candidate.size <= rendition.max_bytes:
+                    break
+                # 缩放次数用尽或最低质量仍超出：按 大小∝缩放比例^2 继续缩小后重新搜索
+                dimensions = scaled_dimensions(candidate.dimensions, (target_bytes / candidate.size) ** 0.5)
+                if dimensions == candidate.dimensions:
+                    break
+                check_cancelled(cancel)
+                work_img = None
+                with stage(stats, "resize"):
+                    work_img = prepare_for_format(resample(resized, dimensions, reducing_gap), output_format)
+                if stats is not None:
+                    stats.track(*sources, work_img)
+                candidate = _search_format(work_img, output_format, target_bytes, tolerance, True, reducing_gap,
+                                           None, cancel, None, 1, stats)
+                encodes += candidate.probe.encodes
+            if candidate.size > rendition.max_bytes:
+                raise Exception(f"规格 {index + 1} 缩小到 {candidate.dimensions[0]}x{candidate.dimensions[1]}px "
+                                f"仍为 {format_size(candidate.size)}，无法不超过 {format_size(rendition.max_bytes)}")
+            output_path = with_format_extension(
+                rendition_path(input_path, candidate.dimensions, index, output_dir, template), output_format)
+            path = os.path.normcase(os.path.abspath(output_path))
+            if claimed.get(path, index) != index:
+                raise Exception(f"规格 {index + 1} 按大小缩小后与规格 {claimed[path] + 1} 的输出文件同名: "
+                                f"{os.path.basename(output_path)}")
+            claimed[path] = index
+            with stage(stats, "write"):
+                candidate.probe.write_to(output_path)
+            results[index] = ResizeResult(output_path, candidate.size, candidate.dimensions,
+                                          candidate.probe.encodes, output_format.name)
+
+        if stats is not None:
+            stats.encodes, stats.bytes_written = encodes, sum(result.size for result in results)
+
+    except ResizeCancelled:
+        error = "已取消"
+        raise
+    except Exception as e:
+        error = f"多尺寸输出失败: {str(e)}"
+        raise Exception(error)
+    finally:
+        finish_stats(stats, error)
+
+    return results
+
+
+class PreviewPlan(NamedTuple):
+    """预览对应的输出：像素尺寸、格式、质量（调色板格式为颜色数，无损或按尺寸调整时不适用为 None）和预计字节数"""
+    dimensions: Tuple[int, int]
+    format: str
+    quality: Optional[int]
+    predicted_size: int
+    in_tolerance: bool = True  # 按文件大小调整时预计能否落在容差范围内
+    palette: bool = False
+
+
+# 预览金字塔保留的最大一级的最长边，更大的级只用于采样图块，构建完成后释放
+PREVIEW_MAX_SIDE = 2048
+
+# 金字塔最小一级的最长边
+PREVIEW_MIN_SIDE = 64
+
+# 每一级用于预测字节数的采样拼图：图块边长和每行/列块数（图块对齐到 JPEG 的 16 像素 MCU）
+PREVIEW_TILE = 64
+PREVIEW_GRID = 4
+
+
+class PreviewPyramid:
+    """由原图逐级 reduce(2) 得到的缩略图金字塔，载入图像时构建一次，之后的预览不再访问原图
+
+    每一级保留一张采样图（较大的级为均匀采样的图块拼图，原尺寸一级的图块来自全分辨率图像），
+    预测编码大小时在相邻两级之间按 ln(缩放比例)→ln(每像素字节数) 线性插值，
+    每个 (级, 格式, 编码参数) 只编码一次采样图；只在一个线程中使用
+    """
+
+    def __init__(self, size: Tuple[int, int], format: Optional[str], levels: List[Image.Image],
+                 samples: List[Tuple[float, Image.Image]]):
+        self.size = size  # 原图尺寸
+        self.format = format  # 原图格式名
+        self.levels = levels  # 用于显示的各级图像，从大到小
+        self.samples = samples  # [(缩放比例, 采样图)]，从大到小
+        self._densities: Dict[tuple, float] = {}  # (级, 格式, 编码参数, 颜色数) → 每像素字节数
+        self._headers: Dict[tuple, int] = {}  # (格式, 编码参数, 颜色数) → 文件头等固定开销
+        self._prepared: Dict[Tuple[int, bool], Image.Image] = {}  # (级, 是否合成透明背景) → 采样图
+        self.encodes = 0
+
+    def _sample(self, index: int, flatten: bool) -> Image.Image:
+        key = (index, flatten)
+        if key not in self._prepared:
+            sample = self.samples[index][1]
+            self._prepared[key] = flatten_alpha(sample) if flatten else sample
+        return self._prepared[key]
+
+    def _encode(self, img: Image.Image, format: str, options: dict, colors: Optional[int]) -> int:
+        if colors:
+            img = quantize(img, colors, binary_alpha=format == "GIF")
+        buffer = io.BytesIO()
+        img.save(buffer, format=format, **options)
+        self.encodes += 1
+        return buffer.tell()
+
+    def _density(self, index: int, format: str, options: dict, colors: Optional[int]) -> float:
+        """第 index 级采样图编码后每像素的字节数（不含固定开销）"""
+        options_key = tuple(sorted(options.items()))
+        key = (index, format, options_key, colors)
+        if key not in self._densities:
+            flatten = format not in OUTPUT_FORMATS or not OUTPUT_FORMATS[format].keeps_alpha
+            sample = self._sample(index, flatten)
+            header_key = (format, options_key, colors)
+            if header_key not in self._headers:
+                self._headers[header_key] = self._encode(sample.crop((0, 0, 16, 16)), format, options, colors)
+            size = self._encode(sample, format, options, colors)
+            self._densities[key] = max(1, size - self._headers[header_key]) / (sample.width * sample.height)
+        return self._densities[key]
+
+    def predict_size(self, dimensions: Tuple[int, int], format: str, options: Optional[dict] = None,
+                     colors: Optional[int] = None) -> int:
+        """预测按 format 和 options（调色板格式量化为 colors 色）编码 dimensions 尺寸的输出字节数"""
+        load_codec(format)
+        options = options or {}
+        width, height = dimensions
+        scale = math.sqrt(width * height / (self.size[0] * self.size[1]))
+        scales = [sample_scale for sample_scale, _ in self.samples]
+        # 放大时按原尺寸的密度，小于最小一级时按最小一级的密度
+        upper = max([0] + [i for i, sample_scale in enumerate(scales) if sample_scale >= scale])
+        lower = min(upper + 1, len(scales) - 1)
+        density = self._density(upper, format, options, colors)
+        if lower != upper and scale < scales[upper]:
+            t = math.log(scales[upper] / scale) / math.log(scales[upper] / scales[lower])
+            lower_density = self._density(lower, format, options, colors)
+            density = math.exp(math.log(density) + min(t, 1.0) * math.log(lower_density / density))
+        header = self._headers[(format, tuple(sorted(options.items())), colors)]
+        return round(header + density * width * height)
+
+    def plan_dimension(self, dimensions: Tuple[int, int], format: Optional[str] = None) -> PreviewPlan:
+        """按像素尺寸调整到 dimensions 时的输出；format 默认为原图格式"""
+        format = format or self.format or "JPEG"
+        options = dimension_save_options(format)
+        return PreviewPlan(dimensions, format, options.get("quality"),
+                           self.predict_size(dimensions, format, options))
+
+    def plan_filesize(self, output_format: OutputFormat, target_size_bytes: int, tolerance: float) -> PreviewPlan:
+        """按与 _search_format 相同的顺序在预测的大小上搜索：先只调整质量（PNG 先尝试无损），
+        最低质量仍超出目标上限时，取最低质量下不超过目标的最大尺寸，再在该尺寸下取预计大小最接近目标的质量
+        """
+        max_acceptable = target_size_bytes * (1 + tolerance)
+        min_acceptable = target_size_bytes * (1 - tolerance)
+
+        def predict(quality: Optional[int], dimensions: Tuple[int, int]) -> int:
+            if output_format.palette:
+                return self.predict_size(dimensions, output_format.name, output_format.options or {}, quality)
+            return self.predict_size(dimensions, output_format.name, dict(output_format.options or {},
+                                                                          quality=quality))
+
+        def plan(quality: Optional[int], dimensions: Tuple[int, int]) -> PreviewPlan:
+            size = predict(quality, dimensions)
+            return PreviewPlan(dimensions, output_format.name, quality, size,
+                               min_acceptable <= size <= max_acceptable, output_format.palette)
+
+        def best_quality(dimensions: Tuple[int, int]) -> int:
+            """与 QualitySolver 一样取预计大小最接近目标且不超过上限的质量，而不是上限内最高的质量"""
+            low, high = output_format.min_quality, output_format.max_quality
+            while low < high:
+                middle = (low + high + 1) // 2
+                if predict(middle, dimensions) <= target_size_bytes:
+                    low = middle
+                else:
+                    high = middle - 1
+            above = predict(low + 1, dimensions) if low < output_format.max_quality else max_acceptable + 1
+            if above <= max_acceptable and above / target_size_bytes < target_size_bytes / predict(low, dimensions):
+                return low + 1
+            return low
+
+        if output_format.name == "PNG":
+            lossless = plan(None, self.size)
+            if lossless.predicted_size <= max_acceptable:
+                return lossless._replace(in_tolerance=lossless.predicted_size >= min_acceptable)
+
+        if predict(output_format.min_quality, self.size) <= max_acceptable:
+            return plan(best_quality(self.size), self.size)
+
+        low, high = 0.0, 1.0
+        for _ in range(12):
+            middle = (low + high) / 2
+            if predict(output_format.min_quality, scaled_dimensions(self.size, middle)) <= target_size_bytes:
+                low = middle
+            else:
+                high = middle
+        dimensions = scaled_dimensions(self.size, low)
+        return plan(best_quality(dimensions), dimensions)
+
+    def render(self, plan: PreviewPlan, box: Tuple[int, int]) -> Image.Image:
+        """按 plan 的输出尺寸缩小到 box 内显示（输出尺寸不超过 box 时按实际像素显示），合成白色背景
+
+        按实际像素显示时模拟输出的编码损失：有损格式按 plan 的质量编解码一次，调色板格式量化为 plan 的颜色数
+        """
+        width, height = plan.dimensions
+        fit = min(1.0, box[0] / width, box[1] / height)
+        display = (max(1, round(width * fit)), max(1, round(height * fit)))
+        level = min((img for img in self.levels if img.width >= display[0] and img.height >= display[1]),
+                    key=lambda img: img.width * img.height, default=self.levels[0])
+        img = flatten_alpha(level.resize(display, resample=Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if display == plan.dimensions and plan.quality is not None:
+            if plan.palette:
+                img = quantize(img, plan.quality).convert("RGB")
+            elif plan.format in ("JPEG", "WEBP", "AVIF"):
+                buffer = io.BytesIO()
+                img.save(buffer, format=plan.format, quality=plan.quality,
+                         **(OUTPUT_FORMATS[plan.format].options or {}))
+                buffer.seek(0)
+                img = Image.open(buffer)
+                img.load()
+        return img
+
+
+def build_preview(input_path: str, cancel=None) -> PreviewPyramid:
+    """解码一次原图并构建预览金字塔；原图和大于 PREVIEW_MAX_SIDE 的级在返回前释放"""
+    with open_image(input_path) as img:
+        img.load()
+        format = img.format
+        current = img if img.mode in ("L", "LA", "RGB", "RGBA") else img.convert("RGBA" if has_alpha(img) else "RGB")
+
+    # 显示级由 reduce(2) 逐级得到；拼图采样的各级则从原图的图块以与输出相同的 LANCZOS 缩小得到，
+    # reduce 的盒式滤波保留更多混叠细节，直接采样显示级会使缩小 2～4 倍的预测偏大约 10%；更小的级整级采样，差别可忽略
+    full = current
+    mosaic_side = PREVIEW_TILE * PREVIEW_GRID
+    levels, samples = [], []
+    factor = 1
+    while True:
+        check_cancelled(cancel)
+        if current.width * current.height > 2 * mosaic_side * mosaic_side and min(current.size) >= PREVIEW_TILE:
+            sample = _tile_mosaic(full, PREVIEW_TILE, PREVIEW_GRID, factor)
+        else:
+            sample = current
+        samples.append((current.width / full.width, sample))
+        if max(current.size) <= PREVIEW_MAX_SIDE:
+            levels.append(current)
+        if max(current.size) // 2 < PREVIEW_MIN_SIDE or min(current.size) < 2:
+            break
+        current = current.reduce(2)
+        factor *= 2
+
+    return PreviewPyramid(img.size, format, levels, samples)
@@ -0,0 +1,465 @@
+"""本地 HTTP 调整服务：请求体为图像，响应体为调整后的图像，不经过输出文件
+
+示例:
+    python resize_server.py --port 8080 --workers 4 --max-queue 16
+    curl --data-binary @photo.jpg "http://127.0.0.1:8080/resize/dimension?size=800x600" -o small.jpg
+    curl --data-binary @photo.jpg "http://127.0.0.1:8080/resize/filesize?target=200KB&formats=jpeg,webp" -o out
+    curl http://127.0.0.1:8080/metrics
+
+接口:
+    POST /resize/dimension?size=宽x高[&format=jpeg]
+    POST /resize/filesize?target=200KB[&tolerance=20][&formats=jpeg,webp][&perceptual=1]
+    GET  /metrics    请求数、拒绝数、排队深度、延迟分位数和分阶段耗时汇总（JSON）
+    GET  /health
+
+任务在固定大小的线程池中执行（Pillow 解码、缩放和编码时释放 GIL）；执行中和排队的请求达到
+--workers + --max-queue 时，新请求不进入队列、请求体直接丢弃，以 503 拒绝并附带 Retry-After。
+响应头 X-Image-Width / X-Image-Height / X-Encodes 给出结果信息，X-Format-Reason 为 URL 编码的格式选择说明。
+"""
+import argparse
+import collections
+import io
+import json
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from PIL import Image
+
+import resize_batch
+import resize_cli
+import resize_engine
+
+# 计算延迟分位数使用的最近请求数
+LATENCY_WINDOW = 1000
+
+# 请求体超过该大小时暂存到临时文件
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+READ_CHUNK_BYTES = 64 * 1024
+
+RETRY_AFTER_S = 1
+
+
+class HttpError(Exception):
+    """以指定状态码返回给客户端的错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class ResizeService:
+    """有界工作池和服务指标；capacity 为执行中和排队的任务总数上限"""
+
+    def __init__(self, workers: int = 1, max_queue: int = 0, timeout: Optional[float] = None,
+                 max_body: int = 64 * 1024 * 1024, reducing_gap: Optional[float] = resize_engine.REDUCING_GAP):
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.timeout = timeout
+        self.max_body = max_body
+        self.reducing_gap = reducing_gap
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resize")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.responses: Dict[int, int] = collections.Counter()
+        self.shed = 0
+        self.queued = 0
+        self.running = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.totals = resize_engine.JobStats("", "server")
+
+    def admit(self) -> bool:
+        """占用一个名额；已满时记录拒绝并返回 False"""
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            self.shed += 1
+        return False
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def run(self, func: Callable[[threading.Event], resize_engine.ResizeResult],
+            on_done: Optional[Callable[[], None]] = None) -> resize_engine.ResizeResult:
+        """在工作池中执行 func(cancel)，等待结果；超时时设置取消事件并以 504 报错
+
+        调用前必须已通过 admit() 占用名额；任务真正结束（包括超时后取消完成）时调用 on_done 并释放名额，
+        因此超时返回后任务仍在使用的输入不会被提前关闭
+        """
+        cancel = threading.Event()
+
+        def task():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                # 排队期间已超时的任务不再开始
+                resize_engine.check_cancelled(cancel)
+                return func(cancel)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        def done(_):
+            try:
+                if on_done is not None:
+                    on_done()
+            finally:
+                self.release()
+
+        with self._lock:
+            self.queued += 1
+        try:
+            future = self._executor.submit(task)
+        except BaseException:
+            with self._lock:
+                self.queued -= 1
+            done(None)
+            raise
+        future.add_done_callback(done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            cancel.set()
+            raise HttpError(504, f"处理超过 {self.timeout:g} 秒，已取消")
+        except resize_engine.ResizeCancelled:
+            raise HttpError(504, "已取消")
+
+    def record(self, status: int, seconds: float, bytes_in: int = 0, bytes_out: int = 0,
+               stats: Optional[resize_engine.JobStats] = None) -> None:
+        with self._lock:
+            self.responses[status] += 1
+            self.latencies.append(seconds)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if stats is not None:
+                self.totals.merge(stats)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "uptime_s": round(time.monotonic() - self._started, 3),
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "running": self.running,
+                "queued": self.queued,
+                "responses": {str(status): count for status, count in sorted(self.responses.items())},
+                "shed": self.shed,
+                "latency_ms": {
+                    "window": len(latencies),
+                    "p50": round(percentile(latencies, 0.5) * 1000, 3),
+                    "p99": round(percentile(latencies, 0.99) * 1000, 3),
+                },
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "stats": {
+                    "total_s": round(self.totals.total, 6),
+                    "stages_s": {name: round(seconds, 6) for name, seconds in self.totals.stages.items()},
+                    "encodes": self.totals.encodes,
+                    "peak_image_bytes": self.totals.peak_image_bytes,
+                },
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def query_value(query: Dict[str, list], name: str, parse: Callable, default=None):
+    """取查询参数并用 resize_cli 的解析函数转换，无效时以 400 报错"""
+    if name not in query:
+        if default is None:
+            raise HttpError(400, f"缺少参数 {name}")
+        return default
+    try:
+        return parse(query[name][-1])
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        raise HttpError(400, f"参数 {name} 无效: {e}")
+
+
+def parse_flag(text: str) -> bool:
+    """查询参数中的开关：1/true/yes 或 0/false/no"""
+    value = text.strip().lower()
+    if value not in ("1", "true", "yes", "0", "false", "no"):
+        raise ValueError(f"应为 1 或 0: {text}")
+    return value in ("1", "true", "yes")
+
+
+def parse_dimension_job(query: Dict[str, list], service: ResizeService):
+    size = query_value(query, "size", resize_cli.parse_dimension)
+    format = query_value(query, "format", resize_cli.parse_formats, ())
+    if len(format) > 1:
+        raise HttpError(400, "format 只能指定一种输出格式")
+
+    def job(source, output, cancel, stats):
+        return resize_engine.resize_stream_by_dimension(source, size, output, format[0] if format else None,
+                                                        cancel, service.reducing_gap, stats)
+    return "dimension", job
+
+
+def parse_filesize_job(query: Dict[str, list], service: ResizeService):
+    target = query_value(query, "target", resize_cli.parse_filesize)
+    tolerance = query_value(query, "tolerance", float, 20.0)
+    if not 0 < tolerance <= 50:
+        raise HttpError(400, "tolerance 必须是0-50之间的数值")
+    formats = query_value(query, "formats", resize_cli.parse_formats, ())
+    perceptual = query_value(query, "perceptual", parse_flag, False)
+
+    def job(source, output, cancel, stats):
+        return resize_engine.resize_stream_by_filesize(source, target, tolerance / 100, output, cancel=cancel,
+                                                       reducing_gap=service.reducing_gap, stats=stats,
+                                                       formats=formats or None, perceptual=perceptual)
+    return "filesize", job
+
+
+ROUTES = {
+    "/resize/dimension": parse_dimension_job,
+    "/resize/filesize": parse_filesize_job,
+}
+
+
+class ResizeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ImageResize/1.0"
+    service: ResizeService = None  # 由 make_server 在子类上设置
+    quiet = False
+    admitted = False  # 已在 handle_expect_100 中占用名额
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def handle_expect_100(self):
+        """客户端 POST 时等待 100 Continue 则先占用名额，已满则直接以 503 拒绝，客户端不会发送请求体；
+        其他方法不会进入 do_POST 释放名额，不占用"""
+        if self.command == "POST" and urlsplit(self.path).path in ROUTES:
+            if not self.service.admit():
+                self.close_connection = True
+                self.send_error_json(503, "服务繁忙，请稍后重试", (("Retry-After", str(RETRY_AFTER_S)),))
+                self.service.record(503, 0.0)
+                return False
+            self.admitted = True
+        return super().handle_expect_100()
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: Tuple[Tuple[str, str], ...] = ()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, data: dict, headers: Tuple[Tuple[str, str], ...] = ()):
+        self.send_body(status, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                       "application/json; charset=utf-8", headers)
+
+    def send_error_json(self, status: int, message: str, headers: Tuple[Tuple[str, str], ...] = ()):
+        self.send_json(status, {"error": message}, headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        elif path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif path in ROUTES:
+            self.send_error_json(405, "请使用 POST", (("Allow", "POST"),))
+        else:
+            self.send_error_json(404, f"未知路径: {path}")
+
+    def read_body(self, output) -> int:
+        """将请求体（Content-Length 或分块传输编码）逐块写入 output，返回字节数"""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            total = 0
+            while True:
+                line = self.rfile.readline(1024)
+                try:
+                    size = int(line.split(b";")[0], 16)
+                except ValueError:
+                    raise HttpError(400, "无效的分块编码")
+                if size == 0:
+                    # 跳过可能存在的尾部字段
+                    while self.rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return total
+                total += size
+                if total > self.service.max_body:
+                    raise HttpError(413, f"请求体超过 {resize_engine.format_size(self.service.max_body)}")
+                self._copy(output, size)
+                self.rfile.readline(1024)
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise HttpError(411, "需要 Content-Length 或分块传输编码")
+        try:
+            length = int(length)
+        except ValueError:
+            raise HttpError(400, "无效的 Content-Length")
+        if length > self.service.max_body:
+            raise HttpError(413, f"请求体超过 {resize_engine.format_size(self.service.max_body)}")
+        self._copy(output, length)
+        return length
+
+    def discard_body(self) -> None:
+        """丢弃 Content-Length 不超过上限的请求体；其他情况关闭连接"""
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= self.service.max_body or "Transfer-Encoding" in self.headers:
+            self.close_connection = True
+            return
+        while length > 0:
+            chunk = self.rfile.read(min(READ_CHUNK_BYTES, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    def _copy(self, output, length: int) -> None:
+        while length > 0:
+            chunk = self.rfile.read(min(READ_CHUNK_BYTES, length))
+            if not chunk:
+                raise HttpError(400, "请求体不完整")
+            output.write(chunk)
+            length -= len(chunk)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        parse_job = ROUTES.get(url.path)
+        if parse_job is None:
+            self.close_connection = True
+            self.send_error_json(404, f"未知路径: {url.path}")
+            return
+
+        service = self.service
+        if not self.admitted and not service.admit():
+            # 请求体边读边丢弃，不占用内存；客户端仍在发送时直接关闭连接会使其收到连接重置而看不到 503
+            self.discard_body()
+            self.send_error_json(503, "服务繁忙，请稍后重试", (("Retry-After", str(RETRY_AFTER_S)),))
+            service.record(503, time.perf_counter() - start)
+            return
+
+        self.admitted = False
+        bytes_in = 0
+        stats = source = None
+        admitted = True
+        try:
+            mode, job = parse_job(parse_qs(url.query), service)
+            stats = resize_engine.JobStats(url.path, mode)
+            source = tempfile.SpooledTemporaryFile(SPOOL_MAX_BYTES)
+            bytes_in = self.read_body(source)
+            if not bytes_in:
+                raise HttpError(400, "请求体为空")
+            source.seek(0)
+            output = io.BytesIO()
+            # 交给工作池后由任务结束时关闭输入并释放名额
+            admitted = False
+            result = service.run(lambda cancel: job(source, output, cancel, stats), source.close)
+        except HttpError as e:
+            if admitted:
+                if source is not None:
+                    source.close()
+                service.release()
+            if e.status in (411, 413) or e.status == 400 and bytes_in == 0:
+                # 请求体可能未读完，无法继续复用连接
+                self.close_connection = True
+            self.send_error_json(e.status, str(e))
+            service.record(e.status, time.perf_counter() - start, bytes_in)
+            return
+        except Exception as e:
+            if admitted:
+                if source is not None:
+                    source.close()
+                service.release()
+            self.send_error_json(422, str(e))
+            service.record(422, time.perf_counter() - start, bytes_in, stats=stats)
+            return
+
+        width, height = result.dimensions
+        headers = [("X-Image-Width", str(width)), ("X-Image-Height", str(height)),
+                   ("X-Encodes", str(result.encodes))]
+        if result.reason:
+            headers.append(("X-Format-Reason", quote(result.reason)))
+        self.send_response(200)
+        self.send_header("Content-Type", Image.MIME.get(result.format, "application/octet-stream"))
+        self.send_header("Content-Length", str(result.size))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        with output.getbuffer() as view:
+            self.wfile.write(view)
+        service.record(200, time.perf_counter() - start, bytes_in, result.size, stats)
+
+
+def make_server(service: ResizeService, host: str = "127.0.0.1", port: int = 8080,
+                quiet: bool = False) -> ThreadingHTTPServer:
+    """创建服务器（未开始处理请求）；port 为 0 时由系统分配，实际端口见 server.server_address"""
+    handler = type("Handler", (ResizeHandler,), {"service": service, "quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地 HTTP 图像调整服务",
+                                     epilog="默认只监听本机地址；服务不做身份验证，请勿直接暴露到公网")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口（默认 8080，0 表示自动分配）")
+    parser.add_argument("--workers", type=int, default=0, help="工作线程数（默认为 CPU 核数）")
+    parser.add_argument("--max-queue", type=int, default=-1,
+                        help="工作线程全忙时最多排队的请求数，超出时返回 503（默认为工作线程数的2倍）")
+    parser.add_argument("--max-body", type=resize_cli.parse_filesize, default=64 * 1024 * 1024,
+                        help="请求体大小上限，超出时返回 413（默认 64MB）")
+    parser.add_argument("--timeout", type=float, default=0,
+                        help="单个请求的处理时间上限（秒），超时取消并返回 504（默认不限制）")
+    parser.add_argument("--reducing-gap", type=float, default=resize_engine.REDUCING_GAP,
+                        help="缩小时中间图像相对目标尺寸的最小倍数（0 表示禁用降采样解码）")
+    parser.add_argument("--quiet", action="store_true", help="不输出访问日志")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers < 0 or args.timeout < 0:
+        parser.error("工作线程数和超时时间不能为负数")
+    if args.reducing_gap < 0 or 0 < args.reducing_gap < 1:
+        parser.error("降采样余量必须为 0 或不小于 1")
+
+    workers = args.workers or resize_batch.default_workers()
+    max_queue = workers * 2 if args.max_queue < 0 else args.max_queue
+    service = ResizeService(workers, max_queue, args.timeout or None, args.max_body, args.reducing_gap or None)
+    server = make_server(service, args.host, args.port, args.quiet)
+    host, port = server.server_address[:2]
+    print(f"监听 http://{host}:{port}（{workers} 个工作线程，最多排队 {max_queue} 个请求）")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
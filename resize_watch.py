@@ -0,0 +1,354 @@
+"""监视目录，自动调整新增或修改的图像
+
+示例:
+    python resize_watch.py inbox/ --size 1920x1080 --output-dir out/
+    python resize_watch.py inbox/ camera/ --target-size 300KB --output-dir out/ -j 4
+
+文件按 (路径, 修改时间, 大小) 识别，连续扫描中保持不变超过 --settle 秒才视为写入完成；
+已处理（含失败）的文件记录在日志文件中，重启后不会重复处理，文件再次修改后重新处理。
+等待处理的任务数达到 --max-pending 时暂停扫描，直到有任务完成。
+"""
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import resize_batch
+import resize_cli
+import resize_engine
+
+# 日志中过期记录（同一路径的旧记录）超过该数量且多于有效记录时，启动时压缩日志
+JOURNAL_COMPACT_SLACK = 1000
+
+DEFAULT_JOURNAL_NAME = ".resize_watch.jsonl"
+
+# 同一文件（同一 FileKey）导致工作进程崩溃的次数达到该值时写入日志，文件再次修改前不再处理
+MAX_CRASHES = 2
+
+
+class FileKey(NamedTuple):
+    """用于判断文件是否变化的 (修改时间, 大小)"""
+    mtime_ns: int
+    size: int
+
+
+class Journal:
+    """已处理文件的 JSON Lines 日志；每个文件处理完成后追加一行，同一路径以最后一行为准"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, dict] = {}
+        lines = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 进程中断时最后一行可能不完整
+                        continue
+                    self.records[record["path"]] = record
+                    lines += 1
+        except FileNotFoundError:
+            pass
+        if lines - len(self.records) > max(JOURNAL_COMPACT_SLACK, len(self.records)):
+            self.compact()
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path: str, key: FileKey) -> bool:
+        record = self.records.get(path)
+        return record is not None and FileKey(record["mtime_ns"], record["size"]) == key
+
+    def record(self, path: str, key: FileKey, outputs: Sequence[str] = (), error: Optional[str] = None) -> None:
+        record = {"path": path, "mtime_ns": key.mtime_ns, "size": key.size,
+                  "outputs": list(outputs), "error": error, "time": time.time()}
+        with self._lock:
+            self.records[path] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def compact(self) -> None:
+        """只保留每个路径的最后一条记录，先写临时文件再原子替换"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def scan_directory(directory: str, exclude: Sequence[str] = ()) -> Iterator[Tuple[str, FileKey]]:
+    """递归列出目录中的图像文件及其 FileKey，跳过隐藏文件、临时文件和 exclude 中的目录"""
+    try:
+        entries = list(os.scandir(directory))
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.abspath(entry.path) not in exclude:
+                    yield from scan_directory(entry.path, exclude)
+            elif entry.name.lower().endswith(resize_engine.IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                yield os.path.abspath(entry.path), FileKey(stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            # 扫描过程中被删除或改名
+            continue
+
+
+class Watcher:
+    """轮询监视目录并将写入完成的新文件交给工作池
+
+    make_job 由文件路径生成 ResizeJob；report 在每个任务完成后收到 JobOutcome（在工作池的回调线程中调用）；
+    同时提交但未完成的任务不超过 max_pending 个，设置 memory_limit 时估算峰值内存之和也不超过该值，
+    达到上限时扫描暂停
+    """
+
+    def __init__(self, directories: Sequence[str], make_job: Callable[[str], resize_batch.ResizeJob],
+                 journal: Journal, workers: int = 1, max_pending: int = 16, interval: float = 1.0,
+                 settle: float = 2.0, exclude: Sequence[str] = (),
+                 report: Optional[Callable[[resize_batch.JobOutcome], None]] = None,
+                 memory_limit: Optional[int] = None):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.make_job = make_job
+        self.journal = journal
+        self.workers = workers
+        self.interval = interval
+        self.settle = settle
+        self.exclude = [os.path.abspath(d) for d in exclude]
+        self.report = report
+        self.stop_event = threading.Event()
+        # 尚未写入完成的文件：路径 -> (FileKey, 首次看到该 FileKey 的时间)
+        self.unsettled: Dict[str, Tuple[FileKey, float]] = {}
+        self.in_flight: Dict[str, FileKey] = {}
+        # 处理时工作进程崩溃过的文件：(路径, FileKey) -> 崩溃次数；重试时单独运行，以确定是哪个文件导致崩溃
+        self.crashes: Dict[Tuple[str, FileKey], int] = {}
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.memory_limit = memory_limit
+        self._memory = resize_batch.MemoryGate(memory_limit) if memory_limit else None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def _settled(self, path: str, key: FileKey, now: float) -> bool:
+        """文件在连续扫描中保持不变超过 settle 秒时视为写入完成"""
+        seen = self.unsettled.get(path)
+        if seen is None or seen[0] != key:
+            self.unsettled[path] = (key, now)
+            return False
+        if now - seen[1] < self.settle:
+            return False
+        del self.unsettled[path]
+        return True
+
+    def _finished(self, job: resize_batch.ResizeJob, key: FileKey, cost: int, future) -> None:
+        path = job.input_path
+        outcome = None
+        try:
+            try:
+                outcome = future.result()
+            except Exception as e:
+                # 工作进程异常退出等：崩溃次数未达到 MAX_CRASHES 时不写入日志，下一次扫描时单独重试
+                outcome = resize_batch.JobOutcome(job, None, f"工作进程错误: {e}")
+                with self._lock:
+                    crashes = self.crashes[path, key] = self.crashes.get((path, key), 0) + 1
+                if crashes >= MAX_CRASHES:
+                    self.journal.record(path, key, (), outcome.error)
+                    with self._lock:
+                        del self.crashes[path, key]
+            else:
+                outputs = [r.output_path for r in outcome.renditions or ((outcome.result,) if outcome.ok else ())]
+                self.journal.record(path, key, outputs, outcome.error)
+                with self._lock:
+                    self.crashes.pop((path, key), None)
+        finally:
+            # 写日志失败（磁盘已满等）时也要归还名额和内存额度，否则扫描最终会一直等待
+            with self._lock:
+                del self.in_flight[path]
+                if outcome is not None and outcome.ok:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+            if self._memory is not None:
+                self._memory.release(cost)
+            self._slots.release()
+        if self.report is not None:
+            self.report(outcome)
+
+    def _submit(self, executor, path: str, key: FileKey) -> bool:
+        """等待空闲名额（和内存额度）后提交任务；等待期间收到停止请求时返回 False"""
+        while not self._slots.acquire(timeout=0.2):
+            if self.stop_event.is_set():
+                return False
+        cost = 0
+        try:
+            job = self.make_job(path)
+            if self._memory is not None:
+                job, cost = resize_batch.fit_job(job, self.memory_limit)
+                while not self._memory.acquire(cost, timeout=0.2):
+                    if self.stop_event.is_set():
+                        self._slots.release()
+                        return False
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight[path] = key
+        try:
+            future = executor.submit(resize_batch.run_job, job)
+        except BaseException:
+            with self._lock:
+                del self.in_flight[path]
+            if self._memory is not None:
+                self._memory.release(cost)
+            self._slots.release()
+            raise
+        with self._lock:
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._finished(job, key, cost, f))
+        return True
+
+    def poll(self, executor) -> int:
+        """扫描一次所有目录并提交写入完成且未处理的文件，返回提交的任务数"""
+        now = time.monotonic()
+        present: Dict[str, FileKey] = {}
+        submitted = 0
+        for directory in self.directories:
+            for path, key in scan_directory(directory, self.exclude):
+                present[path] = key
+                with self._lock:
+                    busy = path in self.in_flight
+                    # 有崩溃过的文件待重试时，它们逐个单独运行，其他文件暂缓
+                    if (path, key) in self.crashes:
+                        busy = busy or bool(self.in_flight)
+                    else:
+                        busy = busy or bool(self.crashes)
+                if busy or self.journal.is_done(path, key) or not self._settled(path, key, now):
+                    continue
+                if not self._submit(executor, path, key):
+                    return submitted
+                submitted += 1
+        # 已删除的文件不再等待；已删除或已修改的崩溃文件不再单独重试
+        for path in [p for p in self.unsettled if p not in present]:
+            del self.unsettled[path]
+        with self._lock:
+            for path, key in [entry for entry in self.crashes if present.get(entry[0]) != entry[1]]:
+                del self.crashes[path, key]
+        return submitted
+
+    def idle(self) -> bool:
+        """没有等待写入完成的文件，也没有处理中的任务"""
+        with self._lock:
+            return not self.unsettled and not self.in_flight
+
+    def _new_executor(self):
+        if self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=1)
+
+    def run(self, once: bool = False) -> None:
+        """持续监视直到 stop() 被调用，返回前等待已提交的任务完成；once 为 True 时处理完当前已有的文件后返回"""
+        executor = self._new_executor()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    submitted = self.poll(executor)
+                except BrokenExecutor:
+                    # 工作进程异常退出（如解码器崩溃）后重建工作池，未完成的文件在之后的扫描中重试
+                    executor.shutdown()
+                    executor = self._new_executor()
+                    continue
+                if once and not submitted and self.idle():
+                    break
+                self.stop_event.wait(self.interval)
+        finally:
+            executor.shutdown()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+
+def output_path_for(path: str, directories: Sequence[str], output_dir: str) -> str:
+    """输出到 output_dir 下与所在监视目录中相同的相对位置，不同子目录中的同名文件不会互相覆盖"""
+    directory = max((d for d in directories if path.startswith(os.path.join(d, ""))), key=len)
+    relative_dir = os.path.dirname(os.path.relpath(path, directory))
+    return resize_engine.get_output_path(path, os.path.join(output_dir, relative_dir))
+
+
+def build_parser():
+    parser = resize_cli.build_parser()
+    parser.prog = os.path.basename(sys.argv[0])
+    parser.description = "监视目录，自动调整新增或修改的图像"
+    parser.epilog = "必须指定 --output-dir；输出目录位于监视目录内时不会被扫描"
+    parser.add_argument("--journal", help=f"处理日志路径（默认为输出目录下的 {DEFAULT_JOURNAL_NAME}）")
+    parser.add_argument("--interval", type=float, default=1.0, help="扫描间隔秒数（默认1）")
+    parser.add_argument("--settle", type=float, default=2.0, help="文件保持不变多少秒后视为写入完成（默认2）")
+    parser.add_argument("--max-pending", type=int, default=0, help="最多同时提交的任务数（默认为进程数的4倍）")
+    parser.add_argument("--once", action="store_true", help="处理完目录中现有的文件后退出")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    resize_cli.check_args(parser, args)
+    if not args.output_dir:
+        parser.error("监视模式必须指定 --output-dir，避免输出文件被再次处理")
+    if args.interval <= 0 or args.settle < 0 or args.max_pending < 0:
+        parser.error("扫描间隔必须大于0，等待时间和任务数不能为负数")
+    directories = [path for path in args.inputs if os.path.isdir(path)]
+    if len(directories) != len(args.inputs):
+        parser.error("监视模式的输入必须是目录")
+
+    workers = args.workers or resize_batch.default_workers()
+    journal = Journal(args.journal or os.path.join(args.output_dir, DEFAULT_JOURNAL_NAME))
+    stats_log = resize_engine.JsonLinesStatsLog(args.stats_log) if args.stats_log else None
+    lock = threading.Lock()
+
+    def report(outcome):
+        with lock:
+            if stats_log is not None and outcome.stats is not None:
+                stats_log.write(outcome.stats)
+            resize_cli.print_outcome(outcome, args.stats)
+            sys.stdout.flush()
+
+    def make_job(path: str) -> resize_batch.ResizeJob:
+        output_path = output_path_for(path, watcher.directories, args.output_dir)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        return resize_cli.build_job(path, args)._replace(output_path=output_path)
+
+    watcher = Watcher(directories, make_job, journal, workers,
+                      args.max_pending or workers * 4, args.interval, args.settle,
+                      exclude=[args.output_dir], report=report, memory_limit=args.memory_limit)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: watcher.stop())
+
+    print(f"监视 {', '.join(directories)} -> {args.output_dir}（已处理 {len(journal.records)} 个文件）")
+    try:
+        watcher.run(once=args.once)
+    finally:
+        journal.close()
+        if stats_log is not None:
+            stats_log.close()
+    print(f"共处理 {watcher.submitted} 个文件，成功 {watcher.succeeded} 个，失败 {watcher.failed} 个")
+    return 1 if watcher.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
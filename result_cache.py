@@ -0,0 +1,162 @@
+"""以输入内容哈希和调整参数为键的磁盘结果缓存，同一图像以相同参数再次调整时直接复制已有输出
+
+缓存目录下每个条目是一个文件 <键前两位>/<键><输出扩展名>。写入先写临时文件再原子重命名，
+命中时更新文件修改时间作为最近使用时间，超出容量时按修改时间从旧到新淘汰；
+多个进程可共用同一目录，读到正在被淘汰的条目时按未命中处理。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import PIL
+
+import resize_engine
+
+# 调整算法变化导致相同参数输出不同时递增，使旧条目失效
+CACHE_VERSION = 3
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class ResultCache:
+    """磁盘结果缓存；hits / misses / stores / evictions 为当前进程内的计数"""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # 同一进程内重复查询同一文件时不再重新计算哈希
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _digest(self, input_path: str) -> str:
+        """输入文件内容的 SHA-256，按 (路径, 修改时间, 文件大小) 缓存"""
+        stat = os.stat(input_path)
+        file_key = (os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if file_key in self._digests:
+                self._digests.move_to_end(file_key)
+                return self._digests[file_key]
+
+        digest = hashlib.sha256()
+        with open(input_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+
+        with self._lock:
+            self._digests[file_key] = digest.hexdigest()
+            while len(self._digests) > 1000:
+                self._digests.popitem(last=False)
+        return digest.hexdigest()
+
+    def key(self, input_path: str, params: dict) -> str:
+        """由输入内容和影响输出的参数（调整方式、目标、容差、输出格式等）计算缓存键"""
+        description = json.dumps(
+            {"input": self._digest(input_path), "params": params,
+             "version": CACHE_VERSION, "pillow": PIL.__version__},
+            sort_keys=True,
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2])
+
+    def _find(self, key: str) -> Optional[str]:
+        try:
+            names = os.listdir(self._entry_dir(key))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(key) and not name.endswith(".tmp"):
+                return os.path.join(self._entry_dir(key), name)
+        return None
+
+    def fetch(self, key: str, output_path: str) -> Optional[resize_engine.ResizeResult]:
+        """命中时把缓存的输出复制到 output_path（扩展名以缓存条目为准）并返回结果，未命中返回 None"""
+        entry = self._find(key)
+        if entry is not None:
+            output_path = os.path.splitext(output_path)[0] + os.path.splitext(entry)[1]
+            try:
+                shutil.copyfile(entry, output_path)
+                os.utime(entry)
+            except FileNotFoundError:
+                # 查找后被其他进程淘汰
+                entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        info = resize_engine.read_image_info(output_path)
+        return resize_engine.ResizeResult(output_path, info.size, info.dimensions, 0)
+
+    def store(self, key: str, result: resize_engine.ResizeResult) -> None:
+        """保存一次调整的输出文件，随后按容量淘汰最久未使用的条目"""
+        if os.path.getsize(result.output_path) > self.max_bytes:
+            return
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, open(result.output_path, "rb") as source:
+                shutil.copyfileobj(source, f)
+            os.replace(temp_path, os.path.join(entry_dir, key + os.path.splitext(result.output_path)[1]))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self.stores += 1
+        self.evict()
+
+    def _entries(self):
+        """缓存中全部条目的 (修改时间, 大小, 路径)"""
+        entries = []
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """删除最久未使用的条目直到总大小不超过 max_bytes；条目已被其他进程删除时跳过"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except (FileNotFoundError, PermissionError):
+                # 已被其他进程淘汰，或在 Windows 上正被读取
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def usage(self) -> Tuple[int, int]:
+        """当前缓存的 (条目数, 总字节数)"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
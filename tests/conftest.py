@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_photo(size, seed=0):
+    """带噪点和渐变的合成照片，JPEG 压缩特性接近真实照片"""
+    width, height = size
+    noise = Image.effect_noise((width // 4, height // 4), 40 + seed).resize(size)
+    gradient = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+
+
+def crash_on_poison(original):
+    """包装调整函数：文件名含 poison 时直接结束进程，模拟解码器崩溃（进程池以 fork 方式启动时工作进程继承替换）"""
+    def resize(input_path, *args, **kwargs):
+        if "poison" in os.path.basename(input_path):
+            os._exit(1)
+        return original(input_path, *args, **kwargs)
+    return resize
+
+
+@pytest.fixture(scope="session")
+def large_jpeg(tmp_path_factory):
+    """6000x4000 的 JPEG（24 MP，整图解码约 96 MB）"""
+    path = str(tmp_path_factory.mktemp("large") / "big.jpg")
+    make_photo((6000, 4000)).save(path, quality=90)
+    return path
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import resize_batch
+import resize_cli
+from conftest import crash_on_poison
+
+MB = 1024 * 1024
+
+
+def test_fit_job_budget_fits_estimate(large_jpeg):
+    job = resize_batch.ResizeJob(large_jpeg, "filesize", 300 * 1024)
+    assert resize_batch.job_memory(job) > 200 * MB
+    fitted, cost = resize_batch.fit_job(job, 200 * MB)
+    assert cost == 200 * MB
+    assert 0 < fitted.memory_budget < 200 * MB
+    assert resize_batch.job_memory(fitted) <= 200 * MB
+
+
+def test_cli_filesize_large_jpeg_under_memory_limit(large_jpeg, tmp_path):
+    second = str(tmp_path / "second.jpg")
+    with open(large_jpeg, "rb") as src, open(second, "wb") as dst:
+        dst.write(src.read())
+    output_dir = tmp_path / "out"
+    status = resize_cli.main([large_jpeg, second, "--target-size", "300KB", "--memory-limit", "200MB",
+                              "-j", "2", "--output-dir", str(output_dir)])
+    assert status == 0
+    sizes = [os.path.getsize(output_dir / name) for name in os.listdir(output_dir)]
+    assert len(sizes) == 2
+    assert all(size <= 300 * 1024 * 1.2 for size in sizes)
+
+
+@pytest.mark.parametrize("name, ratio, formats", [
+    ("photo.bmp", 0.5, ("JPEG",)),  # 原尺寸最高质量仍小于目标
+    ("photo.bmp", 0.01, ("JPEG",)),  # 需要缩小尺寸
+    ("alpha.png", 0.05, None),
+    ("alpha.png", 0.02, ("WEBP", "JPEG")),
+])
+def test_filesize_estimate_covers_tracked_peak(tmp_path, name, ratio, formats):
+    from conftest import make_photo
+
+    path = str(tmp_path / name)
+    img = make_photo((800, 600), seed=4)
+    (img.convert("RGBA") if name.endswith(".png") else img).save(path)
+    job = resize_batch.ResizeJob(path, "filesize", int(os.path.getsize(path) * ratio), 0.2,
+                                 str(tmp_path / ("out-" + name)), collect_stats=True, formats=formats)
+    outcome = resize_batch.run_job(job)
+    assert outcome.ok, outcome.error
+    assert outcome.stats.peak_image_bytes <= resize_batch.job_memory(job)
+
+
+def _dimension_jobs(tmp_path, names):
+    from PIL import Image
+    jobs = []
+    for name in names:
+        path = str(tmp_path / name)
+        Image.new("RGB", (64, 48), "red").save(path)
+        jobs.append(resize_batch.ResizeJob(path, "dimension", (32, 24), output_path=str(tmp_path / ("out-" + name))))
+    return jobs
+
+
+@pytest.mark.parametrize("memory_limit", [None, 256 * MB])
+def test_crashed_worker_reported_per_file(tmp_path, monkeypatch, memory_limit):
+    import resize_engine
+    monkeypatch.setattr(resize_engine, "resize_by_dimension", crash_on_poison(resize_engine.resize_by_dimension))
+    jobs = _dimension_jobs(tmp_path, ["a.png", "poison.png", "b.png", "c.png", "d.png"])
+    outcomes = list(resize_batch.run_batch(jobs, workers=2, chunksize=1, memory_limit=memory_limit))
+    assert [outcome.job for outcome in outcomes] == jobs
+    assert [outcome.ok for outcome in outcomes] == [True, False, True, True, True]
+    assert "异常退出" in outcomes[1].error
+
+
+def _unpicklable_result(original):
+    def resize(input_path, *args, **kwargs):
+        result = original(input_path, *args, **kwargs)
+        if "bad" in os.path.basename(input_path):
+            return result._replace(reason=lambda: None)  # 结果无法传回主进程
+        return result
+    return resize
+
+
+@pytest.mark.parametrize("memory_limit", [None, 256 * MB])
+def test_worker_exception_reported_per_file(tmp_path, monkeypatch, memory_limit):
+    import resize_engine
+    monkeypatch.setattr(resize_engine, "resize_by_dimension", _unpicklable_result(resize_engine.resize_by_dimension))
+    jobs = _dimension_jobs(tmp_path, ["a.png", "bad.png", "b.png", "c.png"])
+    outcomes = list(resize_batch.run_batch(jobs, workers=2, chunksize=1, memory_limit=memory_limit))
+    assert [outcome.job for outcome in outcomes] == jobs
+    assert [outcome.ok for outcome in outcomes] == [True, False, True, True]
+    assert outcomes[1].error
+
+
+def test_parallel_capped_at_available_cores(tmp_path, monkeypatch):
+    import resize_engine
+    calls = []
+
+    def resize(input_path, target, tolerance, output_path, **kwargs):
+        calls.append(kwargs["parallel"])
+        return resize_engine.ResizeResult(output_path, 1, (1, 1), 1)
+
+    monkeypatch.setattr(resize_engine, "resize_by_filesize", resize)
+    job = resize_batch.ResizeJob(str(tmp_path / "a.jpg"), "filesize", 10_000, parallel=4)
+    for cores, expected in ((1, 1), (2, 2), (8, 4)):
+        monkeypatch.setattr(resize_batch, "default_workers", lambda: cores)
+        assert job.search_parallel == expected
+        assert resize_batch.run_job(job).ok
+    assert calls == [1, 2, 4]
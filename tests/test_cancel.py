@@ -0,0 +1,44 @@
+import os
+import threading
+
+import pytest
+
+import resize_engine
+from conftest import make_photo
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    make_photo((1600, 1200)).save(path, quality=95)
+    return path
+
+
+def test_cancel_before_start_writes_nothing(photo, tmp_path):
+    cancel = threading.Event()
+    cancel.set()
+    output_path = str(tmp_path / "out.jpg")
+    with pytest.raises(resize_engine.ResizeCancelled):
+        resize_engine.resize_by_filesize(photo, 40_000, 0.05, output_path, cancel=cancel)
+    with pytest.raises(resize_engine.ResizeCancelled):
+        resize_engine.resize_by_dimension(photo, (800, 600), output_path, cancel=cancel)
+    assert not os.path.exists(output_path)
+
+
+@pytest.mark.parametrize("parallel", [1, 3])
+def test_cancel_during_search_stops_at_next_encode(photo, tmp_path, parallel):
+    cancel = threading.Event()
+    events = []
+
+    def progress(event):
+        events.append(event)
+        cancel.set()
+
+    output_path = str(tmp_path / "out.jpg")
+    with pytest.raises(resize_engine.ResizeCancelled):
+        resize_engine.resize_by_filesize(photo, 40_000, 0.01, output_path, progress=progress, cancel=cancel,
+                                         predict=False, parallel=parallel)
+    # 设置取消后最多完成当前一轮并发编码
+    assert 1 <= len(events) <= parallel
+    assert not os.path.exists(output_path)
+    assert os.listdir(tmp_path) == ["photo.jpg"]
@@ -0,0 +1,54 @@
+import math
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import resize_engine
+from conftest import make_photo
+
+
+def _psnr(a, b):
+    diff = ImageStat.Stat(ImageChops.difference(a.convert("RGB"), b.convert("RGB")))
+    mse = sum(value ** 2 for value in diff.rms) / 3
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    make_photo((1600, 1200)).save(path, quality=95)
+    return path
+
+
+@pytest.mark.parametrize("target, gap", [((200, 150), 2.0), ((300, 200), 3.0), ((800, 600), 2.0)])
+def test_draft_decodes_at_least_gap_times_target(photo, target, gap):
+    request = resize_engine._decode_request(photo, target, gap)
+    assert request == (math.ceil(target[0] * gap), math.ceil(target[1] * gap))
+    with Image.open(photo) as img:
+        resize_engine.draft_for(img, target, gap)
+        img.load()
+        assert request[0] <= img.size[0] and request[1] <= img.size[1]
+        # DCT 降采样按 1/2、1/4、1/8 取最接近请求尺寸的一档
+        assert img.size[0] < request[0] * 2 or img.size == (1600, 1200)
+
+
+def test_draft_skipped_without_gap_or_for_non_jpeg(photo, tmp_path):
+    assert resize_engine._decode_request(photo, (200, 150), None) == (1600, 1200)
+    with Image.open(photo) as img:
+        resize_engine.draft_for(img, (200, 150), None)
+        assert img.size == (1600, 1200)
+    png = str(tmp_path / "photo.png")
+    make_photo((400, 300)).save(png)
+    with Image.open(png) as img:
+        resize_engine.draft_for(img, (50, 40), 2.0)
+        img.load()
+        assert img.size == (400, 300)
+
+
+@pytest.mark.parametrize("target", [(200, 150), (400, 300)])
+def test_draft_output_matches_full_decode(photo, tmp_path, target):
+    fast = resize_engine.resize_by_dimension(photo, target, str(tmp_path / "fast.png"))
+    full = resize_engine.resize_by_dimension(photo, target, str(tmp_path / "full.png"), reducing_gap=None)
+    assert fast.dimensions == full.dimensions == target
+    with Image.open(fast.output_path) as a, Image.open(full.output_path) as b:
+        assert _psnr(a, b) > 35
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+from PIL import Image
+
+import resize_cli
+import resize_engine
+from conftest import make_photo
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_engine_and_cli_do_not_import_tkinter():
+    code = "import sys, resize_cli, resize_engine; print(sorted(m for m in sys.modules if m.startswith('tkinter')))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_resize_by_dimension_result_matches_file(tmp_path):
+    input_path = str(tmp_path / "photo.jpg")
+    make_photo((640, 480)).save(input_path, quality=90)
+
+    result = resize_engine.resize_by_dimension(input_path, (320, 200))
+    assert result.output_path == resize_engine.get_output_path(input_path) == str(tmp_path / "photo_resized.jpg")
+    assert result.size == os.path.getsize(result.output_path)
+    assert result.dimensions == (320, 200)
+    with Image.open(result.output_path) as img:
+        assert img.size == (320, 200) and img.format == "JPEG"
+
+
+def test_converts_to_jpeg_only_for_non_output_formats():
+    assert not resize_engine.converts_to_jpeg("a.jpg")
+    assert not resize_engine.converts_to_jpeg("a.bmp")
+    assert resize_engine.converts_to_jpeg("a.tif")
+
+
+def test_cli_processes_directory_without_gui(tmp_path, capsys):
+    source = tmp_path / "in"
+    source.mkdir()
+    for i in range(3):
+        make_photo((200, 150), seed=i).save(source / f"p{i}.png")
+    (source / "notes.txt").write_text("x")
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    status = resize_cli.main([str(source), "--size", "100x75", "--output-dir", str(output_dir), "-j", "1"])
+    assert status == 0
+    names = sorted(os.listdir(output_dir))
+    assert names == [f"p{i}_resized.png" for i in range(3)]
+    for name in names:
+        with Image.open(output_dir / name) as img:
+            assert img.size == (100, 75)
+    assert "成功 3 个，失败 0 个" in capsys.readouterr().out
+
+
+def test_cli_reports_failures_with_nonzero_status(tmp_path, capsys):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    assert resize_cli.main([str(broken), "--size", "10x10", "-j", "1"]) == 1
+    assert "失败 1 个" in capsys.readouterr().out
@@ -0,0 +1,14 @@
+import os
+
+import resize_engine
+from conftest import make_photo
+
+
+def test_target_above_max_quality_is_not_upscaled(tmp_path):
+    # 原尺寸最高质量的 JPEG 仍远小于目标：返回原尺寸结果，不放大
+    input_path = str(tmp_path / "photo.bmp")
+    make_photo((1024, 768)).save(input_path)
+    target = os.path.getsize(input_path) // 2
+    result = resize_engine.resize_by_filesize(input_path, target, 0.2, str(tmp_path / "out.jpg"), formats=["JPEG"])
+    assert result.dimensions == (1024, 768)
+    assert result.size < target
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+import resize_engine
+from conftest import make_photo
+
+
+def test_resolve_formats_dedupes_case_insensitively():
+    formats = resize_engine.resolve_formats(["jpeg", "JPEG", "Webp", "webp"], resize_engine.OUTPUT_FORMATS["PNG"])
+    assert [f.name for f in formats] == ["JPEG", "WEBP"]
+
+
+def test_resolve_formats_rejects_unknown():
+    with pytest.raises(Exception, match="TIFF"):
+        resize_engine.resolve_formats(["jpeg", "tiff"], resize_engine.OUTPUT_FORMATS["JPEG"])
+
+
+def test_palette_format_skipped_when_lossy_fits_at_full_scale():
+    img = make_photo((400, 300), seed=1)
+    choices = resize_engine.resolve_formats(["png", "jpeg"], resize_engine.OUTPUT_FORMATS["JPEG"])
+    winner, candidates, reason = resize_engine.search_formats(img, choices, 40_000, 0.2)
+    assert [c.format.name for c in candidates] == ["JPEG"]
+    assert winner.dimensions == img.size
+    assert "PNG" in reason and "未搜索" in reason
+
+
+def test_palette_format_searched_when_lossy_needs_scaling():
+    img = Image.new("RGB", (400, 300), "white")
+    img.paste((200, 30, 30), (50, 50, 350, 250))
+    choices = resize_engine.resolve_formats(["jpeg", "png"], resize_engine.OUTPUT_FORMATS["JPEG"])
+    winner, candidates, _ = resize_engine.search_formats(img, choices, 1000, 0.2)
+    assert sorted(c.format.name for c in candidates) == ["JPEG", "PNG"]
+    assert winner.format.name == "PNG"
+
+
+def test_same_scale_candidates_ranked_by_similarity_not_quality_setting():
+    img = make_photo((600, 400), seed=2)
+    target = 30_000
+    choices = resize_engine.resolve_formats(["jpeg", "webp"], resize_engine.OUTPUT_FORMATS["JPEG"])
+    winner, candidates, reason = resize_engine.search_formats(img, choices, target, 0.2)
+    assert all(c.dimensions == img.size and c.size <= target * 1.2 for c in candidates)
+    scorer = resize_engine.SimilarityScorer(img)
+    scores = {c.format.name: scorer.similarity(c.probe.decode()) for c in candidates}
+    assert scores[winner.format.name] == max(scores.values())
+    assert winner.similarity == pytest.approx(scores[winner.format.name])
+    assert "SSIM" in reason
+
+
+def _graphic(size):
+    img = Image.new("RGB", size, (240, 240, 230))
+    draw = ImageDraw.Draw(img)
+    for i in range(10):
+        x, y = i * 37 % size[0], i * 53 % size[1]
+        draw.rectangle((x, y, x + 150, y + 90), fill=(i * 25, 90, 200 - i * 15))
+    for row in range(0, size[1], 24):
+        draw.text((10, row), "imageSizeTool " * 6, fill=(20, 20, 20))
+    return img
+
+
+def _alpha(size):
+    img = make_photo(size, seed=1).convert("RGBA")
+    width, height = size
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse((width // 10, height // 10, width * 9 // 10, height * 9 // 10), fill=255)
+    img.putalpha(mask.filter(ImageFilter.GaussianBlur(8)))
+    return img
+
+
+@pytest.mark.parametrize("name, image, ratio, expected_format", [
+    ("graphic.bmp", lambda: _graphic((640, 480)), 0.15, "JPEG"),
+    ("graphic.bmp", lambda: _graphic((640, 480)), 0.03, "JPEG"),
+    ("photo.png", lambda: make_photo((640, 480), seed=2), 0.15, "JPEG"),
+    ("alpha.png", lambda: _alpha((480, 360)), 0.8, "PNG"),  # 256 色原尺寸低于目标：缩小尺寸的无损 PNG
+    ("alpha.png", lambda: _alpha((480, 360)), 0.4, "PNG"),
+])
+def test_default_format_routing_lands_in_tolerance(tmp_path, name, image, ratio, expected_format):
+    input_path = str(tmp_path / name)
+    image().save(input_path)
+    target = int(os.path.getsize(input_path) * ratio)
+    extension = os.path.splitext(name)[1]
+    result = resize_engine.resize_by_filesize(input_path, target, 0.2, str(tmp_path / f"out{extension}"))
+    assert os.path.splitext(result.output_path)[1] == resize_engine.OUTPUT_FORMATS[expected_format].extension
+    assert target * 0.8 <= result.size <= target * 1.2
+
+
+def test_lossless_png_kept_when_jpeg_cannot_reach_target(tmp_path):
+    # 无损 PNG 不超出目标、JPEG 原尺寸最高质量也达不到目标下限：保留原尺寸的无损 PNG
+    input_path = str(tmp_path / "graphic.bmp")
+    _graphic((640, 480)).save(input_path)
+    target = int(os.path.getsize(input_path) * 0.4)
+    result = resize_engine.resize_by_filesize(input_path, target, 0.2, str(tmp_path / "out.bmp"))
+    assert result.output_path.endswith(".png")
+    assert result.dimensions == (640, 480) and result.size <= target
+    with Image.open(result.output_path) as output:
+        assert output.mode == "RGB"
@@ -0,0 +1,25 @@
+import os
+
+from PIL import Image
+
+import resize_engine
+
+
+def test_literal_paths_not_globbed(tmp_path):
+    bracketed = str(tmp_path / "photo[1].jpg")
+    plain = str(tmp_path / "photo1.jpg")
+    for path in (bracketed, plain):
+        Image.new("RGB", (10, 10)).save(path)
+
+    assert resize_engine.expand_inputs([bracketed], wildcards=False) == [os.path.normpath(bracketed)]
+    # 命令行仍按通配符展开：[1] 匹配 photo1.jpg
+    assert resize_engine.expand_inputs([bracketed]) == [os.path.normpath(plain)]
+
+
+def test_literal_directories_still_expanded(tmp_path):
+    folder = tmp_path / "album [2024]"
+    folder.mkdir()
+    Image.new("RGB", (10, 10)).save(folder / "a.png")
+    (folder / "notes.txt").write_text("x")
+
+    assert resize_engine.expand_inputs([str(folder)], wildcards=False) == [os.path.normpath(str(folder / "a.png"))]
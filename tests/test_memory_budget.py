@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import resize_engine
+from conftest import make_photo
+
+MB = 1024 * 1024
+
+# 子进程中按预算处理一次，输出导入模块后的基线和处理后的峰值 RSS（KB）
+STREAM_SCRIPT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import resize_engine
+
+def peak_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+
+baseline = peak_kb()
+resize_engine.resize_by_dimension(sys.argv[2], (1200, 800), sys.argv[3], memory_budget=int(sys.argv[4]))
+print(json.dumps({"baseline_kb": baseline, "peak_kb": peak_kb()}))
+"""
+
+
+@pytest.mark.parametrize("budget_mb", [32, 64, 128])
+def test_filesize_large_jpeg_within_budget(large_jpeg, tmp_path, budget_mb):
+    stats = resize_engine.JobStats(large_jpeg, "filesize")
+    result = resize_engine.resize_by_filesize(large_jpeg, 300 * 1024, 0.2, str(tmp_path / "out.jpg"),
+                                              memory_budget=budget_mb * MB, stats=stats)
+    assert abs(result.size - 300 * 1024) <= 0.2 * 300 * 1024
+    assert stats.peak_image_bytes <= budget_mb * MB
+
+
+def test_working_image_uses_largest_fitting_draft_scale(large_jpeg):
+    # 预算放不下整图但放得下 1/2 降采样解码时，工作图像取解码尺寸，不放大也不退到更小的尺寸
+    stats = resize_engine.JobStats(large_jpeg, "filesize")
+    img = resize_engine.load_working_image(large_jpeg, 64 * MB, stats=stats)
+    assert img.size == (3000, 2000)
+    assert stats.peak_image_bytes <= 64 * MB
+
+
+def test_dimension_large_jpeg_within_budget(large_jpeg, tmp_path):
+    stats = resize_engine.JobStats(large_jpeg, "dimension")
+    result = resize_engine.resize_by_dimension(large_jpeg, (1200, 800), str(tmp_path / "out.jpg"),
+                                               memory_budget=8 * MB, stats=stats)
+    assert result.dimensions == (1200, 800)
+    assert stats.peak_image_bytes <= 8 * MB
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="需要 /proc 读取峰值 RSS")
+def test_streamed_decode_peak_rss_within_budget(tmp_path):
+    # PPM 不能降采样解码，只能分条带读取；整图解码约 96 MB
+    input_path = str(tmp_path / "big.ppm")
+    make_photo((6000, 4000)).save(input_path)
+    budget = 32 * MB
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, "-c", STREAM_SCRIPT, root, input_path,
+                                      str(tmp_path / "out.png"), str(budget)])
+    rss = json.loads(output)
+    assert (rss["peak_kb"] - rss["baseline_kb"]) * 1024 <= budget
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.005])
+def test_filesize_search_copies_within_budget(tmp_path, ratio):
+    # 0.5: 原尺寸最高质量仍小于目标；0.005: 需要缩小尺寸，搜索中同时存在工作图像和缩放副本
+    input_path = str(tmp_path / "photo.bmp")
+    make_photo((2000, 1500)).save(input_path)
+    stats = resize_engine.JobStats(input_path, "filesize")
+    result = resize_engine.resize_by_filesize(input_path, int(os.path.getsize(input_path) * ratio), 0.2,
+                                              str(tmp_path / "out.jpg"), formats=["JPEG"], memory_budget=8 * MB,
+                                              stats=stats)
+    assert result.dimensions[0] <= 2000 and result.dimensions[1] <= 1500
+    assert stats.peak_image_bytes <= 8 * MB
+
+
+def test_multi_format_alpha_search_within_budget(tmp_path):
+    # 保留透明通道的工作图像之外，JPEG 还需要一份合成背景的副本
+    input_path = str(tmp_path / "alpha.tif")
+    make_photo((2000, 1500)).convert("RGBA").save(input_path, compression="raw")
+    stats = resize_engine.JobStats(input_path, "filesize")
+    result = resize_engine.resize_by_filesize(input_path, 30 * 1024, 0.2, str(tmp_path / "out.png"),
+                                              formats=["WEBP", "JPEG"], memory_budget=8 * MB, stats=stats)
+    assert result.dimensions[0] < 2000
+    assert stats.peak_image_bytes <= 8 * MB
+
+
+def test_gigapixel_ppm_streams_past_pillow_pixel_limit(tmp_path):
+    # 1.8 亿像素超过 Pillow 的解压炸弹上限（约 1.79 亿）；稀疏文件，像素全为 0
+    width, height = 20000, 9000
+    input_path = str(tmp_path / "scan.ppm")
+    with open(input_path, "wb") as f:
+        header = f"P6 {width} {height} 255\n".encode()
+        f.write(header)
+        f.truncate(len(header) + width * height * 3)
+    stats = resize_engine.JobStats(input_path, "dimension")
+    result = resize_engine.resize_by_dimension(input_path, (1000, 450), str(tmp_path / "out.png"),
+                                               memory_budget=64 * MB, stats=stats)
+    assert result.dimensions == (1000, 450)
+    assert stats.peak_image_bytes <= 64 * MB
+    assert resize_engine.read_image_info(input_path).dimensions == (width, height)
+
+
+def test_cli_rejects_compressed_tiff_over_budget(tmp_path, capsys):
+    import resize_cli
+
+    input_path = str(tmp_path / "scan.tif")
+    make_photo((2000, 1500)).save(input_path, compression="tiff_lzw")
+    assert resize_engine.budget_error(input_path, 64 * MB) is None
+    code = resize_cli.main([input_path, "--size", "400x300", "--memory-budget", "4MB",
+                            "--output-dir", str(tmp_path / "out"), "-j", "1"])
+    assert code == 1
+    error = capsys.readouterr().err
+    assert "tiff_lzw" in error and "未压缩" in error
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+from PIL import Image
+
+import resize_engine
+from conftest import make_photo
+
+
+def test_repeated_reads_hit_cache(tmp_path):
+    path = str(tmp_path / "photo.png")
+    make_photo((120, 90)).save(path)
+    cache = resize_engine.MetadataCache()
+
+    first = cache.get(path)
+    assert first.dimensions == (120, 90) and first.format == "PNG" and first.size == os.path.getsize(path)
+    assert cache.get(path) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_mtime_change_invalidates_same_size_rewrite(tmp_path):
+    # 两张 BMP 的像素数据等长，替换后只有修改时间不同
+    path = str(tmp_path / "image.bmp")
+    Image.new("RGB", (100, 40), "red").save(path)
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    cache = resize_engine.MetadataCache()
+    assert cache.get(path).dimensions == (100, 40)
+
+    size = os.path.getsize(path)
+    Image.new("RGB", (40, 100), "blue").save(path)
+    assert os.path.getsize(path) == size
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert cache.get(path).dimensions == (100, 40)  # 键未变化，仍是缓存的旧信息
+
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert cache.get(path).dimensions == (40, 100)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_size_change_invalidates_and_unreadable_files_cached(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    make_photo((64, 48)).save(path)
+    stat = os.stat(path)
+    cache = resize_engine.MetadataCache()
+    assert cache.get(path).dimensions == (64, 48)
+
+    make_photo((128, 96)).save(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get(path).dimensions == (128, 96)
+
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    assert cache.get(str(broken)) is None
+    assert cache.get(str(broken)) is None
+    assert cache.hits == 1
+    assert cache.get(str(tmp_path / "missing.jpg")) is None
+
+
+def test_read_image_info_uses_shared_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(resize_engine, "metadata_cache", resize_engine.MetadataCache())
+    path = str(tmp_path / "photo.png")
+    make_photo((50, 40)).save(path)
+    assert resize_engine.read_image_info(path).dimensions == (50, 40)
+    assert resize_engine.read_image_info(path).dimensions == (50, 40)
+    assert resize_engine.metadata_cache.hits == 1
+    with pytest.raises(Exception, match="无法识别"):
+        resize_engine.read_image_info(str(tmp_path / "missing.png"))
@@ -0,0 +1,58 @@
+import io
+
+import pytest
+from PIL import Image
+
+import resize_engine
+from conftest import make_photo
+
+
+def _jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def test_identical_image_scores_one():
+    img = make_photo((640, 480), seed=4)
+    assert resize_engine.SimilarityScorer(img).similarity(img.copy()) == pytest.approx(1.0)
+
+
+def test_degraded_encodes_score_lower():
+    img = make_photo((640, 480), seed=4)
+    scorer = resize_engine.SimilarityScorer(img)
+    high, low = scorer.similarity(_jpeg(img, 90)), scorer.similarity(_jpeg(img, 10))
+    downscaled = scorer.similarity(img.resize((320, 240), Image.Resampling.LANCZOS))
+    assert low < high < 1.0
+    assert downscaled < 1.0
+
+
+def test_scores_memoized_per_quality_and_scale():
+    img = make_photo((640, 480), seed=4)
+    scorer = resize_engine.SimilarityScorer(img)
+    decodes = []
+
+    def decode(quality):
+        def run():
+            decodes.append(quality)
+            return _jpeg(img, quality)
+        return run
+
+    first = scorer.score((30, 1.0), decode(30))
+    assert scorer.score((30, 1.0), decode(30)) == first
+    scorer.score((30, 0.5), decode(30))
+    scorer.score((60, 1.0), decode(60))
+    assert decodes == [30, 30, 60]
+
+
+@pytest.mark.parametrize("target", [20_000, 40_000])
+def test_perceptual_search_in_tolerance_with_higher_ssim(target):
+    img = make_photo((800, 600), seed=4)
+    choices = resize_engine.resolve_formats(["jpeg"], resize_engine.OUTPUT_FORMATS["JPEG"])
+    default = resize_engine.search_formats(img, choices, target, 0.2)[0]
+    perceptual = resize_engine.search_formats(img, choices, target, 0.2, perceptual=True)[0]
+    assert target * 0.8 <= perceptual.size <= target * 1.2
+    scorer = resize_engine.SimilarityScorer(img)
+    assert perceptual.similarity == pytest.approx(scorer.similarity(perceptual.probe.decode()))
+    assert perceptual.similarity >= scorer.similarity(default.probe.decode())
@@ -0,0 +1,58 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image, ImageChops
+
+import resize_engine
+from conftest import make_photo
+
+
+def test_shared_view_shares_pixels_not_encoder_state():
+    img = make_photo((64, 48))
+    img.load()
+    view = resize_engine._shared_view(img)
+    assert view is not img and view.size == img.size and view.mode == img.mode
+    view.putpixel((0, 0), (1, 2, 3))
+    assert img.getpixel((0, 0)) == (1, 2, 3)
+    view.save(io.BytesIO(), format="JPEG", quality=10)
+    assert "quality" not in getattr(img, "encoderinfo", {})
+
+
+def test_concurrent_encodes_match_sequential():
+    img = make_photo((320, 240), seed=3)
+    qualities = [20, 40, 60, 80] * 2
+    sequential = [resize_engine.EncodeProbe("JPEG").measure(img, q) for q in qualities]
+    probe = resize_engine.EncodeProbe("JPEG")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        concurrent = [size for size, _ in probe.measure_many(img, qualities, executor)]
+    assert concurrent == sequential
+
+
+def _same(a, b):
+    return a.mode == b.mode and a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+@pytest.mark.parametrize("name, mode, options", [
+    ("ppm", "RGB", {}),
+    ("bmp", "RGB", {}),  # 自下而上存储
+    ("bmp", "P", {}),
+    ("tiff", "RGBA", {"tiffinfo": {278: 10}}),  # 每 10 行一个条带分块
+    ("tiff", "L", {"compression": "raw"}),
+])
+def test_load_band_matches_full_decode(tmp_path, monkeypatch, name, mode, options):
+    monkeypatch.setattr(resize_engine, "BAND_READ_BYTES", 1000)
+    source = make_photo((150, 97), seed=5)
+    source = source.convert("RGBA") if mode == "RGBA" else source.convert(mode)
+    path = str(tmp_path / f"source.{name}")
+    source.save(path, **options)
+
+    with Image.open(path) as full:
+        assert resize_engine._streamable(full)
+        full.load()
+        for y0, y1 in ((0, 97), (0, 1), (13, 58), (96, 97)):
+            band = resize_engine._load_band(path, y0, y1)
+            expected = full.crop((0, y0, full.width, y1))
+            if mode == "P":
+                band, expected = band.convert("RGB"), expected.convert("RGB")
+            assert _same(band, expected), (y0, y1)
@@ -0,0 +1,57 @@
+import io
+import math
+
+import pytest
+from PIL import Image
+
+import resize_engine
+from conftest import make_photo
+
+
+def _jpeg_size(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=quality)
+    return buffer.tell()
+
+
+@pytest.fixture(scope="module")
+def photo():
+    return make_photo((2000, 1500), seed=3)
+
+
+def test_sampled_curve_matches_full_encodes(photo):
+    curve, scale_exponent = resize_engine.predict_samples(photo)
+    assert [quality for quality, _ in curve] == list(resize_engine.PREDICT_QUALITIES)
+    for quality, log_size in curve:
+        assert math.exp(log_size) == pytest.approx(_jpeg_size(photo, quality), rel=0.15)
+
+    proxy = photo.resize((1000, 750), Image.Resampling.LANCZOS)
+    quality = resize_engine.PREDICT_REFERENCE_QUALITY
+    measured = math.log(_jpeg_size(photo, quality) / _jpeg_size(proxy, quality)) / math.log(2)
+    assert scale_exponent == pytest.approx(measured, abs=0.3)
+
+
+@pytest.mark.parametrize("ratio", [0.4, 0.15, 0.06, 0.02])
+def test_predicted_start_lands_near_target(photo, ratio):
+    target = int(_jpeg_size(photo, 95) * ratio)
+    prediction = resize_engine.predict_start(photo, target)
+    work = photo
+    if prediction.scale < 1:
+        work = photo.resize(resize_engine.scaled_dimensions(photo.size, prediction.scale), Image.Resampling.LANCZOS)
+    assert _jpeg_size(work, prediction.quality) == pytest.approx(target, rel=0.25)
+
+
+def test_small_images_not_predicted():
+    assert resize_engine.predict_start(make_photo((200, 150)), 5_000) is None
+
+
+def test_prediction_saves_full_size_encodes(tmp_path):
+    input_path = str(tmp_path / "photo.jpg")
+    make_photo((2000, 1500), seed=3).save(input_path, quality=95)
+    output_path = str(tmp_path / "out.jpg")
+    for ratio in (0.25, 0.03):
+        target = int(tmp_path.joinpath("photo.jpg").stat().st_size * ratio)
+        cold = resize_engine.resize_by_filesize(input_path, target, 0.1, output_path, predict=False)
+        predicted = resize_engine.resize_by_filesize(input_path, target, 0.1, output_path)
+        assert target * 0.9 <= predicted.size <= target * 1.1
+        assert predicted.encodes < cold.encodes
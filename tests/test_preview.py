@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from PIL import Image
+
+import resize_engine
+from conftest import make_photo
+
+
+@pytest.fixture(scope="module")
+def photo(tmp_path_factory):
+    # 逐像素的颗粒噪声：缩小后的编码大小对缩放滤波器敏感
+    path = str(tmp_path_factory.mktemp("preview") / "photo.jpg")
+    grain = Image.effect_noise((3000, 2000), 30).convert("RGB")
+    Image.blend(make_photo((3000, 2000), seed=3), grain, 0.15).save(path, quality=90)
+    return path
+
+
+@pytest.fixture(scope="module")
+def pyramid(photo):
+    return resize_engine.build_preview(photo)
+
+
+def test_pyramid_levels(pyramid):
+    assert pyramid.size == (3000, 2000) and pyramid.format == "JPEG"
+    assert all(max(level.size) <= resize_engine.PREVIEW_MAX_SIDE for level in pyramid.levels)
+    scales = [scale for scale, _ in pyramid.samples]
+    assert scales[0] == 1.0 and scales == sorted(scales, reverse=True)
+    assert min(pyramid.levels[-1].size) >= 1 and max(pyramid.levels[-1].size) >= resize_engine.PREVIEW_MIN_SIDE // 2
+
+
+@pytest.mark.parametrize("dimensions", [(2800, 1867), (1777, 1185), (1200, 800), (640, 427), (200, 133)])
+def test_dimension_plan_predicts_output_size(photo, pyramid, tmp_path, dimensions):
+    plan = pyramid.plan_dimension(dimensions)
+    actual = resize_engine.resize_by_dimension(photo, dimensions, str(tmp_path / "out.jpg"))
+    assert plan.dimensions == actual.dimensions
+    assert plan.predicted_size == pytest.approx(actual.size, rel=0.08)
+
+
+@pytest.mark.parametrize("ratio", [0.8, 0.5, 0.1, 0.03, 0.01])
+def test_filesize_plan_predicts_search_result(photo, pyramid, tmp_path, ratio):
+    # 实际搜索在容差范围内的任意位置停止，预测以目标为准，误差不超过容差
+    target = int(os.path.getsize(photo) * ratio)
+    plan = pyramid.plan_filesize(resize_engine.output_format_for(photo), target, 0.2)
+    actual = resize_engine.resize_by_filesize(photo, target, 0.2, str(tmp_path / "out.jpg"))
+    assert plan.in_tolerance
+    assert plan.predicted_size == pytest.approx(target, rel=0.06)
+    assert plan.predicted_size == pytest.approx(actual.size, rel=0.2)
+    assert plan.dimensions[0] == pytest.approx(actual.dimensions[0], rel=0.03)
+
+
+def test_render_fits_box(pyramid):
+    plan = pyramid.plan_dimension((1500, 1000))
+    assert pyramid.render(plan, (480, 240)).size == (360, 240)
+    small = pyramid.plan_dimension((300, 200))
+    assert pyramid.render(small, (480, 240)).size == (300, 200)
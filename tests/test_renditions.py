@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+import resize_engine
+from conftest import make_photo
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    make_photo((1600, 1200)).save(path, quality=90)
+    return path
+
+
+@pytest.mark.parametrize("max_bytes", [30_000, 1200, 900])
+def test_max_bytes_rendition_never_exceeds_limit(photo, tmp_path, max_bytes):
+    result, = resize_engine.resize_renditions(photo, [resize_engine.Rendition(800, None, max_bytes)], str(tmp_path))
+    assert result.size <= max_bytes
+    assert os.path.getsize(result.output_path) == result.size
+
+
+def test_unreachable_max_bytes_raises(photo, tmp_path):
+    with pytest.raises(Exception, match="无法不超过"):
+        resize_engine.resize_renditions(photo, [resize_engine.Rendition(800, None, 600)], str(tmp_path))
+
+
+@pytest.mark.parametrize("renditions, template", [
+    ([resize_engine.Rendition(800), resize_engine.Rendition(800, None, 30_000)], resize_engine.RENDITION_TEMPLATE),
+    ([resize_engine.Rendition(800), resize_engine.Rendition(800, 300)], "{stem}-{width}{ext}"),
+])
+def test_duplicate_output_paths_rejected(photo, tmp_path, renditions, template):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    with pytest.raises(Exception, match="同名"):
+        resize_engine.resize_renditions(photo, renditions, str(output_dir), template)
+    assert not os.listdir(output_dir)
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+
+import pytest
+from PIL import Image
+
+import resize_engine
+import result_cache
+from conftest import make_photo
+
+
+def _output(tmp_path, name, size=(64, 48), seed=0):
+    path = str(tmp_path / name)
+    make_photo(size, seed).save(path)
+    with Image.open(path) as img:
+        dimensions = img.size
+    return resize_engine.ResizeResult(path, os.path.getsize(path), dimensions, 1)
+
+
+def _input(tmp_path, name="input.jpg", seed=0):
+    path = str(tmp_path / name)
+    make_photo((80, 60), seed).save(path)
+    return path
+
+
+def test_counters_track_hits_misses_stores_and_evictions(tmp_path):
+    output = _output(tmp_path, "out.png")
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=output.size * 2)
+    source = _input(tmp_path)
+    keys = [cache.key(source, {"mode": "dimension", "size": i}) for i in range(3)]
+
+    assert cache.fetch(keys[0], str(tmp_path / "copy.png")) is None
+    cache.store(keys[0], output)
+    fetched = cache.fetch(keys[0], str(tmp_path / "copy.png"))
+    assert fetched.dimensions == output.dimensions and fetched.size == output.size
+    for key in keys[1:]:
+        cache.store(key, output)
+    assert (cache.hits, cache.misses, cache.stores, cache.evictions) == (1, 1, 3, 1)
+    assert cache.usage()[1] <= cache.max_bytes
+
+
+def test_eviction_removes_least_recently_used_and_fetch_refreshes(tmp_path):
+    output = _output(tmp_path, "out.png")
+    cache = result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=output.size * 2)
+    source = _input(tmp_path)
+    keys = [cache.key(source, {"index": i}) for i in range(3)]
+    cache.store(keys[0], output)
+    cache.store(keys[1], output)
+    # 条目 0 最旧，随后被读取，应成为最近使用
+    os.utime(cache._find(keys[0]), ns=(1_000_000_000, 1_000_000_000))
+    os.utime(cache._find(keys[1]), ns=(2_000_000_000, 2_000_000_000))
+    assert cache.fetch(keys[0], str(tmp_path / "copy.png")) is not None
+
+    cache.store(keys[2], output)
+    assert cache._find(keys[0]) is not None
+    assert cache._find(keys[1]) is None
+    assert cache._find(keys[2]) is not None
+    assert cache.evictions == 1
+
+
+def test_fetch_uses_cached_extension(tmp_path):
+    # 按文件大小调整时输出格式可能与请求的扩展名不同，命中时以缓存条目的扩展名为准
+    output = _output(tmp_path, "out.jpg")
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    key = cache.key(_input(tmp_path), {"mode": "filesize", "target": 10_000})
+    cache.store(key, output)
+
+    fetched = cache.fetch(key, str(tmp_path / "result.png"))
+    assert fetched.output_path == str(tmp_path / "result.jpg")
+    assert not os.path.exists(tmp_path / "result.png")
+    with Image.open(fetched.output_path) as img:
+        assert img.format == "JPEG"
+
+
+def test_key_depends_on_params_version_and_content(tmp_path, monkeypatch):
+    cache = result_cache.ResultCache(str(tmp_path / "cache"))
+    source = _input(tmp_path)
+    params = {"mode": "filesize", "target": 10_000, "tolerance": 0.2}
+    key = cache.key(source, params)
+    assert cache.key(source, dict(params)) == key
+    assert cache.key(source, dict(params, target=20_000)) != key
+
+    monkeypatch.setattr(result_cache, "CACHE_VERSION", result_cache.CACHE_VERSION + 1)
+    assert cache.key(source, params) != key
+    monkeypatch.undo()
+
+    make_photo((80, 60), seed=9).save(source)
+    os.utime(source, ns=(3_000_000_000, 3_000_000_000))
+    assert cache.key(source, params) != key
+
+
+def _churn(directory, max_bytes, outputs, source, worker, errors):
+    cache = result_cache.ResultCache(directory, max_bytes)
+    try:
+        for i in range(40):
+            key = cache.key(source, {"index": i % 6})
+            result = cache.fetch(key, os.path.join(os.path.dirname(source), f"fetched{worker}.png"))
+            if result is None:
+                cache.store(key, outputs[i % len(outputs)])
+            else:
+                assert result.dimensions == outputs[0].dimensions
+            cache.evict()
+    except Exception as e:
+        errors.put(repr(e))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="需要 fork")
+def test_concurrent_processes_share_directory(tmp_path):
+    outputs = [_output(tmp_path, f"out{i}.png", seed=i) for i in range(3)]
+    directory = str(tmp_path / "cache")
+    max_bytes = max(o.size for o in outputs) * 3
+    result_cache.ResultCache(directory, max_bytes)
+    source = _input(tmp_path)
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [context.Process(target=_churn, args=(directory, max_bytes, outputs, source, n, errors))
+               for n in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    assert errors.empty()
+
+    cache = result_cache.ResultCache(directory, max_bytes)
+    assert cache.usage()[1] <= max_bytes
+    assert not [name for _, _, files in os.walk(directory) for name in files if name.endswith(".tmp")]
@@ -0,0 +1,38 @@
+import http.client
+import io
+import threading
+
+import pytest
+
+import resize_server
+from conftest import make_photo
+
+
+@pytest.fixture
+def server():
+    service = resize_server.ResizeService(workers=1)
+    server = resize_server.make_server(service, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_expect_continue_get_does_not_hold_slot(server):
+    service, port = server
+    for _ in range(service.capacity + 1):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("GET", "/resize/filesize?target=10KB", headers={"Expect": "100-continue"})
+        assert connection.getresponse().status == 405
+        connection.close()
+
+    buffer = io.BytesIO()
+    make_photo((200, 150)).save(buffer, format="JPEG", quality=90)
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("POST", "/resize/dimension?size=100x75", body=buffer.getvalue())
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("X-Image-Width") == "100"
+    connection.close()
+    assert service.shed == 0
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+import resize_engine
+from conftest import make_photo
+
+
+def _alpha(size):
+    img = make_photo(size, seed=2).convert("RGBA")
+    width, height = size
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse((width // 10, height // 10, width * 9 // 10, height * 9 // 10), fill=255)
+    img.putalpha(mask.filter(ImageFilter.GaussianBlur(8)))
+    return img
+
+
+@pytest.mark.parametrize("name, image, ratios, tolerance", [
+    ("alpha.png", lambda: _alpha((800, 600)), (0.2, 0.22, 0.18, 0.2), 0.1),  # 缩小尺寸的无损 PNG
+    ("alpha.png", lambda: _alpha((800, 600)), (0.08, 0.085), 0.1),  # 调色板 PNG
+    # 需要缩小尺寸的 JPEG；容差 10% 时冷启动的预测已能一次命中，收紧容差才能比较编码次数
+    ("photo.jpg", lambda: make_photo((1600, 1200), seed=1), (0.05, 0.055, 0.045), 0.03),
+])
+def test_warm_session_fewer_encodes_same_dimensions(tmp_path, name, image, ratios, tolerance):
+    input_path = str(tmp_path / name)
+    image().save(input_path)
+    source_size = os.path.getsize(input_path)
+    output_path = str(tmp_path / ("out" + os.path.splitext(name)[1]))
+    session = resize_engine.SessionCache()
+    for step, ratio in enumerate(ratios):
+        target = int(source_size * ratio)
+        cold = resize_engine.resize_by_filesize(input_path, target, tolerance, output_path)
+        warm = resize_engine.resize_by_filesize(input_path, target, tolerance, output_path, session=session)
+        assert warm.dimensions == cold.dimensions
+        assert warm.size <= target * (1 + tolerance)
+        if step:
+            assert warm.encodes < cold.encodes
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import resize_engine
+from conftest import make_photo
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = str(tmp_path / "photo.jpg")
+    make_photo((1600, 1200)).save(path, quality=95)
+    return path
+
+
+@pytest.fixture
+def collected():
+    stats = []
+    resize_engine.add_stats_hook(stats.append)
+    yield stats
+    resize_engine.remove_stats_hook(stats.append)
+
+
+def _check_totals(stats, result):
+    assert stats.error is None
+    assert stats.encodes == result.encodes
+    assert stats.bytes_written == result.size
+    assert all(seconds >= 0 for seconds in stats.stages.values())
+    assert sum(stats.stages.values()) <= stats.total
+
+
+def test_hook_receives_dimension_stage_timings(photo, tmp_path, collected):
+    result = resize_engine.resize_by_dimension(photo, (400, 300), str(tmp_path / "out.jpg"))
+    stats, = collected
+    assert (stats.input_path, stats.mode) == (photo, "dimension")
+    assert {"decode", "resize", "encode"} <= set(stats.stages)
+    _check_totals(stats, result)
+    assert stats.peak_image_bytes >= 400 * 300 * resize_engine.BYTES_PER_PIXEL
+
+
+def test_hook_receives_filesize_stage_timings(photo, tmp_path, collected):
+    result = resize_engine.resize_by_filesize(photo, 50_000, 0.1, str(tmp_path / "out.jpg"))
+    stats, = collected
+    assert stats.mode == "filesize"
+    assert {"decode", "predict", "encode", "write"} <= set(stats.stages)
+    _check_totals(stats, result)
+    assert set(stats.as_dict()["stages_s"]) == set(stats.stages)
+
+
+def test_explicit_stats_filled_and_hook_sees_same_object(photo, tmp_path, collected):
+    stats = resize_engine.JobStats(photo, "dimension")
+    resize_engine.resize_by_dimension(photo, (200, 150), str(tmp_path / "out.jpg"), stats=stats)
+    assert collected == [stats]
+    assert "编码" in stats.describe() and "(1 次)" in stats.describe()
+
+
+def test_failed_job_reports_error(tmp_path, collected):
+    with pytest.raises(Exception):
+        resize_engine.resize_by_dimension(str(tmp_path / "missing.jpg"), (10, 10))
+    stats, = collected
+    assert stats.error and "missing.jpg" in stats.error
+    assert stats.as_dict()["ok"] is False
+
+
+def test_removed_hook_not_called_and_stats_off_by_default(photo, tmp_path):
+    calls = []
+    resize_engine.add_stats_hook(calls.append)
+    resize_engine.remove_stats_hook(calls.append)
+    resize_engine.resize_by_dimension(photo, (200, 150), str(tmp_path / "out.jpg"))
+    assert calls == []
+    assert resize_engine.begin_stats(None, photo, "dimension") is None
+
+
+def test_json_lines_log_as_hook(photo, tmp_path):
+    log_path = tmp_path / "stats.jsonl"
+    log = resize_engine.JsonLinesStatsLog(str(log_path))
+    resize_engine.add_stats_hook(log)
+    try:
+        for size in ((200, 150), (300, 225)):
+            resize_engine.resize_by_dimension(photo, size, str(tmp_path / "out.jpg"))
+    finally:
+        resize_engine.remove_stats_hook(log)
+        log.close()
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["mode"] for record in records] == ["dimension", "dimension"]
+    assert all(record["ok"] and "encode" in record["stages_s"] for record in records)
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+
+from PIL import Image
+
+import resize_batch
+import resize_engine
+import resize_watch
+from conftest import crash_on_poison
+
+
+def _save(path, color="red"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (64, 48), color).save(path)
+
+
+def test_journal_compacts_stale_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(resize_watch, "JOURNAL_COMPACT_SLACK", 5)
+    path = str(tmp_path / "journal.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(20):
+            f.write(json.dumps({"path": f"/in/{i % 2}.jpg", "mtime_ns": i, "size": 1}) + "\n")
+        f.write('{"path": "/in/trunc')  # 中断时写了一半的行
+    journal = resize_watch.Journal(path)
+    journal.close()
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["path"] for record in records) == ["/in/0.jpg", "/in/1.jpg"]
+    assert journal.is_done("/in/1.jpg", resize_watch.FileKey(19, 1))
+    assert not journal.is_done("/in/1.jpg", resize_watch.FileKey(17, 1))
+
+
+def test_small_journal_not_compacted(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    lines = [json.dumps({"path": "/in/a.jpg", "mtime_ns": i, "size": 1}) + "\n" for i in range(3)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    resize_watch.Journal(path).close()
+    with open(path, encoding="utf-8") as f:
+        assert f.readlines() == lines
+
+
+def test_settled_waits_for_unchanged_key(tmp_path):
+    watcher = resize_watch.Watcher([str(tmp_path)], None, None, settle=2.0)
+    key = resize_watch.FileKey(1, 100)
+    assert not watcher._settled("a", key, 10.0)
+    assert not watcher._settled("a", key, 11.0)
+    # 仍在写入：FileKey 变化后重新计时
+    grown = resize_watch.FileKey(2, 200)
+    assert not watcher._settled("a", grown, 12.5)
+    assert not watcher._settled("a", grown, 14.0)
+    assert watcher._settled("a", grown, 14.5)
+    assert "a" not in watcher.unsettled
+
+
+def test_output_path_keeps_subdirectories(tmp_path):
+    inbox, output_dir = tmp_path / "inbox", tmp_path / "out"
+    for sub, color in (("one", "red"), ("two", "blue")):
+        _save(str(inbox / sub / "a.png"), color)
+    status = resize_watch.main([str(inbox), "--size", "32x24", "--output-dir", str(output_dir),
+                                "--once", "--settle", "0", "--interval", "0.05", "-j", "1"])
+    assert status == 0
+    colors = {}
+    for sub in ("one", "two"):
+        with Image.open(output_dir / sub / "a_resized.png") as img:
+            colors[sub] = img.convert("RGB").getpixel((0, 0))
+    assert colors == {"one": (255, 0, 0), "two": (0, 0, 255)}
+
+
+def test_poison_file_journaled_after_repeated_crashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(resize_engine, "resize_by_dimension", crash_on_poison(resize_engine.resize_by_dimension))
+    inbox, output_dir = tmp_path / "inbox", tmp_path / "out"
+    for name in ("a.png", "poison.png", "b.png", "c.png"):
+        _save(str(inbox / name))
+    os.makedirs(output_dir)
+    journal = resize_watch.Journal(str(output_dir / "journal.jsonl"))
+
+    def make_job(path):
+        return resize_batch.ResizeJob(path, "dimension", (32, 24),
+                                      output_path=resize_engine.get_output_path(path, str(output_dir)))
+
+    watcher = resize_watch.Watcher([str(inbox)], make_job, journal, workers=2, interval=0.05, settle=0)
+    thread = threading.Thread(target=watcher.run, kwargs={"once": True})
+    thread.start()
+    thread.join(60)
+    watcher.stop()
+    thread.join()
+    journal.close()
+
+    records = {os.path.basename(path): record for path, record in journal.records.items()}
+    assert sorted(records) == ["a.png", "b.png", "c.png", "poison.png"]
+    assert records["poison.png"]["error"]
+    assert all(records[name]["error"] is None for name in ("a.png", "b.png", "c.png"))
+    assert not watcher.crashes
+
+
+def _dimension_watcher(inbox, output_dir, journal, **kwargs):
+    def make_job(path):
+        return resize_batch.ResizeJob(path, "dimension", (32, 24),
+                                      output_path=resize_engine.get_output_path(path, str(output_dir)))
+
+    return resize_watch.Watcher([str(inbox)], make_job, journal, exclude=[str(output_dir)], **kwargs)
+
+
+def test_journal_failure_releases_slot_and_memory(tmp_path):
+    inbox, output_dir = tmp_path / "inbox", tmp_path / "out"
+    for name in ("a.png", "b.png", "c.png"):
+        _save(str(inbox / name))
+    os.makedirs(output_dir)
+    journal = resize_watch.Journal(str(output_dir / "journal.jsonl"))
+    record = journal.record
+    failures = []
+
+    def flaky_record(*args):
+        if not failures:
+            failures.append(args[0])
+            raise OSError("磁盘已满")
+        return record(*args)
+
+    journal.record = flaky_record
+    # 只有一个名额：第一次写日志失败时若不归还名额，后续文件永远无法提交
+    watcher = _dimension_watcher(inbox, output_dir, journal, max_pending=1, interval=0.05, settle=0,
+                                 memory_limit=256 * 1024 * 1024)
+    thread = threading.Thread(target=watcher.run, kwargs={"once": True})
+    thread.start()
+    thread.join(60)
+    watcher.stop()
+    thread.join()
+    journal.close()
+
+    assert failures
+    assert sorted(os.path.basename(path) for path in journal.records) == ["a.png", "b.png", "c.png"]
+    assert not watcher.in_flight
+    assert watcher._memory.used == 0
+
+
+def _write_burst(inbox, count):
+    img = Image.effect_noise((160, 120), 40).convert("RGB")
+    for index in range(count):
+        directory = os.path.join(inbox, f"batch{index % 10}")
+        os.makedirs(directory, exist_ok=True)
+        img.save(os.path.join(directory, f"img{index:05d}.jpg"), quality=85)
+
+
+def test_burst_processed_once_and_not_repeated_after_restart(tmp_path):
+    # benchmarks/bench_watch.py 的缩小版：边写入边处理，全部成功，重启后不再处理
+    count = 300
+    inbox, output_dir = tmp_path / "inbox", tmp_path / "out"
+    os.makedirs(inbox)
+    os.makedirs(output_dir)
+    journal_path = str(output_dir / resize_watch.DEFAULT_JOURNAL_NAME)
+    journal = resize_watch.Journal(journal_path)
+    watcher = _dimension_watcher(inbox, output_dir, journal, interval=0.05, settle=0.2)
+    runner = threading.Thread(target=watcher.run)
+    writer = threading.Thread(target=_write_burst, args=(str(inbox), count))
+    runner.start()
+    writer.start()
+    deadline = time.monotonic() + 120
+    while watcher.succeeded + watcher.failed < count and time.monotonic() < deadline:
+        time.sleep(0.1)
+    watcher.stop()
+    runner.join()
+    writer.join()
+    journal.close()
+    assert (watcher.succeeded, watcher.failed) == (count, 0)
+    assert len(os.listdir(output_dir)) == count + 1  # 输出和日志
+    assert not watcher.unsettled and not watcher.in_flight
+
+    journal = resize_watch.Journal(journal_path)
+    restarted = _dimension_watcher(inbox, output_dir, journal, interval=0.05, settle=0)
+    restarted.run(once=True)
+    journal.close()
+    assert restarted.submitted == 0